@@ -19,6 +19,7 @@
 
 from ipaclient.frontend import CommandOverride
 from ipalib.plugable import Registry
+from ipalib.text import _
 
 import six
 
@@ -57,3 +58,29 @@ class hbactest(CommandOverride):
 
         # Propagate integer value for result. It will give proper command line result for scripts
         return int(not output['value'])
+
+
+@register(override=True, no_fail=True)
+class hbactest_many(CommandOverride):
+    def output_for_cli(self, textui, output, *args, **options):
+        """
+        Print one block per simulated (user, host, service) combination.
+        """
+        self.log_messages(output)
+
+        textui.print_summary(output['summary'])
+        for result in output['result']:
+            textui.print_indented(
+                '%s, %s, %s: %s' % (
+                    result['user'], result['targethost'], result['service'],
+                    unicode(_('Access granted') if result['value']
+                            else _('Access denied'))))
+            for key, label in (('matched', _('Matched rules')),
+                               ('notmatched', _('Not matched rules')),
+                               ('error', _('Non-existent or invalid rules'))):
+                if result.get(key):
+                    textui.print_attribute(
+                        unicode(label), result[key], '%s: %s', 2, True)
+
+        # Fail if access was denied for any of the combinations
+        return int(not all(result['value'] for result in output['result']))
@@ -51,3 +51,49 @@ class topologysuffix_verify(MethodOverride):
                     textui.print_indented(replica, 2)
 
         return 0
+
+
+@register(override=True, no_fail=True)
+class topologysuffix_analyze(MethodOverride):
+    def output_for_cli(self, textui, output, *args, **options):
+
+        result = output['result']
+
+        header = _('Replication topology of suffix "%(suffix)s"')
+        textui.print_h1(header % {'suffix': args[0]})
+
+        if result['connect_errors']:
+            textui.print_dashed(unicode(_('Topology is disconnected')))
+            for err in result['connect_errors']:
+                msg = _("Server %(srv)s can't contact servers: %(replicas)s")
+                msg = msg % {'srv': err[0], 'replicas': ', '.join(err[2])}
+                textui.print_indented(msg)
+
+        textui.print_attribute(
+            unicode(_("Maximum number of replication hops")),
+            [result['max_hops']]
+        )
+        if result['max_hops_path']:
+            textui.print_attribute(
+                unicode(_("Longest replication path")),
+                [' -> '.join(result['max_hops_path'])]
+            )
+
+        for key, title in (
+                ('critical_masters',
+                 _('Removal of server "%(name)s" disconnects topology:')),
+                ('critical_segments',
+                 _('Removal of segment "%(name)s" disconnects topology:'))):
+            for name, errors in result[key]:
+                textui.print_indented(title % {'name': name})
+                for err in errors:
+                    msg = _("Server %(srv)s can't contact servers: "
+                            "%(replicas)s")
+                    msg = msg % {'srv': err[0], 'replicas': ', '.join(err[2])}
+                    textui.print_indented(msg, 2)
+
+        if not result['critical_masters'] and not result['critical_segments']:
+            textui.print_indented(unicode(
+                _('No single server or segment removal disconnects topology')))
+
+        return 0
@@ -28,12 +28,14 @@ import os
 import ssl
 import tempfile
 
+from cryptography.exceptions import InvalidTag
 from cryptography.fernet import Fernet, InvalidToken
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.padding import PKCS7
 from cryptography.hazmat.primitives.serialization import (
     load_pem_public_key, load_pem_private_key)
@@ -83,6 +85,11 @@ register = Registry()
 
 MAX_VAULT_DATA_SIZE = 2**20  # = 1 MB
 
+# Larger data are archived in chunks of this size, see encrypt_chunk()
+VAULT_CHUNK_SIZE = MAX_VAULT_DATA_SIZE
+VAULT_CHUNK_NONCE_SIZE = 12
+VAULT_CHUNKS_VERSION = 1
+
 
 def generate_symmetric_key(password, salt):
     """
@@ -166,6 +173,36 @@ def decrypt(data, symmetric_key=None, private_key=None):
         raise ValueError("Either a symmetric or a private key is required.")
 
 
+def _chunk_aad(chunk_set, index, count):
+    return u'{}:{}:{}'.format(chunk_set, index, count).encode('ascii')
+
+
+def encrypt_chunk(data, key, chunk_set, index, count):
+    """
+    Encrypts a chunk of vault data with AES-GCM.
+
+    The chunk set, the position of the chunk and the number of chunks are
+    authenticated, so chunks cannot be reordered, mixed or truncated.
+    """
+    nonce = os.urandom(VAULT_CHUNK_NONCE_SIZE)
+    return nonce + AESGCM(key).encrypt(
+        nonce, data, _chunk_aad(chunk_set, index, count))
+
+
+def decrypt_chunk(data, key, chunk_set, index, count):
+    """
+    Decrypts a chunk of vault data encrypted with encrypt_chunk().
+    """
+    nonce = data[:VAULT_CHUNK_NONCE_SIZE]
+    try:
+        return AESGCM(key).decrypt(
+            nonce, data[VAULT_CHUNK_NONCE_SIZE:],
+            _chunk_aad(chunk_set, index, count))
+    except InvalidTag:
+        raise errors.AuthenticationError(
+            message=_('Invalid vault data chunk'))
+
+
 @register(no_fail=True)
 class _fake_vault(Object):
     name = 'vault'
@@ -750,6 +787,21 @@ class ModVaultData(Local):
                 raise
         return None
 
+    def _unwrap_data(self, algo, nonce, vault_data):
+        cipher = Cipher(algo, modes.CBC(nonce), backend=default_backend())
+        # decrypt
+        decryptor = cipher.decryptor()
+        padded_data = decryptor.update(vault_data)
+        padded_data += decryptor.finalize()
+        # remove padding
+        unpadder = PKCS7(algo.block_size).unpadder()
+        data = unpadder.update(padded_data)
+        data += unpadder.finalize()
+        return data
+
+    def _supports_chunks(self):
+        return 'chunk' in self.api.Command[self.name + '_internal'].options
+
     def internal(self, algo, transport_cert, *args, **options):
         """
         Calls the internal counterpart of the command.
@@ -833,7 +885,9 @@ class vault_archive(ModVaultData):
 
     def get_options(self):
         for option in self.api.Command.vault_archive_internal.options():
-            if option.name not in ('nonce',
+            if option.name not in ('chunk',
+                                   'chunk_set',
+                                   'nonce',
                                    'session_key',
                                    'vault_data',
                                    'version',
@@ -871,6 +925,50 @@ class vault_archive(ModVaultData):
 
         return nonce, wrapped_vault_data
 
+    def _archive_chunks(self, algo, transport_cert, input_file, data, size,
+                        key, *args, **options):
+        """
+        Encrypts and archives the data in chunks of VAULT_CHUNK_SIZE bytes.
+
+        Returns the description of the archived chunks.
+        """
+        chunk_set = os.urandom(16).hex()
+        count = (size + VAULT_CHUNK_SIZE - 1) // VAULT_CHUNK_SIZE
+
+        if input_file:
+            try:
+                f = io.open(input_file, mode='rb')
+            except IOError as exc:
+                raise errors.ValidationError(name="in", error=_(
+                    "Cannot read file '%(filename)s': %(exc)s")
+                    % {'filename': input_file, 'exc': exc.args[1]})
+        else:
+            f = io.BytesIO(data)
+
+        with f:
+            for index in range(count):
+                chunk = f.read(VAULT_CHUNK_SIZE)
+                if not chunk:
+                    raise errors.ValidationError(name="in", error=_(
+                        "File '%(filename)s' changed while reading")
+                        % {'filename': input_file})
+                chunk = encrypt_chunk(chunk, key, chunk_set, index, count)
+                nonce, wrapped_chunk = self._wrap_data(algo, chunk)
+                self.internal(algo, transport_cert, *args, **dict(
+                    options,
+                    chunk_set=chunk_set,
+                    chunk=index,
+                    nonce=nonce,
+                    vault_data=wrapped_chunk,
+                ))
+
+        return {
+            'version': VAULT_CHUNKS_VERSION,
+            'set': chunk_set,
+            'count': count,
+            'size': size,
+        }
+
     def forward(self, *args, **options):
         data = options.get('data')
         input_file = options.get('in')
@@ -890,17 +988,15 @@ class vault_archive(ModVaultData):
         if 'password_file' in options:
             del options['password_file']
 
-        # get data
+        # get data size, data larger than MAX_VAULT_DATA_SIZE are archived
+        # in chunks if the server supports it
         if data and input_file:
             raise errors.MutuallyExclusiveError(
                 reason=_('Input data specified multiple times'))
 
         elif data:
-            if len(data) > MAX_VAULT_DATA_SIZE:
-                raise errors.ValidationError(name="data", error=_(
-                    "Size of data exceeds the limit. Current vault data size "
-                    "limit is %(limit)d B")
-                    % {'limit': MAX_VAULT_DATA_SIZE})
+            size = len(data)
+            name = 'data'
 
         elif input_file:
             try:
@@ -909,15 +1005,22 @@ class vault_archive(ModVaultData):
                 raise errors.ValidationError(name="in", error=_(
                     "Cannot read file '%(filename)s': %(exc)s")
                     % {'filename': input_file, 'exc': exc.args[1]})
-            if stat.st_size > MAX_VAULT_DATA_SIZE:
-                raise errors.ValidationError(name="in", error=_(
-                    "Size of data exceeds the limit. Current vault data size "
-                    "limit is %(limit)d B")
-                    % {'limit': MAX_VAULT_DATA_SIZE})
-            data = validated_read('in', input_file, mode='rb')
+            size = stat.st_size
+            name = 'in'
 
         else:
             data = b''
+            size = 0
+
+        chunked = size > MAX_VAULT_DATA_SIZE
+        if chunked and not self._supports_chunks():
+            raise errors.ValidationError(name=name, error=_(
+                "Size of data exceeds the limit. Current vault data size "
+                "limit is %(limit)d B")
+                % {'limit': MAX_VAULT_DATA_SIZE})
+
+        if input_file and not chunked:
+            data = validated_read('in', input_file, mode='rb')
 
         if self.api.env.in_server:
             backend = self.api.Backend.ldap2
@@ -931,9 +1034,12 @@ class vault_archive(ModVaultData):
 
         vault_type = vault['ipavaulttype'][0]
 
+        encryption_key = None
+        public_key = None
+
         if vault_type == u'standard':
 
-            encrypted_key = None
+            pass
 
         elif vault_type == u'symmetric':
 
@@ -959,24 +1065,25 @@ class vault_archive(ModVaultData):
                     password = self.api.Backend.textui.prompt_password(
                         'Password', confirm=False)
 
-            if not override_password:
-                # verify password by retrieving existing data
-                opts = options.copy()
-                opts['password'] = password
-                try:
-                    self.api.Command.vault_retrieve(*args, **opts)
-                except errors.NotFound:
-                    pass
-
             salt = vault['ipavaultsalt'][0]
 
             # generate encryption key from vault password
             encryption_key = generate_symmetric_key(password, salt)
 
-            # encrypt data with encryption key
-            data = encrypt(data, symmetric_key=encryption_key)
-
-            encrypted_key = None
+            if not override_password:
+                # verify password by decrypting existing data
+                retrieve = self.api.Command.vault_retrieve
+                try:
+                    vault_data = retrieve.get_vault_data(*args, **options)[1]
+                except errors.NotFound:
+                    pass
+                else:
+                    if 'chunks' in vault_data:
+                        encrypted = vault_data['encrypted_key']
+                    else:
+                        encrypted = vault_data['data']
+                    decrypt(base64.b64decode(encrypted.encode('utf-8')),
+                            symmetric_key=encryption_key)
 
         elif vault_type == u'asymmetric':
 
@@ -985,27 +1092,11 @@ class vault_archive(ModVaultData):
             # generate encryption key
             encryption_key = base64.b64encode(os.urandom(32))
 
-            # encrypt data with encryption key
-            data = encrypt(data, symmetric_key=encryption_key)
-
-            # encrypt encryption key with public key
-            encrypted_key = encrypt(encryption_key, public_key=public_key)
-
         else:
             raise errors.ValidationError(
                 name='vault_type',
                 error=_('Invalid vault type'))
 
-
-        vault_data = {
-            'data': base64.b64encode(data).decode('utf-8')
-        }
-        if encrypted_key:
-            vault_data[u'encrypted_key'] = base64.b64encode(encrypted_key)\
-                .decode('utf-8')
-
-        json_vault_data = json.dumps(vault_data).encode('utf-8')
-
         # get config
         transport_cert, wrapping_algo = self._get_vaultconfig()
         # let options override wrapping algo
@@ -1017,6 +1108,51 @@ class vault_archive(ModVaultData):
 
         # generate session key
         algo = self._generate_session_key(wrapping_algo)
+
+        if chunked:
+            # chunks are encrypted with a random key, which is stored in
+            # the vault data encrypted with the vault password or public key
+            chunk_key = AESGCM.generate_key(bit_length=256)
+            if public_key is not None:
+                encrypted_key = encrypt(chunk_key, public_key=public_key)
+            elif encryption_key is not None:
+                encrypted_key = encrypt(chunk_key,
+                                        symmetric_key=encryption_key)
+            else:
+                encrypted_key = None
+
+            vault_data = {
+                'chunks': self._archive_chunks(
+                    algo, transport_cert, input_file, data, size,
+                    chunk_key, *args, **options),
+            }
+            if encrypted_key:
+                vault_data['encrypted_key'] = base64.b64encode(
+                    encrypted_key).decode('utf-8')
+            else:
+                vault_data['key'] = base64.b64encode(
+                    chunk_key).decode('utf-8')
+            # let the server release the chunks of the replaced data
+            options['chunk_set'] = vault_data['chunks']['set']
+
+        else:
+            encrypted_key = None
+            if encryption_key is not None:
+                # encrypt data with encryption key
+                data = encrypt(data, symmetric_key=encryption_key)
+            if public_key is not None:
+                # encrypt encryption key with public key
+                encrypted_key = encrypt(encryption_key, public_key=public_key)
+
+            vault_data = {
+                'data': base64.b64encode(data).decode('utf-8')
+            }
+            if encrypted_key:
+                vault_data[u'encrypted_key'] = base64.b64encode(
+                    encrypted_key).decode('utf-8')
+
+        json_vault_data = json.dumps(vault_data).encode('utf-8')
+
         # wrap vault data
         nonce, wrapped_vault_data = self._wrap_data(algo, json_vault_data)
         options.update(
@@ -1089,7 +1225,8 @@ class vault_retrieve(ModVaultData):
 
     def get_options(self):
         for option in self.api.Command.vault_retrieve_internal.options():
-            if option.name not in ('session_key', 'version', 'wrapping_algo'):
+            if option.name not in ('chunk', 'chunk_set', 'session_key',
+                                   'version', 'wrapping_algo'):
                 yield option
         for option in super(vault_retrieve, self).get_options():
             yield option
@@ -1104,18 +1241,75 @@ class vault_retrieve(ModVaultData):
         return self.api.Command.vault_retrieve_internal.output()
 
     def _unwrap_response(self, algo, nonce, vault_data):
-        cipher = Cipher(algo, modes.CBC(nonce), backend=default_backend())
-        # decrypt
-        decryptor = cipher.decryptor()
-        padded_data = decryptor.update(vault_data)
-        padded_data += decryptor.finalize()
-        # remove padding
-        unpadder = PKCS7(algo.block_size).unpadder()
-        json_vault_data = unpadder.update(padded_data)
-        json_vault_data += unpadder.finalize()
+        json_vault_data = self._unwrap_data(algo, nonce, vault_data)
         # load JSON
         return json.loads(json_vault_data.decode('utf-8'))
 
+    def get_vault_data(self, *args, **options):
+        """
+        Retrieves the vault data record from the server.
+
+        Returns the server response and the unwrapped vault data, which
+        describe the archived chunks if the data were archived in chunks.
+        """
+        options = dict(options)
+
+        # get config
+        transport_cert, wrapping_algo = self._get_vaultconfig()
+        # let options override wrapping algo
+        # For backwards compatibility do not send old legacy wrapping algo
+        # to server. Only send the option when non-3DES is used.
+        wrapping_algo = options.pop('wrapping_algo', wrapping_algo)
+        if wrapping_algo != constants.VAULT_WRAPPING_3DES:
+            options['wrapping_algo'] = wrapping_algo
+
+        # generate session key
+        algo = self._generate_session_key(wrapping_algo)
+        # send retrieval request to server
+        response = self.internal(algo, transport_cert, *args, **options)
+        # unwrap data with session key
+        vault_data = self._unwrap_response(
+            algo,
+            response['result']['nonce'],
+            response['result']['vault_data']
+        )
+
+        if 'chunks' in vault_data:
+            chunks = vault_data['chunks']
+            if chunks.get('version') != VAULT_CHUNKS_VERSION:
+                raise errors.ValidationError(
+                    name='vault_data',
+                    error=_('Unsupported vault data format'))
+            # keep the session to retrieve the chunks
+            chunks['session'] = (algo, transport_cert, options)
+
+        return response, vault_data
+
+    def _retrieve_chunks(self, chunks, key, f, *args):
+        """
+        Retrieves and decrypts chunks of vault data into file ``f``.
+        """
+        algo, transport_cert, options = chunks['session']
+        chunk_set = chunks['set']
+        count = chunks['count']
+        size = 0
+        for index in range(count):
+            response = self.internal(
+                algo, transport_cert, *args,
+                chunk_set=chunk_set, chunk=index, **options)
+            chunk = self._unwrap_data(
+                algo,
+                response['result']['nonce'],
+                response['result']['vault_data']
+            )
+            chunk = decrypt_chunk(chunk, key, chunk_set, index, count)
+            size += len(chunk)
+            f.write(chunk)
+
+        if size != chunks['size']:
+            raise errors.AuthenticationError(
+                message=_('Invalid vault data chunk'))
+
     def forward(self, *args, **options):
         output_file = options.get('out')
 
@@ -1147,37 +1341,24 @@ class vault_retrieve(ModVaultData):
         vault = self.api.Command.vault_show(*args, **options)['result']
         vault_type = vault['ipavaulttype'][0]
 
-        # get config
-        transport_cert, wrapping_algo = self._get_vaultconfig()
-        # let options override wrapping algo
-        # For backwards compatibility do not send old legacy wrapping algo
-        # to server. Only send the option when non-3DES is used.
-        wrapping_algo = options.pop('wrapping_algo', wrapping_algo)
-        if wrapping_algo != constants.VAULT_WRAPPING_3DES:
-            options['wrapping_algo'] = wrapping_algo
-
-        # generate session key
-        algo = self._generate_session_key(wrapping_algo)
-        # send retrieval request to server
-        response = self.internal(algo, transport_cert, *args, **options)
-        # unwrap data with session key
-        vault_data = self._unwrap_response(
-            algo,
-            response['result']['nonce'],
-            response['result']['vault_data']
-        )
-        del algo
+        response, vault_data = self.get_vault_data(*args, **options)
 
-        data = base64.b64decode(vault_data[u'data'].encode('utf-8'))
+        chunks = vault_data.get('chunks')
+        data = None
         encrypted_key = None
 
+        if chunks is None:
+            data = base64.b64decode(vault_data[u'data'].encode('utf-8'))
+
         if 'encrypted_key' in vault_data:
             encrypted_key = base64.b64decode(vault_data[u'encrypted_key']
                                              .encode('utf-8'))
 
         if vault_type == u'standard':
 
-            pass
+            if chunks is not None:
+                chunk_key = base64.b64decode(
+                    vault_data[u'key'].encode('utf-8'))
 
         elif vault_type == u'symmetric':
 
@@ -1204,8 +1385,13 @@ class vault_retrieve(ModVaultData):
             # generate encryption key from password
             encryption_key = generate_symmetric_key(password, salt)
 
-            # decrypt data with encryption key
-            data = decrypt(data, symmetric_key=encryption_key)
+            if chunks is not None:
+                # decrypt chunk key with encryption key
+                chunk_key = decrypt(encrypted_key,
+                                    symmetric_key=encryption_key)
+            else:
+                # decrypt data with encryption key
+                data = decrypt(data, symmetric_key=encryption_key)
 
         elif vault_type == u'asymmetric':
 
@@ -1227,22 +1413,41 @@ class vault_retrieve(ModVaultData):
                     name='private_key',
                     error=_('Missing vault private key'))
 
-            # decrypt encryption key with private key
-            encryption_key = decrypt(encrypted_key, private_key=private_key)
+            if chunks is not None:
+                # decrypt chunk key with private key
+                chunk_key = decrypt(encrypted_key, private_key=private_key)
+            else:
+                # decrypt encryption key with private key
+                encryption_key = decrypt(encrypted_key,
+                                         private_key=private_key)
 
-            # decrypt data with encryption key
-            data = decrypt(data, symmetric_key=encryption_key)
+                # decrypt data with encryption key
+                data = decrypt(data, symmetric_key=encryption_key)
 
         else:
             raise errors.ValidationError(
                 name='vault_type',
                 error=_('Invalid vault type'))
 
-        if output_file:
+        if chunks is not None and output_file:
+            # stream the chunks into the output file
+            try:
+                with open(output_file, 'wb') as f:
+                    self._retrieve_chunks(chunks, chunk_key, f, *args)
+            except BaseException:
+                os.unlink(output_file)
+                raise
+
+        elif chunks is not None:
+            f = io.BytesIO()
+            self._retrieve_chunks(chunks, chunk_key, f, *args)
+            data = f.getvalue()
+
+        elif output_file:
             with open(output_file, 'wb') as f:
                 f.write(data)
 
-        else:
+        if not output_file:
             response['result'] = {'data': data}
 
         return response
@@ -6,11 +6,13 @@ from collections.abc import Mapping, Sequence
 import errno
 import json
 import logging
+import mmap
 import os
+import struct
 import sys
 import tempfile
 import types
-import zipfile
+import zlib
 
 from cryptography import x509 as crypto_x509
 
@@ -29,7 +31,15 @@ from ipapython.dnsutil import DNSName
 
 logger = logging.getLogger(__name__)
 
-FORMAT = '1'
+FORMAT = '2'
+
+# A cached schema file starts with the size of the index as a 32-bit big
+# endian integer, followed by the index and the data of the members. The
+# index is a JSON object which maps member names ("commands/user_show/1",
+# "_help", ...) to the offset and size of their zlib compressed JSON data,
+# relative to the end of the index. Members are read and decoded only when
+# they are accessed.
+_INDEX_SIZE = struct.Struct('>I')
 
 if six.PY3:
     unicode = str
@@ -341,6 +351,32 @@ class _SchemaNameSpace(Mapping):
             raise KeyError(key)
 
 
+class _SchemaTopicModule(types.ModuleType):
+    """
+    Topic module which reads its documentation from the schema when it is
+    first accessed.
+    """
+
+    def __init__(self, name, schema, full_name):
+        super(_SchemaTopicModule, self).__init__(name)
+        self._schema = schema
+        self._full_name = full_name
+
+    @property
+    def __doc__(self):
+        return self._schema['topics'][self._full_name].get('doc')
+
+    @property
+    def topic(self):
+        topic = self._schema['topics'][self._full_name]
+        if 'topic_topic' not in topic:
+            return None
+        s = topic['topic_topic']
+        if isinstance(s, bytes):
+            s = s.decode('utf-8')
+        return str(s).partition('/')[0]
+
+
 class NotAvailable(Exception):
     pass
 
@@ -372,6 +408,9 @@ class Schema:
         self._dict = {}
         self._namespaces = {}
         self._help = None
+        self._data = None
+        self._data_offset = 0
+        self._index = {}
 
         for ns in self.namespaces:
             self._dict[ns] = {}
@@ -436,16 +475,33 @@ class Schema:
         return (fp, ttl,)
 
     def _read_schema(self, fingerprint):
-        # It's more efficient to read zip file members at once than to open
-        # the zip file a couple of times, see #6690.
+        # Only the index is parsed here, the file is mapped to memory and
+        # members are decoded by read_member() when they are needed.
         filename = os.path.join(self._dir, fingerprint)
-        with zipfile.ZipFile(filename, 'r') as schema:
-            for name in schema.namelist():
-                ns, _slash, key = name.partition('/')
-                if ns in self.namespaces:
-                    self._dict[ns][key] = schema.read(name)
-                elif name == '_help':
-                    self._help = schema.read(name)
+        with open(filename, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (size,) = _INDEX_SIZE.unpack_from(data)
+            offset = _INDEX_SIZE.size + size
+            index = json.loads(data[_INDEX_SIZE.size:offset].decode('utf-8'))
+        except Exception:
+            data.close()
+            raise
+
+        for name in index:
+            ns, _slash, key = name.partition('/')
+            if ns in self.namespaces:
+                self._dict[ns][key] = None
+
+        self._data = data
+        self._data_offset = offset
+        self._index = index
+
+    def read_member(self, name):
+        offset, size = self._index[name]
+        offset += self._data_offset
+        data = zlib.decompress(self._data[offset:offset + size])
+        return json.loads(data.decode('utf-8'))
 
     def __getitem__(self, key):
         try:
@@ -494,27 +550,36 @@ class Schema:
                 os.rename(f.name, os.path.join(self._dir, fingerprint))
 
     def _write_schema_data(self, fileobj):
-        with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as schema:
-            for key, value in self._dict.items():
-                if key in self.namespaces:
-                    ns = value
-                    for member in ns:
-                        path = '{}/{}'.format(key, member)
-                        s = json.dumps(ns[member], default=json_default)
-                        schema.writestr(path, s.encode('utf-8'))
-                else:
-                    schema.writestr(key, json.dumps(value).encode('utf-8'))
-
-            schema.writestr(
-                '_help',
-                json.dumps(self._help, default=json_default).encode('utf-8')
-            )
+        members = []
+        for key, value in self._dict.items():
+            if key in self.namespaces:
+                for member, member_value in value.items():
+                    members.append(('{}/{}'.format(key, member), member_value))
+            else:
+                members.append((key, value))
+        members.append(('_help', self._help))
+
+        index = {}
+        data = []
+        offset = 0
+        for name, value in members:
+            s = json.dumps(value, default=json_default).encode('utf-8')
+            s = zlib.compress(s)
+            index[name] = (offset, len(s))
+            data.append(s)
+            offset += len(s)
+
+        index = json.dumps(index).encode('utf-8')
+        fileobj.write(_INDEX_SIZE.pack(len(index)))
+        fileobj.write(index)
+        for s in data:
+            fileobj.write(s)
 
     def read_namespace_member(self, namespace, member):
         value = self._dict[namespace][member]
 
-        if isinstance(value, bytes):
-            value = json.loads(value.decode('utf-8'))
+        if value is None:
+            value = self.read_member('{}/{}'.format(namespace, member))
             self._dict[namespace][member] = value
 
         return value
@@ -523,10 +588,8 @@ class Schema:
         return iter(self._dict[namespace])
 
     def get_help(self, namespace, member):
-        if isinstance(self._help, bytes):
-            self._help = json.loads(
-                self._help.decode('utf-8')
-            )
+        if self._help is None:
+            self._help = self.read_member('_help')
 
         return self._help[namespace][member]
 
@@ -587,21 +650,11 @@ def get_package(server_info, client):
             plugin = module.register()(plugin)  # pylint: disable=no-member
     sys.modules[module_name] = module
 
-    for full_name, topic in six.iteritems(schema['topics']):
-        name = str(topic['name'])
+    for full_name in schema['topics']:
+        name = str(full_name).partition('/')[0]
         module_name = '.'.join((package_name, name))
-        try:
-            module = sys.modules[module_name]
-        except KeyError:
-            module = sys.modules[module_name] = types.ModuleType(module_name)
-            module.__file__ = os.path.join(package_dir, '{}.py'.format(name))
-        module.__doc__ = topic.get('doc')
-        if 'topic_topic' in topic:
-            s = topic['topic_topic']
-            if isinstance(s, bytes):
-                s = s.decode('utf-8')
-            module.topic = str(s).partition('/')[0]
-        else:
-            module.topic = None
+        module = sys.modules[module_name] = _SchemaTopicModule(
+            module_name, schema, full_name)
+        module.__file__ = os.path.join(package_dir, '{}.py'.format(name))
 
     return package
@@ -41,6 +41,9 @@ if __name__ == '__main__':
             "ipaclient.remote_plugins.2_156",
             "ipaclient.remote_plugins.2_164",
         ],
+        package_data={
+            'ipaclient.plugins': ['plugin_manifest.json'],
+        },
         install_requires=[
             "cryptography",
             "ipalib",
@@ -17,11 +17,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import shlex
 import re
 
-import six
-
 # The Python re module doesn't do nested parenthesis
 
 # Break the ACI into 3 pieces: target, name, permissions/bind_rules
@@ -35,6 +32,20 @@ PermPat = re.compile(r'(\w+)\s*\(([^()]*)\)\s*(.*)', re.UNICODE)
 BindPat = re.compile(r'\(?([a-zA-Z0-9;\.]+)\s*(\!?=)\s*\"(.*)\"\)?',
                      re.UNICODE)
 
+# Tokens of the target part, split the way shlex does in non-POSIX mode
+# with "." added to the word characters: words, quoted strings including
+# their quotes, and single punctuation characters. Whitespace and comments
+# are skipped.
+TokenPat = re.compile(r'''
+    [ \t\r\n]+ | \#[^\n]*                # whitespace and comments
+    | (?P<token>
+        [a-zA-Z0-9_.][a-zA-Z0-9_."']*   # words
+        | "[^"]*" | '[^']*'             # quoted strings
+        | ["']                          # unterminated quotes
+        | .                             # punctuation
+    )
+''', re.VERBOSE | re.DOTALL)
+
 ACTIONS = ["allow", "deny"]
 
 PERMISSIONS = ["read", "write", "add", "delete", "search", "compare",
@@ -114,11 +125,19 @@ class ACI:
             s = s[:-1]
         return s
 
+    @staticmethod
+    def _tokenize(aci):
+        """Split the target part of an ACI into tokens in a single pass"""
+        for match in TokenPat.finditer(aci):
+            token = match.group('token')
+            if token is None:
+                continue
+            if token in ('"', "'"):
+                raise ValueError("No closing quotation")
+            yield token
+
     def _parse_target(self, aci):
-        if six.PY2:
-            aci = aci.encode('utf-8')
-        lexer = shlex.shlex(aci)
-        lexer.wordchars = lexer.wordchars + "."
+        lexer = self._tokenize(aci)
 
         var = False
         op = "="
@@ -184,6 +184,22 @@ DEFAULT_CONFIG = (
     ('ldap_cache_size', 100),
     ('ldap_cache_debug', False),
 
+    # Per-process cache of rarely changing entries shared by all requests
+    ('ldap_shared_cache', False),
+    ('ldap_shared_cache_size', 1000),
+
+    # Per-request profile of LDAP operations, Dogtag calls and callbacks
+    ('profile_requests', False),
+
+    # Maximum number of methods executed concurrently by batch --parallel
+    ('batch_parallel_workers', 4),
+
+    # Per-process pool of LDAP connections reused across requests
+    ('ldap_pool', False),
+    ('ldap_pool_size', 8),
+    ('ldap_pool_idle_timeout', 300),
+    ('ldap_pool_health_check_interval', 10),
+
     # Define an inclusive range of SSL/TLS version support
     ('tls_version_min', TLS_VERSION_DEFAULT_MIN),
     ('tls_version_max', TLS_VERSION_DEFAULT_MAX),
@@ -225,6 +241,14 @@ DEFAULT_CONFIG = (
     # For the following ports, None means a default specific to the installed
     # Dogtag version.
     ('ca_install_port', None),
+    # Maximum number of parallel connections used to retrieve certificates
+    # in bulk, e.g. by cert-find --all
+    ('ca_bulk_connections', 4),
+    # Number of seconds a logged in KRA session is reused before the
+    # server logs in again, 0 disables the reuse
+    ('kra_session_lifetime', 300),
+    # Maximum number of idle KRA sessions kept for reuse
+    ('kra_session_pool_size', 4),
 
     # Topology plugin
     ('recommended_max_agmts', 4),  # Recommended maximum number of replication
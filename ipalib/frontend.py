@@ -41,7 +41,7 @@ from ipalib.errors import (
     ValidationError,
     ConversionError,
 )
-from ipalib import errors, messages
+from ipalib import errors, messages, profiler
 from ipalib.request import context, context_frame
 from ipalib.util import classproperty, classobjectproperty, json_serialize
 from ipalib.constants import SD_IPA_API_MESSAGE_ID
@@ -53,6 +53,9 @@ logger = logging.getLogger(__name__)
 
 RULE_FLAG = 'validation_rule'
 
+# Maximum number of cached get_default() plans per command
+PARAM_PLAN_CACHE_SIZE = 64
+
 def rule(obj):
     assert not hasattr(obj, RULE_FLAG)
     setattr(obj, RULE_FLAG, True)
@@ -644,9 +647,9 @@ class Command(HasParam):
                 break
 
     def __options_2_params(self, options):
-        for name in self.params:
-            if name in options:
-                yield (name, options.pop(name))
+        param_map = self.__param_map
+        for name in [name for name in options if name in param_map]:
+            yield (name, options.pop(name))
         # If any options remain, they are either internal or unknown
         unused_keys = set(options).difference(self.internal_options)
         if unused_keys:
@@ -738,8 +741,9 @@ class Command(HasParam):
         >>> c.normalize(first=u'JOHN', last=u'DOE')
         {'last': u'DOE', 'first': u'john'}
         """
+        param_map = self.__param_map
         return dict(
-            (k, self.params[k].normalize(v)) for (k, v) in kw.items()
+            (k, param_map[k].normalize(v)) for (k, v) in kw.items()
         )
 
     def convert(self, **kw):
@@ -758,8 +762,9 @@ class Command(HasParam):
         >>> c.convert(one=1, two=2)
         {'two': u'2', 'one': 1}
         """
+        param_map = self.__param_map
         return dict(
-            (k, self.params[k].convert(v)) for (k, v) in kw.items()
+            (k, param_map[k].convert(v)) for (k, v) in kw.items()
         )
 
     def get_default(self, _params=None, **kw):
@@ -780,8 +785,8 @@ class Command(HasParam):
         {}
         """
         if _params is None:
-            _params = [p.name for p in self.params()
-                       if p.name not in kw and (p.required or p.autofill)]
+            _params = [name for name in self.__autofill_params
+                       if name not in kw]
         return dict(self.__get_default_iter(_params, kw))
 
     def get_default_of(self, _name, **kw):
@@ -795,20 +800,10 @@ class Command(HasParam):
         """
         Generator method used by `Command.get_default` and `Command.get_default_of`.
         """
-        # Find out what additional parameters are needed to dynamically create
-        # the default values with default_from.
-        dep = set()
-        for param in reversed(self.params_by_default):
-            if param.name in params or param.name in dep:
-                if param.default_from is None:
-                    continue
-                for name in param.default_from.keys:
-                    dep.add(name)
-
-        for param in self.params_by_default():
+        for (param, in_dep, in_params) in self.__get_default_plan(params):
             default = None
             hasdefault = False
-            if param.name in dep:
+            if in_dep:
                 if param.name in kw:
                     # Parameter is specified, convert and validate the value.
                     value = param(kw[param.name], **kw)
@@ -826,7 +821,7 @@ class Command(HasParam):
                     if default is not None:
                         kw[param.name] = default
                     hasdefault = True
-            if param.name in params:
+            if in_params:
                 if not hasdefault:
                     # Default value is not available from the previous step,
                     # get it now. At this point it is certain that the value
@@ -843,10 +838,98 @@ class Command(HasParam):
         If any value fails the validation, `ipalib.errors.ValidationError`
         (or a subclass thereof) will be raised.
         """
-        for param in self.params():
+        for param in self.__get_validate_plan(kw):
             value = kw.get(param.name, None)
             param.validate(value, supplied=param.name in kw)
 
+    def __get_default_plan(self, params):
+        """
+        Return the parameters `Command.get_default` has to visit.
+
+        The result is a tuple of ``(param, in_dep, in_params)`` triples in
+        the ``params_by_default`` order, where ``in_dep`` tells whether some
+        other default depends on the parameter and ``in_params`` whether its
+        default was requested.  Plans are cached per set of requested
+        parameters, so repeated calls only pay for the lookup.
+        """
+        key = frozenset(params)
+        try:
+            return self.__default_plans[key]
+        except KeyError:
+            pass
+
+        # Find out what additional parameters are needed to dynamically create
+        # the default values with default_from.
+        dep = set()
+        for name in key:
+            dep.update(self.__default_deps.get(name, ()))
+
+        plan = tuple(
+            (param, param.name in dep, param.name in key)
+            for param in self.params_by_default()
+            if param.name in dep or param.name in key
+        )
+        if len(self.__default_plans) >= PARAM_PLAN_CACHE_SIZE:
+            self.__default_plans.clear()
+        self.__default_plans[key] = plan
+        return plan
+
+    def __get_validate_plan(self, kw):
+        """
+        Return the parameters `Command.validate` has to check for ``kw``.
+
+        Parameters that are neither supplied nor required always validate
+        successfully, so only the supplied and the required parameters are
+        returned, in the ``params`` order.
+        """
+        param_map = self.__param_map
+        supplied = [name for name in kw if name in param_map]
+        if not supplied:
+            return self.__required_params
+        order = self.__param_order
+        names = set(supplied)
+        names.update(p.name for p in self.__required_params)
+        return [param_map[name] for name in sorted(names, key=order.get)]
+
+    def __compile_param_plans(self):
+        """
+        Precompute the per-call parameter processing plans.
+
+        `Command.get_default`, `Command.validate`, `Command.normalize` and
+        `Command.convert` run on every call, so everything that depends only
+        on the parameter definitions is computed once here.
+        """
+        self.__param_map = {param.name: param for param in self.params()}
+        self.__param_order = {
+            name: i for (i, name) in enumerate(self.params)
+        }
+        self.__autofill_params = tuple(
+            param.name for param in self.params()
+            if param.required or param.autofill
+        )
+        self.__required_params = tuple(
+            param for param in self.params() if param.required
+        )
+
+        # For every parameter, the transitive closure of the parameters its
+        # default_from depends on.
+        self.__default_deps = {}
+        for param in self.params():
+            if param.default_from is None:
+                continue
+            dep = set()
+            todo = list(param.default_from.keys)
+            while todo:
+                name = todo.pop()
+                if name in dep:
+                    continue
+                dep.add(name)
+                other = self.__param_map.get(name)
+                if other is not None and other.default_from is not None:
+                    todo.extend(other.default_from.keys)
+            self.__default_deps[param.name] = frozenset(dep)
+        self.__default_plans = {}
+
     def verify_client_version(self, client_version):
         """
         Compare the version the client provided to the version of the
@@ -961,6 +1044,7 @@ class Command(HasParam):
                     pass
             params.insert(pos, i)
         self.params_by_default = NameSpace(params, sort=False)
+        self.__compile_param_plans()
         self.output = NameSpace(self._iter_output(), sort=False)
         self._create_param_namespace('output_params')
         super(Command, self)._on_finalize()
@@ -1202,14 +1286,18 @@ class Command(HasParam):
         # Use one shared callback registry, keyed on class, to avoid problems
         # with missing attributes being looked up in superclasses
         callbacks = _callback_registry.get(callback_type, {}).get(cls, [None])
+        profile = profiler.get_profile()
         for callback in callbacks:
             if callback is None:
                 try:
-                    yield getattr(cls, '%s_callback' % callback_type)
+                    callback = getattr(cls, '%s_callback' % callback_type)
                 except AttributeError:
-                    pass
-            else:
-                yield callback
+                    continue
+            if profile is not None:
+                name = getattr(callback, '__qualname__', repr(callback))
+                callback = profiler.profiled(
+                    'callback', '%s %s' % (cls.__name__, name))(callback)
+            yield callback
 
     @classmethod
     def register_callback(cls, callback_type, callback, first=False):
@@ -22,9 +22,10 @@ if six.PY3:
 class _JSONPrimer(dict):
     """Fast JSON primer and pre-converter
 
-    Prepare a data structure for JSON serialization. In an ideal world, priming
-    could be handled by the default hook of json.dumps(). Unfortunately the
-    hook treats Python 2 str as text while IPA considers str as bytes.
+    Prepare a data structure for JSON serialization. The primer is used as
+    the default hook of json.JSONEncoder (see default()), which only visits
+    values the encoder cannot serialize natively. convert() pre-converts a
+    whole data structure instead.
 
     The primer uses a couple of tricks to archive maximum performance:
 
@@ -94,6 +95,18 @@ class _JSONPrimer(dict):
         func = self[obj.__class__]
         return obj if func is _identity else func(obj)
 
+    def default(self, obj, _identity=_identity):
+        """Default hook for json.JSONEncoder
+
+        The encoder only calls the hook for objects it cannot serialize
+        itself, so containers are never copied and the values are converted
+        in the same pass that writes the JSON text.
+        """
+        func = self[obj.__class__]
+        if func is _identity:
+            raise TypeError(obj.__class__)
+        return func(obj)
+
     def _enc_datetime(self, val):
         cap = self._cap_datetime
         if cap is None:
@@ -151,11 +164,69 @@ def json_encode_binary(val, version, pretty_print=False):
     :note: pretty printing triggers a slow path in Python's JSON module. Only
            use pretty_print in debug mode.
     """
-    result = _JSONPrimer(version).convert(val)
+    default = _JSONPrimer(version).default
     if pretty_print:
-        return json.dumps(result, indent=4, sort_keys=True)
+        return json.dumps(val, default=default, indent=4, sort_keys=True)
+    else:
+        return json.dumps(val, default=default)
+
+
+def _iter_encode(val, encode, depth):
+    """Yield the JSON text of val in parts
+
+    The first depth levels of dicts and lists are split into their items,
+    everything below is passed to encode() as a whole.
+    """
+    cls = val.__class__
+    if depth and cls is dict and all(k.__class__ is unicode for k in val):
+        yield '{'
+        sep = ''
+        for k, v in six.iteritems(val):
+            yield sep + encode(k) + ': '
+            for part in _iter_encode(v, encode, depth - 1):
+                yield part
+            sep = ', '
+        yield '}'
+    elif depth and cls in (list, tuple):
+        yield '['
+        sep = ''
+        for v in val:
+            yield sep
+            for part in _iter_encode(v, encode, depth - 1):
+                yield part
+            sep = ', '
+        yield ']'
     else:
-        return json.dumps(result)
+        yield encode(val)
+
+
+def json_encode_binary_iter(val, version, chunk_size=65536, depth=3):
+    """Serialize a Python object structure to JSON in chunks
+
+    Produces the same text as json_encode_binary() without pretty printing,
+    but yields it in chunks of roughly chunk_size characters. The outer
+    depth levels of dicts and lists are written item by item, so the whole
+    document is never held in memory at once. With the default depth, each
+    entry of a JSON-RPC response of a *_find command is encoded separately.
+
+    :param object val: Python object structure
+    :param str version: client version
+    :param int chunk_size: minimal size of a chunk, except for the last one
+    :param int depth: number of container levels to split into items
+    :return: iterator of text chunks
+    """
+    encode = json.JSONEncoder(default=_JSONPrimer(version).default).encode
+    parts = []
+    size = 0
+    for part in _iter_encode(val, encode, depth):
+        parts.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield ''.join(parts)
 
 
 def _ipa_obj_hook(dct, _iteritems=six.iteritems, _list=list):
@@ -26,6 +26,9 @@ http://docs.python.org/ref/sequence-types.html
 """
 
 from collections.abc import Mapping
+import ast
+import hashlib
+import json
 import logging
 import operator
 import re
@@ -60,6 +63,11 @@ logger = logging.getLogger(__name__)
 # FIXME: Updated constants.TYPE_ERROR to use this clearer format from wehjit:
 TYPE_ERROR = '%s: need a %r; got a %r: %r'
 
+# Name of the file listing the plugins of a plugin package, see
+# `write_plugin_manifest`:
+PLUGIN_MANIFEST = 'plugin_manifest.json'
+PLUGIN_MANIFEST_VERSION = 1
+
 
 # FIXME: This function has no unit test
 def find_modules_in_dir(src_dir):
@@ -83,6 +91,167 @@ def find_modules_in_dir(src_dir):
         yield module
 
 
+def _plugin_package_digest(package_dir, modules):
+    """
+    Return digest of the source of the plugin modules in ``package_dir``.
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        digest.update(module.encode('utf-8') + b'\0')
+        with open(os.path.join(package_dir, module + '.py'), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _is_static_plugin_module(source):
+    """
+    Return True if the plugin module ``source`` registers all of its plugins
+    unconditionally at the module level.
+
+    Plugins of other modules depend on the environment at import time and
+    their modules are always imported by `API.add_package`.
+    """
+    if b'SkipPluginModule' in source:
+        return False
+    tree = ast.parse(source)
+    static = set()
+    for node in tree.body:
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef)):
+            static.update(id(d) for d in node.decorator_list)
+        elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Call):
+            static.add(id(node.value.func))
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and
+                isinstance(node.func, ast.Name) and
+                node.func.id == 'register' and
+                id(node) not in static):
+            return False
+    return True
+
+
+def make_plugin_manifest(package, bases):
+    """
+    Return the plugin manifest of the plugin package ``package``.
+
+    The manifest lists for every module of the package the plugins it
+    registers, with their name, version, names of the ``bases`` they
+    subclass and their registration flags. Modules which register plugins
+    conditionally are marked as eager.
+
+    :param package: A package from which to list plugins.
+    :param bases: Plugin base classes of the API.
+    """
+    package_dir = path.dirname(path.abspath(package.__file__))
+    modules = list(find_modules_in_dir(package_dir))
+    entries = []
+    for mname in modules:
+        entry = dict(name=mname, eager=True, plugins=[])
+        entries.append(entry)
+
+        with open(path.join(package_dir, mname + '.py'), 'rb') as f:
+            source = f.read()
+        if not _is_static_plugin_module(source):
+            continue
+
+        module = importlib.import_module('.'.join((package.__name__, mname)))
+        register = getattr(module, 'register', None)
+        if not isinstance(register, Registry):
+            entry['eager'] = False
+            continue
+
+        plugins = []
+        for kwargs in register:
+            kwargs = dict(kwargs)
+            plugin = kwargs.pop('plugin')
+            plugin_bases = [
+                base.__name__ for base in bases
+                if any(issubclass(b, base) for b in plugin.bases)
+            ]
+            if not plugin_bases or set(kwargs) - {'override', 'no_fail'}:
+                break
+            plugins.append(dict(
+                name=plugin.name,
+                version=plugin.version,
+                bases=plugin_bases,
+                override=bool(kwargs.get('override', False)),
+                no_fail=bool(kwargs.get('no_fail', False)),
+            ))
+        else:
+            entry.update(eager=False, plugins=plugins)
+
+    return dict(
+        version=PLUGIN_MANIFEST_VERSION,
+        digest=_plugin_package_digest(package_dir, modules),
+        modules=entries,
+    )
+
+
+def write_plugin_manifest(package, bases):
+    """
+    Write the plugin manifest of ``package`` into the package directory.
+
+    Return the name of the written file.
+    """
+    manifest = make_plugin_manifest(package, bases)
+    package_dir = path.dirname(path.abspath(package.__file__))
+    filename = path.join(package_dir, PLUGIN_MANIFEST)
+    with open(filename, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.write('\n')
+    return filename
+
+
+def read_plugin_manifest(package_dir, modules):
+    """
+    Return the plugin manifest of the package in ``package_dir``.
+
+    Return None if there is no manifest or if it does not match the
+    current source of ``modules``.
+    """
+    filename = path.join(package_dir, PLUGIN_MANIFEST)
+    try:
+        with open(filename, 'r') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.debug("cannot read plugin manifest %s: %s", filename, e)
+        return None
+
+    if (manifest.get('version') != PLUGIN_MANIFEST_VERSION or
+            [m['name'] for m in manifest['modules']] != modules or
+            manifest['digest'] != _plugin_package_digest(package_dir,
+                                                         modules)):
+        logger.debug("plugin manifest %s is stale", filename)
+        return None
+
+    return manifest
+
+
+class LazyPlugin:
+    """
+    Stand-in for a plugin listed in a plugin manifest.
+
+    `API` registers it in place of the plugin class and imports the plugin
+    module when the plugin is first resolved with `API._resolve`.
+    """
+    __slots__ = ('module', 'index', 'name', 'version', 'full_name', 'bases',
+                 'plugin')
+
+    def __init__(self, module, index, name, version, bases):
+        self.module = module
+        self.index = index
+        self.name = name
+        self.version = version
+        self.full_name = '{}/{}'.format(name, version)
+        self.bases = bases
+        self.plugin = None
+
+    def __repr__(self):
+        return '<%s %s from %s>' % (
+            self.__class__.__name__, self.full_name, self.module)
+
+
 class Registry:
     """A decorator that makes plugins available to the API
 
@@ -318,19 +487,31 @@ class APINameSpace(Mapping):
 
     def __iter__(self):
         self.__enumerate()
+        plugins = self.__plugins
+        if any(isinstance(p, LazyPlugin) for p in plugins):
+            for plugin in plugins:
+                self.__api._resolve(plugin)
+            self.__enumerate()
         return iter(self.__plugins)
 
     def __dir__(self):
         # include plugins for readline tab completion and in dir()
         self.__enumerate()
         names = super().__dir__()
-        names.extend(p.name for p in self)
+        names.extend(p.name for p in self.__plugins)
         names.sort()
         return names
 
+    def _reset(self):
+        self.__plugins = None
+        self.__plugins_by_key = None
+
     def get_plugin(self, key):
         self.__enumerate()
-        return self.__plugins_by_key[key]
+        plugin = self.__plugins_by_key[key]
+        if isinstance(plugin, LazyPlugin):
+            plugin = self.__api._resolve(plugin)
+        return plugin
 
     def __getitem__(self, key):
         plugin = self.get_plugin(key)
@@ -358,6 +539,8 @@ class API(ReadOnly):
         self.__default_map = {}
         self.__instances = {}
         self.__next = {}
+        self.__lazy = {}
+        self.__lazy_lock = threading.RLock()
         self.__done = set()
         self.env = Env()
 
@@ -632,11 +815,17 @@ class API(ReadOnly):
         for package in self.packages:
             self.add_package(package)
 
-    # FIXME: This method has no unit test
     def add_package(self, package):
         """
         Add plugin modules from the ``package``.
 
+        If plugins are finalized on demand and the package has an up to date
+        plugin manifest, plugins listed in it are added as `LazyPlugin`
+        objects and their modules are imported only when the plugins are
+        first used. Otherwise all modules of the package are imported, as in
+        the server and the admin tools, which finalize all plugins at
+        startup.
+
         :param package: A package from which to add modules.
         """
         package_name = package.__name__
@@ -650,27 +839,61 @@ class API(ReadOnly):
                 name=package_name, file=package_file
             )
 
-        logger.debug("importing all plugin modules in %s...", package_name)
-        modules = getattr(package, 'modules', find_modules_in_dir(package_dir))
-        modules = ['.'.join((package_name, mname)) for mname in modules]
+        modules = getattr(package, 'modules', None)
+        manifest = None
+        if modules is None:
+            modules = list(find_modules_in_dir(package_dir))
+            if self.env.plugins_on_demand:
+                manifest = read_plugin_manifest(package_dir, modules)
+        if manifest is not None:
+            bases = {base.__name__: base for base in self.bases}
+            if not all(name in bases
+                       for entry in manifest['modules']
+                       for plugin in entry['plugins']
+                       for name in plugin['bases']):
+                manifest = None
+
+        if manifest is None:
+            logger.debug("importing all plugin modules in %s...",
+                         package_name)
+            for mname in modules:
+                self.__add_plugin_module('.'.join((package_name, mname)))
+            return
 
-        for name in modules:
-            logger.debug("importing plugin module %s", name)
-            try:
-                module = importlib.import_module(name)
-            except errors.SkipPluginModule as e:
-                logger.debug("skipping plugin module %s: %s", name, e.reason)
+        logger.debug("registering plugins in %s from plugin manifest...",
+                     package_name)
+        for entry in manifest['modules']:
+            name = '.'.join((package_name, entry['name']))
+            if entry['eager']:
+                self.__add_plugin_module(name)
                 continue
-            except Exception:
-                tb = self.env.startup_traceback
-                if tb:
-                    logger.exception("could not load plugin module %s", name)
-                raise
+            proxies = self.__lazy.setdefault(name, [])
+            for index, plugin in enumerate(entry['plugins']):
+                proxy = LazyPlugin(
+                    name, index, plugin['name'], plugin['version'],
+                    tuple(bases[b] for b in plugin['bases']))
+                proxies.append(proxy)
+                self.add_plugin(proxy,
+                                override=plugin['override'],
+                                no_fail=plugin['no_fail'])
+
+    def __add_plugin_module(self, name):
+        logger.debug("importing plugin module %s", name)
+        try:
+            module = importlib.import_module(name)
+        except errors.SkipPluginModule as e:
+            logger.debug("skipping plugin module %s: %s", name, e.reason)
+            return
+        except Exception:
+            tb = self.env.startup_traceback
+            if tb:
+                logger.exception("could not load plugin module %s", name)
+            raise
 
-            try:
-                self.add_module(module)
-            except errors.PluginModuleError as e:
-                logger.debug("%s", e)
+        try:
+            self.add_module(module)
+        except errors.PluginModuleError as e:
+            logger.debug("%s", e)
 
     def add_module(self, module):
         """
@@ -697,7 +920,7 @@ class API(ReadOnly):
         :param plugin: A subclass of `Plugin` to attempt to add.
         :param override: If true, override an already added plugin.
         """
-        if not callable(plugin):
+        if not isinstance(plugin, LazyPlugin) and not callable(plugin):
             raise TypeError('plugin must be callable; got %r' % plugin)
 
         # Find the base class or raise SubclassError:
@@ -779,7 +1002,7 @@ class API(ReadOnly):
         production_mode = self.is_production_mode()
 
         for base in self.bases:
-            for plugin in self.__plugins:
+            for plugin in list(self.__plugins):
                 if not any(issubclass(b, base) for b in plugin.bases):
                     continue
                 if not self.env.plugins_on_demand:
@@ -801,7 +1024,52 @@ class API(ReadOnly):
         if not production_mode:
             lock(self)
 
+    def _resolve(self, plugin):
+        """
+        Return the plugin class of ``plugin``.
+
+        If ``plugin`` is a `LazyPlugin`, its module is imported and all
+        lazy plugins of the module are replaced with the plugin classes.
+        """
+        if not isinstance(plugin, LazyPlugin):
+            return plugin
+        with self.__lazy_lock:
+            if plugin.plugin is None:
+                self.__import_lazy_module(plugin.module)
+        return plugin.plugin
+
+    def __import_lazy_module(self, name):
+        logger.debug("importing plugin module %s", name)
+        module = importlib.import_module(name)
+        register = getattr(module, 'register', None)
+        if not isinstance(register, Registry):
+            raise errors.PluginModuleError(name=name)
+        registered = [kwargs['plugin'] for kwargs in register]
+
+        proxies = self.__lazy.pop(name)
+        for proxy in proxies:
+            if (proxy.index >= len(registered) or
+                    registered[proxy.index].full_name != proxy.full_name):
+                raise errors.PluginModuleError(name=name)
+            proxy.plugin = plugin = registered[proxy.index]
+            if proxy in self.__plugins:
+                self.__plugins.remove(proxy)
+                self.__plugins.add(plugin)
+            if self.__plugins_by_key.get(proxy.full_name) is proxy:
+                self.__plugins_by_key[proxy.full_name] = plugin
+            if proxy in self.__next:
+                self.__next[plugin] = self.__next.pop(proxy)
+        for key, prev in self.__next.items():
+            if isinstance(prev, LazyPlugin) and prev.plugin is not None:
+                self.__next[key] = prev.plugin
+
+        for base in self.bases:
+            namespace = getattr(self, base.__name__, None)
+            if isinstance(namespace, APINameSpace):
+                namespace._reset()
+
     def _get(self, plugin):
+        plugin = self._resolve(plugin)
         if not callable(plugin):
             raise TypeError('plugin must be callable; got %r' % plugin)
         if plugin not in self.__plugins:
@@ -818,7 +1086,7 @@ class API(ReadOnly):
         if not callable(plugin):
             raise TypeError('plugin must be callable; got %r' % plugin)
 
-        return self.__next[plugin]
+        return self._resolve(self.__next[plugin])
 
 
 class IPAHelpFormatter(optparse.IndentedHelpFormatter):
@@ -0,0 +1,146 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Per-request profiling of LDAP operations, Dogtag calls and plugin callbacks.
+
+Profiling of a request is started with `start`, which stores a
+`RequestProfile` in the thread-local request context. Instrumented
+operations record their count, duration, number of returned entries and
+cache hits into it. When no profile is active the instrumentation costs
+one context lookup per operation.
+"""
+
+import functools
+import json
+import threading
+import time
+
+from ipalib.request import context
+
+
+class RequestProfile:
+    """
+    Operation statistics collected while serving one request.
+    """
+
+    def __init__(self, reply=False):
+        self.command = None
+        self.reply = reply
+        self.start = time.perf_counter()
+        self.etime = None
+        self.operations = {}
+        # operations may be recorded from worker threads of the request
+        self._lock = threading.Lock()
+
+    def record(self, category, name, duration, entries=0, cache_hit=False):
+        """
+        Record one operation.
+
+        :param category: kind of the operation, e.g. ``ldap`` or ``dogtag``
+        :param name: name of the operation
+        :param duration: duration of the operation in seconds
+        :param entries: number of entries the operation returned
+        :param cache_hit: True if the operation was served from a cache
+        """
+        with self._lock:
+            stats = self.operations.get((category, name))
+            if stats is None:
+                stats = self.operations[(category, name)] = dict(
+                    count=0, time=0.0, entries=0, cache_hits=0)
+            stats['count'] += 1
+            stats['time'] += duration
+            stats['entries'] += entries
+            if cache_hit:
+                stats['cache_hits'] += 1
+
+    def finish(self, command):
+        self.command = command
+        self.etime = time.perf_counter() - self.start
+
+    def as_dict(self):
+        """
+        Return the profile as a dictionary, durations are in milliseconds.
+        """
+        operations = []
+        for (category, name), stats in sorted(self.operations.items()):
+            operations.append(dict(
+                category=category,
+                name=name,
+                count=stats['count'],
+                time=round(stats['time'] * 1000, 3),
+                entries=stats['entries'],
+                cache_hits=stats['cache_hits'],
+            ))
+        etime = self.etime
+        if etime is None:
+            etime = time.perf_counter() - self.start
+        return dict(
+            command=self.command,
+            etime=round(etime * 1000, 3),
+            operations=operations,
+        )
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+
+def start(reply=False):
+    """
+    Start profiling of the current request and return the profile.
+
+    :param reply: True if the profile should be returned to the client
+    """
+    profile = RequestProfile(reply=reply)
+    context.profile = profile
+    return profile
+
+
+def get_profile():
+    """
+    Return the profile of the current request or None.
+    """
+    return getattr(context, 'profile', None)
+
+
+def record(category, name, duration, entries=0, cache_hit=False):
+    """
+    Record an operation in the profile of the current request, if any.
+    """
+    profile = getattr(context, 'profile', None)
+    if profile is not None:
+        profile.record(category, name, duration, entries, cache_hit)
+
+
+def profiled(category, name=None, count_entries=None):
+    """
+    Decorator recording every call of the decorated function.
+
+    :param category: kind of the operation
+    :param name: name of the operation, the function name by default
+    :param count_entries: optional function returning the number of
+        entries from the function's return value
+    """
+    def decorator(func):
+        op_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = getattr(context, 'profile', None)
+            if profile is None:
+                return func(*args, **kwargs)
+            entries = 0
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                if count_entries is not None:
+                    entries = count_entries(result)
+                return result
+            finally:
+                profile.record(category, op_name,
+                               time.perf_counter() - started, entries)
+
+        return wrapper
+
+    return decorator
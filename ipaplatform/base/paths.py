@@ -201,6 +201,7 @@ class BasePathNamespace:
     FIREFOX = "/usr/bin/firefox"
     GETCERT = "/usr/bin/getcert"
     GPG2 = "/usr/bin/gpg"
+    PIGZ = "/usr/bin/pigz"
     GPG_CONF = "/usr/bin/gpgconf"
     GPG_CONNECT_AGENT = "/usr/bin/gpg-connect-agent"
     GPG_AGENT = "/usr/bin/gpg-agent"
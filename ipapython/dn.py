@@ -436,7 +436,11 @@ else:
 if six.PY3:
     unicode = str
 
-__all__ = 'AVA', 'RDN', 'DN'
+__all__ = 'AVA', 'RDN', 'DN', 'LazyDN'
+
+# Maximum number of parsed DN strings kept by _parse_dn()
+DN_CACHE_SIZE = 4096
+
 
 def _adjust_indices(start, end, length):
     'helper to fixup start/end slice values'
@@ -529,21 +533,28 @@ def ava_key(ava):
     return ava[0].lower(), ava[1].lower()
 
 
-def cmp_rdns(a, b):
-    key_a = rdn_key(a)
-    key_b = rdn_key(b)
-    if key_a == key_b:
-        return 0
-    elif key_a < key_b:
-        return -1
-    else:
-        return 1
-
-
 def rdn_key(rdn):
     return (len(rdn),) + tuple(ava_key(k) for k in rdn)
 
 
+@functools.lru_cache(maxsize=DN_CACHE_SIZE)
+def _parse_dn(value):
+    '''
+    Parse DN string into its RDNs and their comparison key.
+
+    The same DNs are parsed over and over (base DNs, containers, member
+    values), so the results are cached. They are shared by all DN
+    instances created from the string and must not be modified.
+    '''
+    try:
+        rdns = str2dn(val_encode(value))
+    except DECODING_ERROR:
+        raise ValueError("malformed RDN string = \"%s\"" % value)
+    for rdn in rdns:
+        sort_avas(rdn)
+    return rdns, tuple(rdn_key(rdn) for rdn in rdns)
+
+
 if six.PY2:
     # Python 2: Input/output is unicode; we store UTF-8 bytes
     def val_encode(s):
@@ -1109,8 +1120,15 @@ class DN:
     AVA_type = AVA
     RDN_type = RDN
 
+    # Comparison key and string representation, computed on first use
+    _key = None
+    _text = None
+
     def __init__(self, *args, **kwds):
-        self.rdns = self._rdns_from_sequence(args)
+        if len(args) == 1 and isinstance(args[0], str):
+            self.rdns, self._key = _parse_dn(args[0])
+        else:
+            self.rdns = self._rdns_from_sequence(args)
 
     def _copy_rdns(self, rdns=None):
         if not rdns:
@@ -1119,14 +1137,7 @@ class DN:
 
     def _rdns_from_value(self, value):
         if isinstance(value, str):
-            try:
-                if isinstance(value, str):
-                    value = val_encode(value)
-                rdns = str2dn(value)
-            except DECODING_ERROR:
-                raise ValueError("malformed RDN string = \"%s\"" % value)
-            for rdn in rdns:
-                sort_avas(rdn)
+            rdns = _parse_dn(value)[0]
         elif isinstance(value, DN):
             rdns = value._copy_rdns()
         elif isinstance(value, (tuple, list, AVA)):
@@ -1163,8 +1174,15 @@ class DN:
     def _get_rdn(self, rdn):
         return self.RDN_type(*rdn, **{'raw': True})
 
+    def _get_key(self):
+        if self._key is None:
+            self._key = tuple(rdn_key(rdn) for rdn in self.rdns)
+        return self._key
+
     def ldap_text(self):
-        return dn2str(self.rdns)
+        if self._text is None:
+            self._text = dn2str(self.rdns)
+        return self._text
 
     def x500_text(self):
         return dn2str(reversed(self.rdns))
@@ -1210,13 +1228,7 @@ class DN:
         # hash value between two objects which compare as equal but
         # differ in case must yield the same hash value.
 
-        str_dn = ';,'.join([
-            '++'.join([
-                '=='.join((atype, avalue or ''))
-                for atype, avalue, _dummy in rdn
-            ]) for rdn in self.rdns
-        ])
-        return hash(str_dn.lower())
+        return hash(self._get_key())
 
     def __eq__(self, other):
         # Try coercing to DN, if successful compare to coerced object
@@ -1231,11 +1243,8 @@ class DN:
         if not isinstance(other, DN):
             return False
 
-        if len(self) != len(other):
-            return False
-
         # Perform comparison between objects of same type
-        return self._cmp_sequence(other, 0, len(self)) == 0
+        return self._get_key() == other._get_key()
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -1247,18 +1256,17 @@ class DN:
         if len(self) != len(other):
             return len(self) < len(other)
 
-        return self._cmp_sequence(other, 0, len(self)) < 0
+        return self._get_key() < other._get_key()
 
     def _cmp_sequence(self, pattern, self_start, pat_len):
-        self_idx = self_start
-        pat_idx = 0
-        while pat_idx < pat_len:
-            r = cmp_rdns(self.rdns[self_idx], pattern.rdns[pat_idx])
-            if r != 0:
-                return r
-            self_idx += 1
-            pat_idx += 1
-        return 0
+        key = self._get_key()[self_start:self_start + pat_len]
+        pat_key = pattern._get_key()[:pat_len]
+        if key == pat_key:
+            return 0
+        elif key < pat_key:
+            return -1
+        else:
+            return 1
 
     def __add__(self, other):
         return self.__class__(self, other)
@@ -1436,6 +1444,40 @@ class DN:
         return i
 
 
+class LazyDN(DN):
+    '''
+    A DN created from a DN string which is parsed only when needed.
+
+    Large search results contain many DNs which are never looked at.
+    LazyDN defers parsing until the DN is compared, hashed, converted to
+    a string or its RDNs are accessed. A malformed string raises
+    ValueError only then, so LazyDN must only be used for DN strings
+    which come from a LDAP library or server.
+    '''
+
+    def __init__(self, *args, **kwds):
+        if len(args) == 1 and isinstance(args[0], str):
+            self._value = args[0]
+            self._rdns = None
+        else:
+            super(LazyDN, self).__init__(*args, **kwds)
+
+    def _get_rdns(self):
+        if self._rdns is None:
+            self._rdns, self._key = _parse_dn(self._value)
+        return self._rdns
+
+    def _set_rdns(self, rdns):
+        self._rdns = rdns
+
+    rdns = property(_get_rdns, _set_rdns)
+
+    def _get_key(self):
+        if self._key is None and self._rdns is None:
+            self._get_rdns()
+        return super(LazyDN, self)._get_key()
+
+
 ATTR_NAME_BY_OID = {
     cryptography.x509.oid.NameOID.COMMON_NAME: 'CN',
     cryptography.x509.oid.NameOID.COUNTRY_NAME: 'C',
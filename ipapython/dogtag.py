@@ -74,6 +74,17 @@ else:
             return f.read()
 
 
+def decode_content(encoding, body):
+    """
+    Decode a HTTP response body according to its Content-Encoding.
+    """
+    if encoding == 'gzip':
+        return gzip_decompress(body)
+    elif encoding == 'deflate':
+        return zlib.decompress(body)
+    return body
+
+
 def error_from_xml(doc, message_template):
     try:
         item_node = doc.getElementsByTagName("Error")
@@ -279,11 +290,7 @@ def _httplib_request(
         logger.debug("httplib request failed:", exc_info=True)
         raise NetworkError(uri=uri, error=str(e))
 
-    encoding = res.getheader('Content-Encoding')
-    if encoding == 'gzip':
-        http_body = gzip_decompress(http_body)
-    elif encoding == 'deflate':
-        http_body = zlib.decompress(http_body)
+    http_body = decode_content(res.getheader('Content-Encoding'), http_body)
 
     logger.debug('response status %d',    http_status)
     logger.debug('response headers %s',   http_headers)
@@ -86,3 +86,186 @@ class Graph:
                 visited.add(vertex)
                 queue.extend(set(self._adj.get(vertex, [])) - visited)
         return visited
+
+    def distances(self, start):
+        """
+        Breadth-first search traversal of the graph from `start` vertex.
+        Return a dict mapping every visited vertex to its hop distance from
+        `start`
+        """
+        distances = {start: 0}
+        queue = deque([start])
+
+        while queue:
+            vertex = queue.popleft()
+            for head in self._adj.get(vertex, []):
+                if head not in distances:
+                    distances[head] = distances[vertex] + 1
+                    queue.append(head)
+        return distances
+
+    def strongly_connected_components(self, ignore_vertices=(),
+                                      ignore_edges=()):
+        """
+        Find strongly connected components of the graph in O(V + E) using
+        Tarjan's algorithm.
+
+        Vertices in `ignore_vertices` and (tail, head) edges in
+        `ignore_edges` are treated as if they were removed from the graph,
+        which allows to examine a modified graph without copying it.
+
+        Return a list of sets of vertices in reverse topological order, i.e.
+        no component has an edge leading to a component listed after it.
+        """
+        ignore_vertices = set(ignore_vertices)
+        ignore_edges = set(ignore_edges)
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+
+        for root in self.vertices:
+            if root in index or root in ignore_vertices:
+                continue
+
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self._adj[root]))]
+
+            while work:
+                vertex, heads = work[-1]
+                for head in heads:
+                    if (head in ignore_vertices or
+                            (vertex, head) in ignore_edges):
+                        continue
+                    if head not in index:
+                        index[head] = lowlink[head] = len(index)
+                        stack.append(head)
+                        on_stack.add(head)
+                        work.append((head, iter(self._adj[head])))
+                        break
+                    if head in on_stack:
+                        lowlink[vertex] = min(lowlink[vertex], index[head])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent],
+                                              lowlink[vertex])
+                    if lowlink[vertex] == index[vertex]:
+                        component = set()
+                        while True:
+                            member = stack.pop()
+                            on_stack.remove(member)
+                            component.add(member)
+                            if member == vertex:
+                                break
+                        components.append(component)
+
+        return components
+
+    def reachable_sets(self, ignore_vertices=(), ignore_edges=()):
+        """
+        Compute the set of vertices reachable from each vertex.
+
+        The sets are computed once per strongly connected component over the
+        condensation of the graph and shared by all vertices of the
+        component. A strongly connected graph is thus processed in
+        O(V + E). See `strongly_connected_components` for the meaning of
+        `ignore_vertices` and `ignore_edges`.
+
+        Return a dict mapping vertices to frozensets of vertices
+        """
+        ignore_vertices = set(ignore_vertices)
+        ignore_edges = set(ignore_edges)
+        components = self.strongly_connected_components(
+            ignore_vertices, ignore_edges)
+        reachable = {}
+
+        # components come in reverse topological order, successors of
+        # a component are always resolved before the component itself
+        for component in components:
+            visited = set(component)
+            for vertex in component:
+                for head in self._adj[vertex]:
+                    if (head in ignore_vertices or head in visited or
+                            (vertex, head) in ignore_edges):
+                        continue
+                    visited.update(reachable[head])
+            visited = frozenset(visited)
+            for vertex in component:
+                reachable[vertex] = visited
+
+        return reachable
+
+    def _undirected_adj(self):
+        adj = {v: set() for v in self.vertices}
+        for tail, head in self.edges:
+            if tail != head:
+                adj[tail].add(head)
+                adj[head].add(tail)
+        return adj
+
+    def _cut_vertices_and_bridges(self):
+        """
+        Depth-first search over the underlying undirected graph computing
+        its articulation points and bridges in O(V + E) (Hopcroft-Tarjan).
+        """
+        adj = self._undirected_adj()
+        index = {}
+        lowpoint = {}
+        cut_vertices = set()
+        bridges = []
+
+        for root in adj:
+            if root in index:
+                continue
+
+            index[root] = lowpoint[root] = len(index)
+            root_children = 0
+            work = [(root, None, iter(adj[root]))]
+
+            while work:
+                vertex, parent, neighbours = work[-1]
+                for neighbour in neighbours:
+                    if neighbour == parent:
+                        continue
+                    if neighbour not in index:
+                        index[neighbour] = lowpoint[neighbour] = len(index)
+                        work.append(
+                            (neighbour, vertex, iter(adj[neighbour])))
+                        break
+                    lowpoint[vertex] = min(lowpoint[vertex], index[neighbour])
+                else:
+                    work.pop()
+                    if parent is None:
+                        continue
+                    lowpoint[parent] = min(lowpoint[parent], lowpoint[vertex])
+                    if lowpoint[vertex] > index[parent]:
+                        bridges.append((parent, vertex))
+                    if parent == root:
+                        root_children += 1
+                    elif lowpoint[vertex] >= index[parent]:
+                        cut_vertices.add(parent)
+
+            if root_children > 1:
+                cut_vertices.add(root)
+
+        return cut_vertices, bridges
+
+    def articulation_points(self):
+        """
+        Get set of vertices whose removal splits a connected part of the
+        graph, direction of edges is not taken into account
+        """
+        return self._cut_vertices_and_bridges()[0]
+
+    def bridges(self):
+        """
+        Get list of pairs of adjacent vertices whose connection is the only
+        path between them, i.e. removing it splits a connected part of the
+        graph, direction of edges is not taken into account
+        """
+        return self._cut_vertices_and_bridges()[1]
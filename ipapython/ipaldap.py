@@ -25,7 +25,6 @@ import logging
 import time
 from datetime import datetime
 from decimal import Decimal
-from copy import deepcopy
 import contextlib
 import os
 import pwd
@@ -40,16 +39,17 @@ import ldap
 import ldap.sasl
 import ldap.filter
 from ldap.controls import SimplePagedResultsControl, GetEffectiveRightsControl
+from ldap.controls.psearch import PersistentSearchControl
 import ldapurl
 import six
 
 # pylint: disable=ipa-forbidden-import
-from ipalib import errors, x509, _
+from ipalib import errors, profiler, x509, _
 from ipalib.constants import LDAP_GENERALIZED_TIME_FORMAT
 # pylint: enable=ipa-forbidden-import
 from ipaplatform.paths import paths
 from ipapython.ipautil import format_netloc, CIDict
-from ipapython.dn import DN, RDN
+from ipapython.dn import DN, RDN, LazyDN
 from ipapython.dnsutil import DNSName
 from ipapython.kerberos import Principal
 
@@ -79,6 +79,14 @@ TRUNCATED_ADMIN_LIMIT = object()
 
 DIRMAN_DN = DN(('cn', 'directory manager'))
 
+# initial polling interval of LDAPClient.watch_entry() without persistent
+# search, doubled after every poll
+WATCH_MIN_INTERVAL = 0.1
+
+# attributes of a directory server task entry reporting the task's state
+TASK_STATUS_ATTRS = ['nsTaskStatus', 'nsTaskExitCode', 'nsTaskCurrentItem',
+                     'nsTaskTotalItems', 'nsTaskLog']
+
 
 if six.PY2 and hasattr(ldap, 'LDAPBytesWarning'):
     # XXX silence python-ldap's BytesWarnings
@@ -338,8 +346,8 @@ class LDAPEntry(MutableMapping):
         raw = self._raw[name]
         assert isinstance(raw, list)
 
-        nice_sync, raw_sync = self._sync.setdefault(name, ([], []))
-        if nice == nice_sync and raw == raw_sync:
+        nice_sync, raw_sync = self._sync.get(name, ((), ()))
+        if tuple(nice) == nice_sync and tuple(raw) == raw_sync:
             return
 
         nice_adds = set(nice) - set(nice_sync)
@@ -379,7 +387,9 @@ class LDAPEntry(MutableMapping):
                 continue
             nice.append(value)
 
-        self._sync[name] = (deepcopy(nice), deepcopy(raw))
+        # Values are immutable, so tuples are enough to take a snapshot
+        # that is not affected by in-place changes of the lists.
+        self._sync[name] = (tuple(nice), tuple(raw))
 
         if len(nice) > 1:
             self._not_list.discard(name)
@@ -551,7 +561,11 @@ class LDAPEntry(MutableMapping):
         if other is None:
             other = self
         assert isinstance(other, LDAPEntry)
-        self._orig_raw = deepcopy(dict(other.raw))
+        # Raw values are immutable bytes, only the lists need to be copied.
+        # The tuples are shared by copies of the entry and never modified.
+        self._orig_raw = {
+            name: tuple(value) for name, value in other.raw.items()
+        }
 
     def generate_modlist(self):
         modlist = []
@@ -1074,7 +1088,7 @@ class LDAPClient:
 
                 continue
 
-            ipa_entry = LDAPEntry(self, DN(original_dn))
+            ipa_entry = LDAPEntry(self, LazyDN(original_dn))
 
             for attr, original_values in original_attrs.items():
                 ipa_entry.raw[attr] = original_values
@@ -1486,6 +1500,42 @@ class LDAPClient:
 
         return entries
 
+    def iter_entries(self, base_dn, scope=ldap.SCOPE_SUBTREE, filter=None,
+                     attrs_list=None, get_effective_rights=False, **kwargs):
+        """Return a generator of matching entries.
+
+        Unlike get_entries(), entries are yielded as they are received from
+        the server, so with paged_search=True memory use is bounded by the
+        page size rather than by the size of the result set.
+
+        :raises: errors.LimitsExceeded after the last entry has been yielded
+                 if the result set was truncated by the server
+        :raises: errors.NotFound if base_dn doesn't exist
+
+        An empty result set yields no entries and does not raise.
+
+        :param base_dn: dn of the entry at which to start the search
+        :param scope: search scope, see LDAP docs (default ldap2.SCOPE_SUBTREE)
+        :param filter: LDAP filter to apply
+        :param attrs_list: ist of attributes to return, all if None (default)
+        :param get_effective_rights: use GetEffectiveRights control
+        :param kwargs: additional keyword arguments. See find_entries method
+        for their description.
+        """
+        truncated = yield from self._iter_entries(
+            base_dn=base_dn, scope=scope, filter=filter, attrs_list=attrs_list,
+            get_effective_rights=get_effective_rights,
+            **kwargs)
+        try:
+            self.handle_truncated_result(truncated)
+        except errors.LimitsExceeded as e:
+            logger.error(
+                "%s while iterating entries (base DN: %s, filter: %s)",
+                e, base_dn, filter
+            )
+            raise
+
+    @profiler.profiled('ldap', count_entries=lambda result: len(result[0]))
     def find_entries(
             self, filter=None, attrs_list=None, base_dn=None,
             scope=ldap.SCOPE_SUBTREE, time_limit=None, size_limit=None,
@@ -1511,12 +1561,40 @@ class LDAPClient:
         :raises: errors.NotFound if result set is empty
                                  or base_dn doesn't exist
         """
+        res = []
+        entries = self._iter_entries(
+            filter=filter, attrs_list=attrs_list, base_dn=base_dn,
+            scope=scope, time_limit=time_limit, size_limit=size_limit,
+            paged_search=paged_search,
+            get_effective_rights=get_effective_rights)
+        while True:
+            try:
+                res.append(next(entries))
+            except StopIteration as e:
+                truncated = e.value
+                break
+
+        if not res and not truncated:
+            raise errors.EmptyResult(reason='no matching entry found')
+
+        return (res, truncated)
+
+    def _iter_entries(
+            self, filter=None, attrs_list=None, base_dn=None,
+            scope=ldap.SCOPE_SUBTREE, time_limit=None, size_limit=None,
+            paged_search=False, get_effective_rights=False):
+        """
+        Generator yielding entries matching the search parameters.
+
+        The truncated flag (see find_entries) is the return value of the
+        generator. If the generator is closed before it is exhausted, the
+        outstanding search operation is abandoned.
+        """
         if base_dn is None:
             base_dn = DN()
         assert isinstance(base_dn, DN)
         if not filter:
             filter = '(objectClass=*)'
-        res = []
         truncated = False
 
         if time_limit is None:
@@ -1544,80 +1622,102 @@ class LDAPClient:
         if page_size == 0:
             paged_search = False
 
-        # pass arguments to python-ldap
-        with self.error_handler():
-            if six.PY2:
-                filter = self.encode(filter)
-                attrs_list = self.encode(attrs_list)
-
-            while True:
-                if paged_search:
-                    sctrls = base_sctrls + [
-                        SimplePagedResultsControl(0, page_size, cookie)
-                    ]
-                else:
-                    sctrls = base_sctrls or None
+        # id of the search operation whose results are being read
+        msgid = None
 
-                try:
-                    id = self.conn.search_ext(
-                        str(base_dn), scope, filter, attrs_list,
-                        serverctrls=sctrls, timeout=time_limit,
-                        sizelimit=size_limit
-                    )
-                    while True:
-                        result = self.conn.result3(id, 0)
-                        objtype, res_list, _res_id, res_ctrls = result
-                        if objtype == ldap.RES_SEARCH_RESULT:
-                            break
-                        res_list = self._convert_result(res_list)
-                        if res_list:
-                            res.append(res_list[0])
+        # pass arguments to python-ldap
+        try:
+            with self.error_handler():
+                if six.PY2:
+                    filter = self.encode(filter)
+                    attrs_list = self.encode(attrs_list)
 
+                while True:
                     if paged_search:
-                        # Get cookie for the next page
-                        for ctrl in res_ctrls:
-                            if isinstance(ctrl, SimplePagedResultsControl):
-                                cookie = ctrl.cookie
+                        sctrls = base_sctrls + [
+                            SimplePagedResultsControl(0, page_size, cookie)
+                        ]
+                    else:
+                        sctrls = base_sctrls or None
+
+                    try:
+                        msgid = self.conn.search_ext(
+                            str(base_dn), scope, filter, attrs_list,
+                            serverctrls=sctrls, timeout=time_limit,
+                            sizelimit=size_limit
+                        )
+                        while True:
+                            result = self.conn.result3(msgid, 0)
+                            objtype, res_list, _res_id, res_ctrls = result
+                            if objtype == ldap.RES_SEARCH_RESULT:
+                                msgid = None
                                 break
-                        else:
+                            res_list = self._convert_result(res_list)
+                            if res_list:
+                                yield res_list[0]
+
+                        if paged_search:
+                            # Get cookie for the next page
+                            for ctrl in res_ctrls:
+                                if isinstance(ctrl, SimplePagedResultsControl):
+                                    cookie = ctrl.cookie
+                                    break
+                            else:
+                                cookie = ''
+                    except ldap.ADMINLIMIT_EXCEEDED:
+                        truncated = TRUNCATED_ADMIN_LIMIT
+                        break
+                    except ldap.SIZELIMIT_EXCEEDED:
+                        truncated = TRUNCATED_SIZE_LIMIT
+                        break
+                    except ldap.TIMELIMIT_EXCEEDED:
+                        truncated = TRUNCATED_TIME_LIMIT
+                        break
+                    except ldap.LDAPError as e:
+                        msgid = None
+                        # If paged search is in progress, try to cancel it
+                        if paged_search and cookie:
+                            self._cancel_paged_search(
+                                base_dn, scope, filter, attrs_list,
+                                time_limit, size_limit, cookie)
                             cookie = ''
-                except ldap.ADMINLIMIT_EXCEEDED:
-                    truncated = TRUNCATED_ADMIN_LIMIT
-                    break
-                except ldap.SIZELIMIT_EXCEEDED:
-                    truncated = TRUNCATED_SIZE_LIMIT
-                    break
-                except ldap.TIMELIMIT_EXCEEDED:
-                    truncated = TRUNCATED_TIME_LIMIT
-                    break
-                except ldap.LDAPError as e:
-                    # If paged search is in progress, try to cancel it
-                    if paged_search and cookie:
-                        sctrls = [SimplePagedResultsControl(0, 0, cookie)]
+
                         try:
-                            self.conn.search_ext_s(
-                                str(base_dn), scope, filter, attrs_list,
-                                serverctrls=sctrls, timeout=time_limit,
-                                sizelimit=size_limit)
-                        except ldap.LDAPError as e2:
-                            logger.warning(
-                                "Error cancelling paged search: %s", e2)
-                        cookie = ''
+                            raise e
+                        except (ldap.ADMINLIMIT_EXCEEDED,
+                                ldap.TIMELIMIT_EXCEEDED,
+                                ldap.SIZELIMIT_EXCEEDED):
+                            truncated = True
+                            break
 
-                    try:
-                        raise e
-                    except (ldap.ADMINLIMIT_EXCEEDED, ldap.TIMELIMIT_EXCEEDED,
-                            ldap.SIZELIMIT_EXCEEDED):
-                        truncated = True
+                    if not paged_search or not cookie:
                         break
+        except GeneratorExit:
+            # The consumer stopped before the search completed, release
+            # the server side resources held by the search.
+            if msgid is not None:
+                try:
+                    self.conn.abandon(msgid)
+                except ldap.LDAPError as e:
+                    logger.warning("Error abandoning search: %s", e)
+            if paged_search and cookie:
+                self._cancel_paged_search(
+                    base_dn, scope, filter, attrs_list,
+                    time_limit, size_limit, cookie)
+            raise
 
-                if not paged_search or not cookie:
-                    break
+        return truncated
 
-        if not res and not truncated:
-            raise errors.EmptyResult(reason='no matching entry found')
-
-        return (res, truncated)
+    def _cancel_paged_search(self, base_dn, scope, filter, attrs_list,
+                             time_limit, size_limit, cookie):
+        sctrls = [SimplePagedResultsControl(0, 0, cookie)]
+        try:
+            self.conn.search_ext_s(
+                str(base_dn), scope, filter, attrs_list,
+                serverctrls=sctrls, timeout=time_limit,
+                sizelimit=size_limit)
+        except ldap.LDAPError as e:
+            logger.warning("Error cancelling paged search: %s", e)
 
     def __get_effective_rights_control(self):
         """Construct a GetEffectiveRights control for current user."""
@@ -1667,6 +1767,7 @@ class LDAPClient:
 
         return entries[0]
 
+    @profiler.profiled('ldap')
     def add_entry(self, entry):
         """Create a new entry.
 
@@ -1681,6 +1782,18 @@ class LDAPClient:
 
         entry.reset_modlist()
 
+    def add_entry_async(self, entry):
+        """Start an asynchronous add of a new entry.
+
+        Returns the message ID of the add operation. The result has to be
+        collected with wait_for_result().
+        """
+        attrs = dict((k, v) for k, v in entry.raw.items() if v)
+
+        with self.error_handler():
+            attrs = self.encode(attrs)
+            return self.conn.add_ext(str(entry.dn), list(attrs.items()))
+
     def move_entry(self, dn, new_dn, del_old=True):
         """
         Move an entry (either to a new superior or/and changing relative distinguished name)
@@ -1712,6 +1825,7 @@ class LDAPClient:
                                delold=int(del_old))
             time.sleep(.3)  # Give memberOf plugin a chance to work
 
+    @profiler.profiled('ldap')
     def update_entry(self, entry):
         """Update entry's attributes.
 
@@ -1731,6 +1845,165 @@ class LDAPClient:
 
         entry.reset_modlist()
 
+    def update_entry_async(self, entry):
+        """Start an asynchronous update of entry's attributes.
+
+        Returns the message ID of the modify operation. The result has to
+        be collected with wait_for_result(); the entry's modlist is not
+        reset until then.
+        """
+        modlist = entry.generate_modlist()
+        if not modlist:
+            raise errors.EmptyModlist()
+        logger.debug("update_entry_async modlist %s", modlist)
+
+        with self.error_handler():
+            modlist = [(a, str(b), self.encode(c))
+                       for a, b, c in modlist]
+            return self.conn.modify_ext(str(entry.dn), modlist)
+
+    def wait_for_result(self, msgid, timeout=-1):
+        """Wait for the result of an asynchronous operation.
+
+        Server errors are translated the same way as for the synchronous
+        methods.
+        """
+        with self.error_handler():
+            self.conn.result3(msgid, all=1, timeout=timeout)
+
+    def watch_entry(self, dn, attrs_list=None, filter=None, timeout=None,
+                    poll_interval=1):
+        """Yield an entry whenever it may have changed.
+
+        The entry is yielded right away and then every time the server
+        reports a change through a persistent search, or at least every
+        poll_interval seconds. None is yielded while the entry does not
+        exist or does not match filter. When the server does not support
+        persistent search for the entry, it is polled instead, starting at
+        WATCH_MIN_INTERVAL and doubling the interval up to poll_interval.
+
+        The generator stops after timeout seconds, it never stops if timeout
+        is None.
+
+        :param dn: DN of the watched entry
+        :param attrs_list: list of attributes to return, all if None
+        :param filter: LDAP filter the entry has to match
+        :param timeout: seconds to watch the entry
+        :param poll_interval: maximum number of seconds between two reads
+        """
+        assert isinstance(dn, DN)
+        if filter is None:
+            filter = '(objectclass=*)'
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        msgid = self._start_watch(dn, attrs_list, filter)
+        interval = poll_interval if msgid is not None else WATCH_MIN_INTERVAL
+        try:
+            entry = self._read_watched_entry(dn, attrs_list, filter)
+            while True:
+                yield entry
+
+                wait = interval
+                if timeout is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        return
+
+                if msgid is not None:
+                    try:
+                        self._wait_for_watch(msgid, wait)
+                    except ldap.LDAPError as e:
+                        logger.debug("Persistent search on %s failed, "
+                                     "polling instead: %s", dn, e)
+                        msgid = None
+                        interval = WATCH_MIN_INTERVAL
+                else:
+                    time.sleep(wait)
+                    interval = min(interval * 2, poll_interval)
+                # notifications are not trusted to carry the current state,
+                # e.g. a deleted entry is reported with its last attributes
+                entry = self._read_watched_entry(dn, attrs_list, filter)
+        finally:
+            if msgid is not None:
+                try:
+                    self.conn.abandon(msgid)
+                except ldap.LDAPError:
+                    pass
+
+    def _start_watch(self, dn, attrs_list, filter):
+        """Start a persistent search for changes of an entry.
+
+        Returns the message ID, or None if the search cannot be started.
+        """
+        control = PersistentSearchControl(criticality=True, changesOnly=True)
+        try:
+            return self.conn.search_ext(
+                str(dn), ldap.SCOPE_BASE, filter, attrs_list,
+                serverctrls=[control])
+        except ldap.LDAPError as e:
+            logger.debug("Persistent search on %s not available: %s", dn, e)
+            return None
+
+    def _wait_for_watch(self, msgid, timeout):
+        """Wait for a change reported by a persistent search.
+
+        Returns True if a change was reported, False on timeout.
+
+        :raises: ldap.LDAPError when the persistent search failed or ended
+        """
+        try:
+            rtype, _rdata, _rmsgid, _rctrls = self.conn.result3(
+                msgid, all=0, timeout=timeout)
+        except ldap.TIMEOUT:
+            return False
+        if rtype != ldap.RES_SEARCH_ENTRY:
+            raise ldap.OPERATIONS_ERROR(
+                {'desc': 'persistent search ended'})
+        return True
+
+    def _read_watched_entry(self, dn, attrs_list, filter):
+        try:
+            return self.get_entries(
+                dn, self.SCOPE_BASE, filter, attrs_list)[0]
+        except errors.NotFound:
+            return None
+
+    def watch_task(self, dn, attrs_list=None, timeout=None, poll_interval=1):
+        """Yield the entry of a directory server task while it runs.
+
+        The task entry is yielded right away and then whenever it may have
+        changed, see watch_entry(). The generator stops after yielding the
+        entry of the finished task, which has nsTaskExitCode set, or after
+        timeout seconds. Changes of the task's progress reported in
+        nsTaskCurrentItem and nsTaskTotalItems are logged.
+
+        :param dn: DN of the task entry
+        :param attrs_list: list of attributes to return, TASK_STATUS_ATTRS
+            if None
+        :param timeout: seconds to watch the task
+        :param poll_interval: maximum number of seconds between two reads
+        :raises: errors.NotFound if the task entry does not exist
+        """
+        if attrs_list is None:
+            attrs_list = TASK_STATUS_ATTRS
+        progress = None
+        for entry in self.watch_entry(dn, attrs_list, timeout=timeout,
+                                      poll_interval=poll_interval):
+            if entry is None:
+                raise errors.NotFound(
+                    reason="task {} not found".format(dn))
+            current = (entry.single_value.get('nsTaskCurrentItem'),
+                       entry.single_value.get('nsTaskTotalItems'))
+            if current != progress and current != (None, None):
+                progress = current
+                logger.debug("Task %s: %s of %s items processed", dn,
+                             current[0], current[1])
+            yield entry
+            if entry.single_value.get('nsTaskExitCode') is not None:
+                return
+
+    @profiler.profiled('ldap')
     def delete_entry(self, entry_or_dn):
         """Delete an entry given either the DN or the entry itself"""
         if isinstance(entry_or_dn, DN):
@@ -1829,13 +2102,13 @@ class LDAPCache(LDAPClient):
 
         # Return either the whole entry or only those attrs requested
         if not attrs:
-            new_entry.raw.update(deepcopy(dict(entry.raw)))
+            for attr, original_values in entry.raw.items():
+                new_entry.raw[attr] = list(original_values)
         else:
             for attr, original_values in entry.raw.items():
                 if attr.lower() not in attrs:
                     continue
-                new_entry.raw[attr.lower()] = deepcopy(original_values)
-        new_entry._orig_raw = deepcopy(dict(entry.raw))
+                new_entry.raw[attr.lower()] = list(original_values)
         new_entry.reset_modlist()
 
         return new_entry
@@ -1913,11 +2186,21 @@ class LDAPCache(LDAPClient):
         self.remove_cache_entry(entry.dn)
         super(LDAPCache, self).add_entry(entry)
 
+    def add_entry_async(self, entry):
+        self.emit('add_entry_async')
+        self.remove_cache_entry(entry.dn)
+        return super(LDAPCache, self).add_entry_async(entry)
+
     def update_entry(self, entry):
         self.emit('update_entry')
         self.remove_cache_entry(entry.dn)
         super(LDAPCache, self).update_entry(entry)
 
+    def update_entry_async(self, entry):
+        self.emit('update_entry_async')
+        self.remove_cache_entry(entry.dn)
+        return super(LDAPCache, self).update_entry_async(entry)
+
     def delete_entry(self, entry_or_dn):
         self.emit('delete_entry')
         if isinstance(entry_or_dn, DN):
@@ -1976,6 +2259,7 @@ class LDAPCache(LDAPClient):
             object.__setattr__(self, '_cache_hits', hits)
             self.emit("HIT: Re-raising %s", entry.exception)
             self.cache_status('HIT')
+            profiler.record('ldap', 'get_entry', 0, cache_hit=True)
             raise entry.exception
 
         self.emit("Requested attrs_list %s", attrs_list)
@@ -1999,6 +2283,7 @@ class LDAPCache(LDAPClient):
             hits = self._cache_hits + 1  # pylint: disable=no-member
             object.__setattr__(self, '_cache_hits', hits)
             self.cache_status('HIT')
+            profiler.record('ldap', 'get_entry', 0, entries=1, cache_hit=True)
             return self.copy_entry(dn, entry.entry)
 
         # Be sure we have all the requested attributes before returning
@@ -2010,6 +2295,8 @@ class LDAPCache(LDAPClient):
                 hits = self._cache_hits + 1  # pylint: disable=no-member
                 object.__setattr__(self, '_cache_hits', hits)
                 self.cache_status('HIT')
+                profiler.record('ldap', 'get_entry', 0, entries=1,
+                                cache_hit=True)
 
                 return self.copy_entry(dn, entry.entry, req_attrs)
 
@@ -6,8 +6,10 @@ from __future__ import absolute_import
 
 import logging
 
+import ldap
 import ldap.dn
 import os
+import time
 
 import dns.name
 
@@ -23,8 +25,19 @@ logger = logging.getLogger(__name__)
 SIGNING_ATTR = 'idnsSecInlineSigning'
 OBJCLASS_ATTR = 'objectClass'
 
+# synchronization steps queued by LDAP changes, in order of execution
+SYNC_ODS = 'ods'
+SYNC_HSM_MASTER = 'hsm_master'
+SYNC_HSM_REPLICA_BEFORE_BIND = 'hsm_replica_before_bind'
+SYNC_BIND = 'bind'
+SYNC_HSM_REPLICA_AFTER_BIND = 'hsm_replica_after_bind'
+
 
 class KeySyncer(SyncReplConsumer):
+    # LDAP changes received within this many seconds after the first
+    # queued one are synchronized together
+    sync_delay = 2
+
     def __init__(self, *args, **kwargs):
         # hack
         self.api = kwargs['ipa_api']
@@ -41,6 +54,9 @@ class KeySyncer(SyncReplConsumer):
         self.bindmgr = BINDMgr(self.api)
         self.init_done = False
         self.dnssec_zones = set()
+        self.sync_queue = set()
+        self.sync_queue_depth = 0
+        self.sync_deadline = None
         SyncReplConsumer.__init__(self, *args, **kwargs)
 
     def _get_objclass(self, attrs):
@@ -84,7 +100,7 @@ class KeySyncer(SyncReplConsumer):
             self.key_meta_add(uuid, dn, attributes)
         elif objclass == b'ipk11publickey' and \
                 self.__is_replica_pubkey(attributes):
-            self.hsm_master_sync()
+            self.queue_sync(SYNC_HSM_MASTER)
 
     def application_del(self, uuid, dn, previous_attributes):
         objclass = self._get_objclass(previous_attributes)
@@ -94,7 +110,7 @@ class KeySyncer(SyncReplConsumer):
             self.key_meta_del(uuid, dn, previous_attributes)
         elif objclass == b'ipk11publickey' and \
                 self.__is_replica_pubkey(previous_attributes):
-            self.hsm_master_sync()
+            self.queue_sync(SYNC_HSM_MASTER)
 
     def application_sync(self, uuid, dn, attributes, previous_attributes):
         objclass = self._get_objclass(previous_attributes)
@@ -116,7 +132,7 @@ class KeySyncer(SyncReplConsumer):
 
         elif objclass == b'ipk11publickey' and \
                 self.__is_replica_pubkey(attributes):
-            self.hsm_master_sync()
+            self.queue_sync(SYNC_HSM_MASTER)
 
     def syncrepl_refreshdone(self):
         logger.info('Initial LDAP dump is done, sychronizing with ODS and '
@@ -127,23 +143,95 @@ class KeySyncer(SyncReplConsumer):
         self.hsm_master_sync()
         self.bindmgr.sync(self.dnssec_zones)
 
+    def queue_sync(self, *steps):
+        """Queue synchronization steps required by an LDAP change.
+
+        Changes are not synchronized one by one. The steps are collected for
+        sync_delay seconds after the first queued change and then executed
+        at most once each by sync_queued(), e.g. a key rollover in many zones
+        results in a single HSM synchronization and a single sync_zone() of
+        each affected zone.
+        Nothing is queued before the initial LDAP dump is done, all data
+        are synchronized at once by syncrepl_refreshdone() then."""
+        if not self.init_done:
+            return
+        self.sync_queue.update(steps)
+        self.sync_queue_depth += 1
+        if self.sync_deadline is None:
+            self.sync_deadline = time.monotonic() + self.sync_delay
+        logger.debug('Queued synchronization of %s, queue depth %d',
+                     ', '.join(sorted(steps)), self.sync_queue_depth)
+
+    def sync_timeout(self):
+        """Seconds until queued changes are due, None if queue is empty."""
+        if self.sync_deadline is None:
+            return None
+        return max(0, self.sync_deadline - time.monotonic())
+
+    def sync_queued(self, force=False):
+        """Execute synchronization steps queued by LDAP changes.
+
+        Nothing is done before the collecting window is over unless force
+        is True."""
+        if self.sync_deadline is None:
+            return
+        if not force and time.monotonic() < self.sync_deadline:
+            return
+
+        steps = self.sync_queue
+        depth = self.sync_queue_depth
+        self.sync_queue = set()
+        self.sync_queue_depth = 0
+        self.sync_deadline = None
+
+        zones = self.bindmgr.modified_zones.intersection(self.dnssec_zones)
+        start = time.monotonic()
+        # new keys have to be in local HSM before BIND uses them, removed
+        # keys can be deleted from local HSM only after BIND stops using them
+        if SYNC_ODS in steps:
+            self.ods_sync()
+        if SYNC_HSM_MASTER in steps:
+            self.hsm_master_sync()
+        if SYNC_HSM_REPLICA_BEFORE_BIND in steps:
+            self.hsm_replica_sync()
+        if SYNC_BIND in steps:
+            self.bindmgr_sync(self.dnssec_zones)
+        if SYNC_HSM_REPLICA_AFTER_BIND in steps:
+            self.hsm_replica_sync()
+
+        logger.info('Synchronized %d LDAP change(s) affecting %d zone(s) '
+                    'in %.3f seconds', depth, len(zones),
+                    time.monotonic() - start)
+        logger.debug('Synchronized zones: %s',
+                     ', '.join(sorted(z.to_text() for z in zones)))
+
+    def syncrepl_poll_queued(self, msgid):
+        """Process LDAP changes and synchronize them once they are due.
+
+        Returns False when the syncrepl operation finishes, True otherwise."""
+        try:
+            running = self.syncrepl_poll(msgid=msgid,
+                                         timeout=self.sync_timeout())
+        except ldap.TIMEOUT:
+            running = True
+        self.sync_queued(force=not running)
+        return running
+
     # idnsSecKey wrapper
     # Assumption: metadata points to the same key blob all the time,
     # i.e. it is not necessary to re-download blobs because of change in DNSSEC
     # metadata - DNSSEC flags or timestamps.
     def key_meta_add(self, uuid, dn, newattrs):
-        self.hsm_replica_sync()
         self.bindmgr.ldap_event('add', uuid, newattrs)
-        self.bindmgr_sync(self.dnssec_zones)
+        self.queue_sync(SYNC_HSM_REPLICA_BEFORE_BIND, SYNC_BIND)
 
     def key_meta_del(self, uuid, dn, oldattrs):
         self.bindmgr.ldap_event('del', uuid, oldattrs)
-        self.bindmgr_sync(self.dnssec_zones)
-        self.hsm_replica_sync()
+        self.queue_sync(SYNC_BIND, SYNC_HSM_REPLICA_AFTER_BIND)
 
     def key_metadata_sync(self, uuid, dn, oldattrs, newattrs):
         self.bindmgr.ldap_event('mod', uuid, newattrs)
-        self.bindmgr_sync(self.dnssec_zones)
+        self.queue_sync(SYNC_BIND)
 
     def bindmgr_sync(self, dnssec_zones):
         if self.init_done:
@@ -162,7 +250,7 @@ class KeySyncer(SyncReplConsumer):
 
         if self.__is_dnssec_enabled(newattrs):
             self.odsmgr.ldap_event('add', uuid, newattrs)
-        self.ods_sync()
+        self.queue_sync(SYNC_ODS)
 
     def zone_del(self, uuid, dn, oldattrs):
         zone = dns.name.from_text(oldattrs['idnsname'][0])
@@ -173,7 +261,7 @@ class KeySyncer(SyncReplConsumer):
 
         if self.__is_dnssec_enabled(oldattrs):
             self.odsmgr.ldap_event('del', uuid, oldattrs)
-        self.ods_sync()
+        self.queue_sync(SYNC_ODS)
 
     def ods_sync(self):
         if not self.ismaster:
@@ -23,6 +23,7 @@ import logging
 import optparse  # pylint: disable=deprecated-module
 import os
 import shutil
+import subprocess
 import sys
 import tempfile
 import time
@@ -98,6 +99,57 @@ def encrypt_file(filename, remove_original=True):
     return dest
 
 
+def get_compress_program():
+    """Return the program used to compress the backup archives.
+
+    pigz compresses with all available CPUs and writes gzip compatible
+    output, so it is preferred when installed.
+    """
+    if os.path.exists(paths.PIGZ):
+        return paths.PIGZ
+    return paths.GZIP
+
+
+def encrypt_output(args, dest, cwd=None):
+    """Run a command and encrypt its standard output into dest.
+
+    The output is piped to gpg directly so no unencrypted copy is
+    written to disk.
+    """
+    gpg_args = [
+        paths.GPG2,
+        '--batch',
+        '--default-recipient-self',
+        '--output', dest,
+        '--encrypt',
+    ]
+
+    logger.debug('Starting external process')
+    logger.debug('args=%s | %s', ' '.join(args), ' '.join(gpg_args))
+    # stderr goes to a temporary file so that a chatty producer cannot
+    # block on a full pipe while gpg is being waited for
+    with tempfile.TemporaryFile() as errlog:
+        producer = subprocess.Popen(
+            args, cwd=cwd, stdout=subprocess.PIPE, stderr=errlog)
+        gpg = subprocess.Popen(
+            gpg_args, stdin=producer.stdout, stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE)
+        # allow producer to receive SIGPIPE if gpg exits
+        producer.stdout.close()
+        _stdout, gpg_error = gpg.communicate()
+        producer.wait()
+        errlog.seek(0)
+        error_log = errlog.read().decode('utf-8', 'replace')
+
+    if producer.returncode != 0:
+        raise admintool.ScriptError(
+            '%s returned non-zero code %d: %s' %
+            (args[0], producer.returncode, error_log))
+    if gpg.returncode != 0:
+        raise admintool.ScriptError(
+            'gpg failed: %s' % gpg_error.decode('utf-8', 'replace'))
+
+
 class Backup(admintool.AdminTool):
     command_name = 'ipa-backup'
     log_file_name = paths.IPABACKUP_LOG
@@ -235,6 +287,8 @@ class Backup(admintool.AdminTool):
     def __init__(self, options, args):
         super(Backup, self).__init__(options, args)
         self._conn = None
+        self.parent_dir = None
+        self.parent_time = None
         self.files = list(self.files)
         self.dirs = list(self.dirs)
         self.logs = list(self.logs)
@@ -259,6 +313,9 @@ class Backup(admintool.AdminTool):
             "--online", dest="online", action="store_true",
             default=False,
             help="Perform the LDAP backups online, for data only.")
+        parser.add_option(
+            "--incremental", dest="incremental", metavar="BACKUP",
+            help="Back up only files changed since the given full backup")
         parser.add_option(
             "--disable-role-check", dest="rolecheck", action="store_false",
             default=True,
@@ -295,6 +352,22 @@ class Backup(admintool.AdminTool):
             self.option_parser.error("You cannot specify --data "
                 "with --logs")
 
+        if options.incremental:
+            if options.data_only:
+                self.option_parser.error("You cannot specify --data "
+                    "with --incremental")
+            parent_dir = options.incremental
+            if not os.path.isabs(parent_dir):
+                parent_dir = os.path.join(paths.IPA_BACKUP_DIR, parent_dir)
+            parent_dir = os.path.normpath(parent_dir)
+            config = SafeConfigParser()
+            if (not config.read(os.path.join(parent_dir, 'header'))
+                    or config.get('ipa', 'type') != 'FULL'):
+                self.option_parser.error(
+                    "%s is not a full backup" % options.incremental)
+            self.parent_dir = parent_dir
+            self.parent_time = config.get('ipa', 'time')
+
     def run(self):
         options = self.options
         super(Backup, self).run()
@@ -360,11 +433,6 @@ class Backup(admintool.AdminTool):
                 logger.info('Starting IPA service')
                 run([paths.IPACTL, 'start'])
 
-            # Compress after services are restarted to minimize
-            # the unavailability window
-            if not options.data_only:
-                self.compress_file_backup()
-
             self.finalize_backup(options.data_only, options.gpg,
                                  options.gpg_keyring)
 
@@ -636,7 +704,6 @@ class Backup(admintool.AdminTool):
 
         self.tarfile = os.path.join(self.dir, 'files.tar')
 
-        logger.info("Backing up files")
         args = ['tar',
                 '--exclude=%s' % paths.IPA_BACKUP_DIR,
                 '--xattrs',
@@ -645,6 +712,15 @@ class Backup(admintool.AdminTool):
                 self.tarfile
                ]
 
+        if self.parent_dir:
+            # Only files whose data or status changed after the base
+            # backup was started are archived. Directories are always
+            # stored.
+            logger.info("Backing up files changed since %s", self.parent_dir)
+            args.append('--newer=%sZ' % self.parent_time)
+        else:
+            logger.info("Backing up files")
+
         args.extend(verify_directories(self.dirs))
         args.extend(verify_directories(self.files))
 
@@ -679,21 +755,6 @@ class Backup(admintool.AdminTool):
                     'when adding directory structure: %s' %
                     (result.returncode, result.error_log))
 
-    def compress_file_backup(self):
-
-        # Compress the archive. This is done separately, since 'tar' cannot
-        # append to a compressed archive.
-        if self.tarfile:
-            result = run([paths.GZIP, self.tarfile], raiseonerr=False)
-            if result.returncode != 0:
-                raise admintool.ScriptError(
-                    'gzip returned non-zero code %d '
-                    'when compressing the backup: %s' %
-                    (result.returncode, result.error_log))
-
-            # Rename the archive back to files.tar to preserve compatibility
-            os.rename(os.path.join(self.dir, 'files.tar.gz'), self.tarfile)
-
     def create_header(self, data_only):
         '''
         Create the backup file header that contains the meta data about
@@ -711,6 +772,9 @@ class Backup(admintool.AdminTool):
         config.set('ipa', 'host', api.env.host)
         config.set('ipa', 'ipa_version', str(version.VERSION))
         config.set('ipa', 'version', '1')
+        if self.parent_dir:
+            # the base backup is looked up next to this one on restore
+            config.set('ipa', 'parent', os.path.basename(self.parent_dir))
 
         dn = DN(('cn', api.env.host), api.env.container_masters,
                 api.env.basedn)
@@ -742,6 +806,10 @@ class Backup(admintool.AdminTool):
 
         These, along with the header, are moved into a new subdirectory
         in paths.IPA_BACKUP_DIR (/var/lib/ipa/backup).
+
+        The directory is archived, compressed and optionally encrypted in
+        a single pass. files.tar is not compressed on its own, which would
+        take another pass over the data.
         '''
 
         if data_only:
@@ -769,17 +837,21 @@ class Backup(admintool.AdminTool):
             )
 
         args = [
-            'tar', '--xattrs', '--selinux', '-czf', filename, '.'
+            'tar', '--xattrs', '--selinux',
+            '--use-compress-program=%s' % get_compress_program(),
+            '-cf', '-' if encrypt else filename, '.'
         ]
-        result = run(args, raiseonerr=False, cwd=self.dir)
-        if result.returncode != 0:
-            raise admintool.ScriptError(
-                'tar returned non-zero code %s: %s' %
-                (result.returncode, result.error_log)
-            )
         if encrypt:
+            filename = filename + '.gpg'
             logger.info('Encrypting %s', filename)
-            filename = encrypt_file(filename)
+            encrypt_output(args, filename, cwd=self.dir)
+        else:
+            result = run(args, raiseonerr=False, cwd=self.dir)
+            if result.returncode != 0:
+                raise admintool.ScriptError(
+                    'tar returned non-zero code %s: %s' %
+                    (result.returncode, result.error_log)
+                )
         try:
             shutil.move(self.header, backup_dir)
         except (IOError, OSError) as e:
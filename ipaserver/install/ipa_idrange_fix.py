@@ -530,17 +530,21 @@ def read_ldap_ids(container_dn, user: bool, id_ranges) -> List[IDentity]:
     logger.debug("Searching %ss in %s with filter: %s", id_name, container_dn,
                  ldap_filter)
     try:
-        identities = api.Backend.ldap2.get_entries(
+        identities = api.Backend.ldap2.iter_entries(
             container_dn,
             ldap.SCOPE_ONELEVEL,
             ldap_filter,
+            paged_search=True,
         )
         for entry in identities:
             id_entities.append(read_identity(entry, user))
     except errors.NotFound:
-        logger.debug("No out of range %ss found in %s!", id_name, container_dn)
+        pass
     except errors.ExecutionError as e:
         logger.error("Exception while reading %s: %s", container_dn, e)
+        return []
+    if not id_entities:
+        logger.debug("No out of range %ss found in %s!", id_name, container_dn)
     return id_entities
 
 
@@ -180,6 +180,7 @@ class Restore(admintool.AdminTool):
     def __init__(self, options, args):
         super(Restore, self).__init__(options, args)
         self._conn = None
+        self.chain_dirs = []
 
     @classmethod
     def add_options(cls, parser):
@@ -348,6 +349,14 @@ class Restore(admintool.AdminTool):
         logger.info("Performing %s restore from %s backup",
                     restore_type, self.backup_type)
 
+        # files of an incremental backup are restored on top of the
+        # files of the backups it is based on
+        backup_chain = []
+        if restore_type == 'FULL':
+            backup_chain = self.get_backup_chain()
+            for backup_dir in backup_chain:
+                logger.info("Backup is based on %s", backup_dir)
+
         if self.backup_host != FQDN:
             raise admintool.ScriptError(
                 "Host name %s does not match backup name %s" %
@@ -399,7 +408,7 @@ class Restore(admintool.AdminTool):
         try:
             dirsrv = services.knownservices.dirsrv
 
-            self.extract_backup()
+            self.extract_backup(backup_chain)
 
             if restore_type == 'FULL':
                 self.restore_default_conf()
@@ -755,14 +764,19 @@ class Restore(admintool.AdminTool):
         Primary purpose of this method is to get configuration for api
         finalization when restoring ipa after uninstall.
         '''
-        args = ['tar',
-                '--xattrs',
-                '--selinux',
-                '-xzf',
-                os.path.join(self.dir, 'files.tar'),
-                paths.IPA_DEFAULT_CONF[1:],
-                ]
-        result = run(args, raiseonerr=False, cwd=self.dir)
+        # an incremental backup contains the file only if it changed,
+        # look for it from the newest backup of the chain
+        for backup_dir in [self.dir] + self.chain_dirs[::-1]:
+            args = ['tar',
+                    '--xattrs',
+                    '--selinux',
+                    '-xf',
+                    os.path.join(backup_dir, 'files.tar'),
+                    paths.IPA_DEFAULT_CONF[1:],
+                    ]
+            result = run(args, raiseonerr=False, cwd=self.dir)
+            if result.returncode == 0:
+                break
 
         if result.returncode != 0:
             logger.critical('Restoring %s failed: %s',
@@ -806,19 +820,23 @@ class Restore(admintool.AdminTool):
         databases.
         '''
         logger.info("Restoring files")
-        args = ['tar',
-                '--xattrs',
-                '--selinux',
-                '-xzf',
-                os.path.join(self.dir, 'files.tar')
-                ]
-        if nologs:
-            args.append('--exclude')
-            args.append('var/log')
-
-        result = run(args, cwd='/', raiseonerr=False)
-        if result.returncode != 0:
-            logger.critical('Restoring files failed: %s', result.error_log)
+        # replay the chain of incremental backups, oldest first; files.tar
+        # is compressed only in backups of older versions, tar detects it
+        for backup_dir in self.chain_dirs + [self.dir]:
+            args = ['tar',
+                    '--xattrs',
+                    '--selinux',
+                    '-xf',
+                    os.path.join(backup_dir, 'files.tar')
+                    ]
+            if nologs:
+                args.append('--exclude')
+                args.append('var/log')
+
+            result = run(args, cwd='/', raiseonerr=False)
+            if result.returncode != 0:
+                logger.critical('Restoring files failed: %s',
+                                result.error_log)
 
     def read_header(self):
         '''
@@ -836,43 +854,85 @@ class Restore(admintool.AdminTool):
         # we can assume that returned object is string and it has .split()
         # method
         self.backup_services = config.get('ipa', 'services').split(',')
+        self.backup_parent = None
+        if config.has_option('ipa', 'parent'):
+            self.backup_parent = config.get('ipa', 'parent')
+
+    def get_backup_chain(self):
+        '''
+        Return the directories of the backups an incremental backup is
+        based on, oldest first.
+        '''
+        chain = []
+        top_dir = os.path.dirname(os.path.normpath(self.backup_dir))
+        parent = self.backup_parent
+        while parent:
+            backup_dir = os.path.join(top_dir, parent)
+            if backup_dir in chain:
+                raise admintool.ScriptError(
+                    "Backup %s is based on itself" % backup_dir)
+            config = SafeConfigParser()
+            if not config.read(os.path.join(backup_dir, 'header')):
+                raise admintool.ScriptError(
+                    "Cannot read metadata of backup %s" % backup_dir)
+            if config.get('ipa', 'type') != 'FULL':
+                raise admintool.ScriptError(
+                    "Backup %s is not a full backup" % backup_dir)
+            chain.insert(0, backup_dir)
+            parent = None
+            if config.has_option('ipa', 'parent'):
+                parent = config.get('ipa', 'parent')
+
+        return chain
 
-    def extract_backup(self):
+    def extract_backup(self, backup_chain=()):
         '''
         Extract the contents of the tarball backup into a temporary location,
         decrypting if necessary.
+
+        Only the file archives are extracted from the backups an incremental
+        backup is based on.
         '''
+        self._extract_archive(self.backup_dir, self.backup_type, self.dir)
+
+        for i, backup_dir in enumerate(backup_chain):
+            chain_dir = os.path.join(self.top_dir, 'ipa-%d' % i)
+            os.mkdir(chain_dir, 0o750)
+            self._extract_archive(backup_dir, 'FULL', chain_dir,
+                                  './files.tar')
+            self.chain_dirs.append(chain_dir)
 
+        constants.DS_USER.chown(self.top_dir)
+        recursive_chown(
+            self.top_dir, constants.DS_USER.uid, constants.DS_USER.pgid
+        )
+
+    def _extract_archive(self, backup_dir, backup_type, dest, member='.'):
         encrypt = False
         filename = None
-        if self.backup_type == 'FULL':
-            filename = os.path.join(self.backup_dir, 'ipa-full.tar')
+        if backup_type == 'FULL':
+            filename = os.path.join(backup_dir, 'ipa-full.tar')
         else:
-            filename = os.path.join(self.backup_dir, 'ipa-data.tar')
+            filename = os.path.join(backup_dir, 'ipa-data.tar')
         if not os.path.exists(filename):
             if not os.path.exists(filename + '.gpg'):
-                raise admintool.ScriptError('Unable to find backup file in %s' % self.backup_dir)
+                raise admintool.ScriptError('Unable to find backup file in %s' % backup_dir)
             else:
                 filename = filename + '.gpg'
                 encrypt = True
 
         if encrypt:
             logger.info('Decrypting %s', filename)
-            filename = decrypt_file(self.dir, filename)
+            filename = decrypt_file(dest, filename)
 
         args = ['tar',
                 '--xattrs',
                 '--selinux',
                 '-xzf',
                 filename,
-                '.'
+                member
                 ]
-        run(args, cwd=self.dir)
-
-        constants.DS_USER.chown(self.top_dir)
-        recursive_chown(
-            self.dir, constants.DS_USER.uid, constants.DS_USER.pgid
-        )
+        run(args, cwd=dest)
 
         if encrypt:
             # We can remove the decoded tarball
@@ -19,16 +19,19 @@
 
 from __future__ import print_function
 
+import concurrent.futures
 import sys
 import os
 import json
+import time
 
 import ldapurl
 
 from ipaserver.install import service, installutils
 from ipaserver.install.dsinstance import config_dirname
 from ipaserver.install.installutils import ScriptError
-from ipaserver.masters import ENABLED_SERVICE, HIDDEN_SERVICE
+from ipaserver.masters import (
+    ENABLED_SERVICE, HIDDEN_SERVICE, SERVICE_DEPENDENCIES)
 from ipalib import api, errors
 from ipalib.facts import is_ipa_configured
 from ipapython.ipaldap import LDAPClient, realm_to_serverid
@@ -141,6 +144,14 @@ def parse_options():
         help="If any service start fails, do not rollback the "
         "services, continue with the operation",
     )
+    parser.add_option(
+        "--parallel",
+        action="store_true",
+        dest="parallel",
+        default=False,
+        help="Start and stop services which do not depend on each other "
+        "concurrently",
+    )
     parser.add_option(
         "--skip-version-check",
         action="store_true",
@@ -351,6 +362,98 @@ def stop_services(svc_list):
             pass
 
 
+def get_service_dependencies(svc_list):
+    """
+    Map each service in svc_list to the services in svc_list it requires.
+
+    Services without declared dependencies require all services preceding
+    them in svc_list.
+    """
+    deps = {}
+    for i, svc in enumerate(svc_list):
+        if svc in SERVICE_DEPENDENCIES:
+            deps[svc] = set(SERVICE_DEPENDENCIES[svc]).intersection(svc_list)
+        else:
+            deps[svc] = set(svc_list[:i])
+    return deps
+
+
+ACTION_MESSAGES = {
+    "start": ("Starting", "started"),
+    "restart": ("Restarting", "restarted"),
+    "stop": ("Stopping", "stopped"),
+}
+
+
+def run_services_parallel(svc_actions, options, reverse=False,
+                          stop_on_failure=True):
+    """
+    Start, restart or stop services concurrently.
+
+    A service is started only after all services it depends on are up. With
+    reverse, a service is stopped only after all services depending on it
+    are down.
+
+    :param svc_actions: dict of service names in start order mapped to
+        "start", "restart" or "stop"
+    :param reverse: honor dependencies in reverse order
+    :param stop_on_failure: do not run any new action after a failure
+    :returns: list of services whose action failed
+    """
+    svc_list = list(svc_actions)
+    deps = get_service_dependencies(svc_list)
+    if reverse:
+        required_by = {svc: set() for svc in svc_list}
+        for svc, required in deps.items():
+            for dep in required:
+                required_by[dep].add(svc)
+        deps = required_by
+
+    def run_action(svc):
+        action = svc_actions[svc]
+        svchandle = services.service(svc, api=api)
+        if action == "stop":
+            capture_output = False
+        else:
+            capture_output = get_capture_output(svc, options.debug)
+        start = time.monotonic()
+        getattr(svchandle, action)(capture_output=capture_output)
+        return time.monotonic() - start
+
+    failed = []
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(len(svc_list), 1)) as executor:
+        while True:
+            if not failed or not stop_on_failure:
+                for svc in svc_list:
+                    if svc in deps and not deps[svc]:
+                        del deps[svc]
+                        print("%s %s Service" % (
+                            ACTION_MESSAGES[svc_actions[svc]][0], svc))
+                        running[executor.submit(run_action, svc)] = svc
+            if not running:
+                break
+
+            done, _pending = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                svc = running.pop(future)
+                action = svc_actions[svc]
+                try:
+                    elapsed = future.result()
+                except Exception:
+                    emit_err("Failed to %s %s Service" % (action, svc))
+                    failed.append(svc)
+                else:
+                    print("%s Service %s in %.1f seconds" % (
+                        svc, ACTION_MESSAGES[action][1], elapsed))
+                for required in deps.values():
+                    required.discard(svc)
+
+    return failed
+
+
 def stop_dirsrv(dirsrv):
     try:
         dirsrv.stop(capture_output=False)
@@ -403,6 +506,27 @@ def ipa_start(options):
         # no service to start
         return
 
+    if options.parallel:
+        start = time.monotonic()
+        failed = run_services_parallel(
+            dict.fromkeys(svc_list, "start"), options,
+            stop_on_failure=not options.ignore_service_failures)
+        if failed and not options.ignore_service_failures:
+            emit_err("Shutting down")
+            stop_services(svc_list)
+            stop_dirsrv(dirsrv)
+
+            emit_err(MSG_HINT_IGNORE_SERVICE_FAILURE)
+            raise IpactlError("Aborting ipactl")
+        for svc in failed:
+            emit_err(
+                "Forced start, ignoring %s Service, "
+                "continuing normal operation"
+                % svc
+            )
+        print("Services started in %.1f seconds" % (time.monotonic() - start))
+        return
+
     for svc in svc_list:
         svchandle = services.service(svc, api=api)
         try:
@@ -449,13 +573,18 @@ def ipa_stop(options):
             finally:
                 raise IpactlError()
 
-    for svc in reversed(svc_list):
-        svchandle = services.service(svc, api=api)
-        try:
-            print("Stopping %s Service" % svc)
-            svchandle.stop(capture_output=False)
-        except Exception:
-            emit_err("Failed to stop %s Service" % svc)
+    if options.parallel:
+        run_services_parallel(
+            dict.fromkeys(svc_list, "stop"), options, reverse=True,
+            stop_on_failure=False)
+    else:
+        for svc in reversed(svc_list):
+            svchandle = services.service(svc, api=api)
+            try:
+                print("Stopping %s Service" % svc)
+                svchandle.stop(capture_output=False)
+            except Exception:
+                emit_err("Failed to stop %s Service" % svc)
 
     try:
         print("Stopping Directory Service")
@@ -535,7 +664,11 @@ def ipa_restart(options):
         if s in new_svc_list:
             new_svc_list.remove(s)
 
-    if len(old_svc_list) != 0:
+    if len(old_svc_list) != 0 and options.parallel:
+        run_services_parallel(
+            dict.fromkeys(old_svc_list, "stop"), options, reverse=True,
+            stop_on_failure=False)
+    elif len(old_svc_list) != 0:
         # we need to definitely stop some services
         for svc in reversed(old_svc_list):
             svchandle = services.service(svc, api=api)
@@ -561,6 +694,30 @@ def ipa_restart(options):
 
         raise IpactlError("Aborting ipactl")
 
+    if options.parallel:
+        svc_actions = dict.fromkeys(svc_list, "restart")
+        svc_actions.update(dict.fromkeys(new_svc_list, "start"))
+        start = time.monotonic()
+        failed = run_services_parallel(
+            svc_actions, options,
+            stop_on_failure=not options.ignore_service_failures)
+        if failed and not options.ignore_service_failures:
+            emit_err("Shutting down")
+            stop_services(svc_list)
+            stop_dirsrv(dirsrv)
+
+            emit_err(MSG_HINT_IGNORE_SERVICE_FAILURE)
+            raise IpactlError("Aborting ipactl")
+        for svc in failed:
+            emit_err(
+                "Forced %s, ignoring %s Service, "
+                "continuing normal operation"
+                % (svc_actions[svc], svc)
+            )
+        print("Services restarted in %.1f seconds"
+              % (time.monotonic() - start))
+        return
+
     if len(svc_list) != 0:
         # there are services to restart
         for svc in svc_list:
@@ -24,12 +24,14 @@
 from __future__ import absolute_import
 
 import base64
+import collections
 import logging
 import sys
 import uuid
 import time
 import os
 import fnmatch
+import itertools
 import warnings
 
 from pysss_murmur import murmurhash3
@@ -52,6 +54,10 @@ logger = logging.getLogger(__name__)
 
 UPDATES_DIR=paths.UPDATES_DIR
 UPDATE_SEARCH_TIME_LIMIT = 30  # seconds
+# number of outstanding asynchronous modify operations in pipelined mode
+UPDATE_PIPELINE_DEPTH = 64
+# maximum number of RDNs in a single prefetch search filter
+UPDATE_PREFETCH_BATCH = 100
 
 
 def get_sub_dict(realm, domain, suffix, fqdn, idstart=None, idmax=None):
@@ -216,8 +222,6 @@ def run_ldapi_reload_task(conn):
     )
     logger.debug('Creating reload task %s', task_dn)
     conn.add_entry(entry)
-    # task usually finishes in a few ms, avoid 1 sec delay in wait_for_task
-    time.sleep(0.1)
     exitcode = replication.wait_for_task(api.Backend.ldap2, task_dn)
     logger.debug(
         'Task %s has finished with exit code %i',
@@ -236,9 +240,12 @@ class LDAPUpdate:
         ('cn', 'plugins'), ('cn', 'config')
     )
     ldapi_autobind_suffix = DN(('cn', 'auto_bind'), ('cn', 'config'))
+    config_suffix = DN(('cn', 'config'))
+    schema_suffix = DN(('cn', 'schema'))
 
     def __init__(self, dm_password=_sentinel, sub_dict=None,
-                 online=_sentinel, ldapi=_sentinel, api=api):
+                 online=_sentinel, ldapi=_sentinel, api=api,
+                 pipelined=False):
         '''
         :parameters:
             dm_password
@@ -251,6 +258,9 @@ class LDAPUpdate:
                 deprecated and no longer used
             api
                 bootstrapped API object (for configuration)
+            pipelined
+                prefetch target entries with one search per container
+                and send modifies of independent entries asynchronously
 
         Data Structure Example:
         -----------------------
@@ -354,6 +364,16 @@ class LDAPUpdate:
         Either may make changes directly in LDAP or can return updates in
         update format.
 
+        Pipelined mode:
+
+        Existing entries of a run of updates (up to the next plugin or
+        deleteentry directive) are fetched with one one-level search per
+        parent container. Modifies of entries in the IPA tree are sent
+        without waiting for their result. The results are collected
+        before an entry is read again, before any add, delete or plugin,
+        before changes to cn=config or cn=schema and at the end of every
+        update file.
+
         '''
         if any(arg is not _sentinel for arg in (dm_password, online, ldapi)):
             warnings.warn(
@@ -364,6 +384,11 @@ class LDAPUpdate:
         self.sub_dict = sub_dict if sub_dict is not None else {}
         self.conn = None
         self.modified = False
+        self.pipelined = pipelined
+        self._prefetched = {}
+        self._prefetched_parents = set()
+        self._pending = collections.OrderedDict()
+        self._modified_entries = []
         self.ldapuri = ipaldap.realm_to_ldapi_uri(api.env.realm)
 
         self.api = create_api(mode=None)
@@ -636,36 +661,18 @@ class LDAPUpdate:
 
         assert isinstance(dn, DN)
 
-        # Pause for a moment to give the task time to be created
-        time.sleep(1)
-
-        attrlist = ['nstaskstatus', 'nstaskexitcode']
-        entry = None
-
-        while True:
-            try:
-                entry = self.conn.get_entry(dn, attrlist)
-            except errors.NotFound:
-                logger.error("Task not found: %s", dn)
-                return
-            except errors.DatabaseError as e:
-                logger.error("Task lookup failure %s", e)
-                return
-
-            status = entry.single_value.get('nstaskstatus')
-            if status is None:
-                # task doesn't have a status yet
-                time.sleep(1)
-                continue
-
-            if "finished" in status.lower():
-                logger.debug("Indexing finished")
-                break
-
-            logger.debug("Indexing in progress")
-            time.sleep(1)
+        try:
+            for entry in self.conn.watch_task(dn):
+                if entry.single_value.get('nsTaskExitCode') is None:
+                    logger.debug("Indexing in progress")
+        except errors.NotFound:
+            logger.error("Task not found: %s", dn)
+            return
+        except errors.DatabaseError as e:
+            logger.error("Task lookup failure %s", e)
+            return
 
-        return
+        logger.debug("Indexing finished")
 
     def _create_default_entry(self, dn, default):
         """Create the default entry from the values provided.
@@ -703,12 +710,154 @@ class LDAPUpdate:
            The return type is ipaldap.LDAPEntry
         """
         assert isinstance(dn, DN)
+        self._wait_pending(dn)
+        if dn in self._prefetched:
+            # prefetched entries are used only once, the entry may change
+            entry = self._prefetched.pop(dn)
+            if entry is None:
+                raise errors.NotFound(reason='no such entry')
+            return [entry]
         searchfilter="objectclass=*"
         sattrs = ["*", "aci", "attributeTypes", "objectClasses"]
         scope = self.conn.SCOPE_BASE
 
         return self.conn.get_entries(dn, scope, searchfilter, sattrs)
 
+    def _prefetch_entries(self, updates):
+        """Fetch the existing entries of updates in bulk.
+
+        Entries are looked up with one one-level search per parent
+        container. The result is stored in self._prefetched, which maps
+        DN to the entry or to None if the entry does not exist.
+        """
+        # the snapshot must include the results of all earlier updates
+        self._wait_pending()
+
+        children = collections.OrderedDict()
+        for update in updates:
+            dn = update['dn']
+            if len(dn) < 2 or dn in self._prefetched:
+                continue
+            children.setdefault(dn[1:], []).append(dn)
+
+        sattrs = ["*", "aci", "attributeTypes", "objectClasses"]
+        for parent_dn, dns in children.items():
+            if len(dns) < 2:
+                # a base search is as good as a one-level search
+                continue
+            for i in range(0, len(dns), UPDATE_PREFETCH_BATCH):
+                batch = dns[i:i + UPDATE_PREFETCH_BATCH]
+                rdn_filters = [
+                    self.conn.combine_filters(
+                        [self.conn.make_filter_from_attr(ava.attr, ava.value)
+                         for ava in dn[0]],
+                        self.conn.MATCH_ALL)
+                    for dn in batch
+                ]
+                # ldapsubentry entries are only returned by one-level
+                # searches when the filter asks for them explicitly
+                searchfilter = self.conn.combine_filters(
+                    [
+                        '(|(objectclass=*)(objectclass=ldapsubentry))',
+                        self.conn.combine_filters(
+                            rdn_filters, self.conn.MATCH_ANY),
+                    ],
+                    self.conn.MATCH_ALL)
+                try:
+                    entries = self.conn.get_entries(
+                        parent_dn, self.conn.SCOPE_ONELEVEL, searchfilter,
+                        sattrs)
+                except errors.NotFound:
+                    entries = []
+                except (errors.DatabaseError, errors.LimitsExceeded) as e:
+                    logger.debug("Prefetch of entries in %s failed: %s",
+                                 parent_dn, e)
+                    continue
+                found = {entry.dn: entry for entry in entries}
+                for dn in batch:
+                    self._prefetched[dn] = found.get(dn)
+                self._prefetched_parents.add(parent_dn)
+            logger.debug("Prefetched %d entries in %s", len(dns), parent_dn)
+
+    def _forget_prefetched(self, dn):
+        """Drop prefetched entries of dn and its descendants.
+
+        Called before dn is added or modified, so that no update uses
+        a snapshot older than a change made in the same run.
+        """
+        self._prefetched.pop(dn, None)
+        if any(parent_dn.endswith(dn)
+               for parent_dn in self._prefetched_parents):
+            for prefetched_dn in list(self._prefetched):
+                if prefetched_dn.endswith(dn):
+                    del self._prefetched[prefetched_dn]
+
+    def _clear_prefetched(self):
+        self._prefetched.clear()
+        self._prefetched_parents.clear()
+
+    def _wait_pending(self, dn=None):
+        """Collect results of outstanding asynchronous modifies.
+
+        If dn is given, wait only when the entry itself or one of its
+        ancestors has a modify outstanding.
+        """
+        if not self._pending:
+            return
+        if dn is not None and not any(
+                dn.endswith(entry.dn) for entry in self._pending.values()):
+            return
+
+        while self._pending:
+            msgid, entry = self._pending.popitem(last=False)
+            self._collect_update(msgid, entry)
+
+    def _collect_update(self, msgid, entry):
+        try:
+            self.conn.wait_for_result(msgid)
+        except errors.DatabaseError as e:
+            logger.error("Update of %s failed: %s", entry.dn, e)
+        except errors.DuplicateEntry as e:
+            logger.debug("Update of %s already exists, skip it: %s",
+                         entry.dn, e)
+        except errors.ACIError as e:
+            logger.error("Update of %s failed: %s", entry.dn, e)
+        else:
+            entry.reset_modlist()
+            self._entry_modified(entry)
+
+    def _entry_modified(self, entry):
+        """Record a successful add or modify of entry.
+
+        _run_updates() acts on the recorded entries once all results of
+        its updates are collected.
+        """
+        self.modified = True
+        self._modified_entries.append(entry)
+
+    def _update_entry(self, entry):
+        """Write modified entry, asynchronously if possible
+
+        Returns True if the modify was sent asynchronously.
+        """
+        self._forget_prefetched(entry.dn)
+        if (not self.pipelined
+                or entry.dn.endswith(self.config_suffix)
+                or entry.dn.endswith(self.schema_suffix)):
+            # changes of the server configuration or schema may affect
+            # any of the following updates
+            self._wait_pending()
+            self.conn.update_entry(entry)
+            return False
+
+        while len(self._pending) >= UPDATE_PIPELINE_DEPTH:
+            msgid, pending_entry = self._pending.popitem(last=False)
+            self._collect_update(msgid, pending_entry)
+
+        msgid = self.conn.update_entry_async(entry)
+        self._pending[msgid] = entry
+        return True
+
     def _apply_update_disposition(self, updates, entry):
         """
         updates is a list of changes to apply
@@ -851,6 +1000,11 @@ class LDAPUpdate:
                 logger.debug("\t%s", safe_output(a, l))
 
     def _update_record(self, update):
+        """Apply an update to its entry.
+
+        Entries added or modified are recorded with _entry_modified(),
+        modifies sent asynchronously once their result is collected.
+        """
         found = False
 
         new_entry = self._create_default_entry(update.get('dn'),
@@ -879,11 +1033,10 @@ class LDAPUpdate:
         entry = self._apply_update_disposition(update.get('updates'), entry)
         if entry is None:
             # It might be None if it is just deleting an entry
-            return None, False
+            return
 
         self.print_entity(entry, "Final value after applying updates")
 
-        added = False
         updated = False
         if not found:
             try:
@@ -892,15 +1045,18 @@ class LDAPUpdate:
                     # dn defined. In that case there is nothing to do.
                     # It means the entry doesn't exist, so skip it.
                     try:
+                        self._wait_pending()
+                        self._forget_prefetched(entry.dn)
                         self.conn.add_entry(entry)
                     except errors.NotFound:
                         # parent entry of the added entry does not exist
                         # this may not be an error (e.g. entries in NIS container)
                         logger.error("Parent DN of %s may not exist, cannot "
                                      "create the entry", entry.dn)
-                        return entry, False
-                added = True
-                self.modified = True
+                        return
+                    self._entry_modified(entry)
+                else:
+                    self.modified = True
             except Exception as e:
                 logger.error("Add failure %s", e)
         else:
@@ -914,8 +1070,10 @@ class LDAPUpdate:
                     safe_changes.append((type, attr, safe_output(attr, values)))
                 logger.debug("%s", safe_changes)
                 logger.debug("Updated %d", updated)
-                if updated:
-                    self.conn.update_entry(entry)
+                if updated and self._update_entry(entry):
+                    # the entry is recorded once the result is collected
+                    logger.debug("Sent")
+                    return
                 logger.debug("Done")
             except errors.EmptyModlist:
                 logger.debug("Entry already up-to-date")
@@ -931,9 +1089,7 @@ class LDAPUpdate:
                 updated = False
 
             if updated:
-                self.modified = True
-
-        return entry, added or updated
+                self._entry_modified(entry)
 
     def _delete_record(self, updates):
         """
@@ -941,6 +1097,7 @@ class LDAPUpdate:
         """
 
         dn = updates['dn']
+        self._wait_pending()
         try:
             logger.debug("Deleting entry %s", dn)
             self.conn.delete_entry(dn)
@@ -965,6 +1122,7 @@ class LDAPUpdate:
 
     def _run_update_plugin(self, plugin_name):
         logger.debug("Executing upgrade plugin: %s", plugin_name)
+        self._wait_pending()
         restart_ds, updates = self.api.Updater[plugin_name]()
         if updates:
             self._run_updates(updates)
@@ -983,25 +1141,46 @@ class LDAPUpdate:
             self.conn = self.api.Backend.ldap2
 
     def _run_updates(self, all_updates):
-        index_attributes = set()
-        update_ldapi_mappings = False
-        for update in all_updates:
+        # entries modified by plugins are handled by their own run
+        first_modified = len(self._modified_entries)
+        prefetch = self.pipelined
+        for i, update in enumerate(all_updates):
             if 'deleteentry' in update:
+                self._clear_prefetched()
                 self._delete_record(update)
+                prefetch = self.pipelined
             elif 'plugin' in update:
+                # plugins may change LDAP data directly
+                self._clear_prefetched()
                 self._run_update_plugin(update['plugin'])
+                prefetch = self.pipelined
             else:
-                entry, modified = self._update_record(update)
-                if modified:
-                    if entry.dn.endswith(self.index_suffix):
-                        index_attributes.add(entry.single_value['cn'])
-                    if (
-                        entry.dn.endswith(self.ldapi_autobind_suffix)
-                        and "nsLDAPIFixedAuthMap" in entry.get(
-                            "objectClass", ()
-                        )
-                    ):
-                        update_ldapi_mappings = True
+                if prefetch:
+                    run = itertools.takewhile(
+                        lambda u: 'deleteentry' not in u and 'plugin' not in u,
+                        all_updates[i:])
+                    self._prefetch_entries(list(run))
+                    prefetch = False
+                self._update_record(update)
+
+        self._wait_pending()
+        self._clear_prefetched()
+
+        modified_entries = self._modified_entries[first_modified:]
+        del self._modified_entries[first_modified:]
+
+        index_attributes = set()
+        update_ldapi_mappings = False
+        for entry in modified_entries:
+            if entry.dn.endswith(self.index_suffix):
+                index_attributes.add(entry.single_value['cn'])
+            if (
+                entry.dn.endswith(self.ldapi_autobind_suffix)
+                and "nsLDAPIFixedAuthMap" in entry.get(
+                    "objectClass", ()
+                )
+            ):
+                update_ldapi_mappings = True
 
         if index_attributes:
             # The LDAPUpdate framework now keeps record of all changed/added
@@ -1051,6 +1230,8 @@ class LDAPUpdate:
 
     def close_connection(self):
         """Close ldap connection"""
+        self._pending.clear()
+        self._clear_prefetched()
         if self.conn:
             self.api.Backend.ldap2.disconnect()
             self.conn = None
@@ -20,7 +20,6 @@
 from __future__ import print_function, absolute_import
 
 import logging
-import itertools
 
 import re
 import six
@@ -72,6 +71,22 @@ TOTAL_EXCLUDES = ('entryusn',
 # List of attributes that need to be excluded from normal replication.
 EXCLUDES = ('memberof', 'idnssoaserial') + TOTAL_EXCLUDES
 
+# Agreement attributes reporting the state of a total update
+REPL_INIT_STATUS_ATTRS = ['cn', 'nsds5BeginReplicaRefresh',
+                          'nsds5replicaUpdateInProgress',
+                          'nsds5ReplicaLastInitStatus',
+                          'nsds5ReplicaLastInitStatusJSON',
+                          'nsds5ReplicaLastInitStart',
+                          'nsds5ReplicaLastInitEnd']
+
+# Agreement attributes reporting the state of an incremental update
+REPL_UPDATE_STATUS_ATTRS = ['cn',
+                            'nsds5replicaUpdateInProgress',
+                            'nsds5ReplicaLastUpdateStatus',
+                            'nsds5ReplicaLastUpdateStatusjson',
+                            'nsds5ReplicaLastUpdateStart',
+                            'nsds5ReplicaLastUpdateEnd']
+
 # List of attributes that are not updated on empty replication
 STRIP_ATTRS = ('modifiersName',
                'modifyTimestamp',
@@ -160,21 +175,16 @@ def enable_replication_version_checking(realm, dirman_passwd):
 def wait_for_task(conn, dn):
     """Check task status
 
-    Task is complete when the nsTaskExitCode attr is set.
+    Task is complete when the nsTaskExitCode attr is set. The task entry is
+    watched with LDAPClient.watch_task() so the function returns as soon
+    as the task finishes.
 
     :return: the task's return code
     """
     assert isinstance(dn, DN)
-    attrlist = [
-        'nsTaskLog', 'nsTaskStatus', 'nsTaskExitCode', 'nsTaskCurrentItem',
-        'nsTaskTotalItems']
-    while True:
-        entry = conn.get_entry(dn, attrlist)
-        if entry.single_value.get('nsTaskExitCode'):
-            exit_code = int(entry.single_value['nsTaskExitCode'])
-            break
-        time.sleep(1)
-    return exit_code
+    for entry in conn.watch_task(dn):
+        pass
+    return int(entry.single_value['nsTaskExitCode'])
 
 
 def wait_for_entry(connection, dn, timeout, attr=None, attrvalue='*',
@@ -190,31 +200,25 @@ def wait_for_entry(connection, dn, timeout, attr=None, attrvalue='*',
         filterstr = "(objectclass=*)"
     log("Waiting up to %s seconds for replication (%s) %s %s",
         timeout, connection, dn, filterstr)
-    entry = []
-    deadline = time.time() + timeout
-    for i in itertools.count(start=1):
-        try:
-            entry = connection.get_entries(
-                dn, ldap.SCOPE_BASE, filterstr, attrlist)
-        except errors.NotFound:
-            pass  # no entry yet
-        except Exception as e:  # badness
-            logger.error("Error reading entry %s: %s", dn, e)
-            raise
-
-        if entry:
-            log("Entry found %r", entry)
-            return
-        elif time.time() > deadline:
-            raise errors.NotFound(
-                reason="wait_for_entry timeout on {} for {}".format(
-                    connection, dn
-                )
-            )
-        else:
-            if i % 10 == 0:
+    last_report = time.monotonic()
+    try:
+        for entry in connection.watch_entry(
+                dn, attrlist, filterstr, timeout=timeout):
+            if entry is not None:
+                log("Entry found %r", entry)
+                return
+            if time.monotonic() - last_report >= 10:
                 logger.debug("Still waiting for replication of %s", dn)
-            time.sleep(1)
+                last_report = time.monotonic()
+    except Exception as e:  # badness
+        logger.error("Error reading entry %s: %s", dn, e)
+        raise
+
+    raise errors.NotFound(
+        reason="wait_for_entry timeout on {} for {}".format(
+            connection, dn
+        )
+    )
 
 
 def get_ds_version(conn):
@@ -1061,16 +1065,11 @@ class ReplicationManager:
         except Exception as e:
             logger.debug("Failed to remove referral value: %s", str(e))
 
-    def check_repl_init(self, conn, agmtdn, start):
+    def check_repl_init(self, conn, agmtdn, start, entry=None):
         done = False
         hasError = 0
-        attrlist = ['cn', 'nsds5BeginReplicaRefresh',
-                    'nsds5replicaUpdateInProgress',
-                    'nsds5ReplicaLastInitStatus',
-                    'nsds5ReplicaLastInitStatusJSON',
-                    'nsds5ReplicaLastInitStart',
-                    'nsds5ReplicaLastInitEnd']
-        entry = conn.get_entry(agmtdn, attrlist)
+        if entry is None:
+            entry = conn.get_entry(agmtdn, REPL_INIT_STATUS_ATTRS)
         if not entry:
             print("Error reading status from agreement", agmtdn)
             hasError = 1
@@ -1112,17 +1111,12 @@ class ReplicationManager:
 
         return done, hasError
 
-    def check_repl_update(self, conn, agmtdn):
+    def check_repl_update(self, conn, agmtdn, entry=None):
         done = False
         hasError = 0
         error_message = ''
-        attrlist = ['cn',
-                    'nsds5replicaUpdateInProgress',
-                    'nsds5ReplicaLastUpdateStatus',
-                    'nsds5ReplicaLastUpdateStatusjson',
-                    'nsds5ReplicaLastUpdateStart',
-                    'nsds5ReplicaLastUpdateEnd']
-        entry = conn.get_entry(agmtdn, attrlist)
+        if entry is None:
+            entry = conn.get_entry(agmtdn, REPL_UPDATE_STATUS_ATTRS)
         if not entry:
             print("Error reading status from agreement", agmtdn)
             hasError = 1
@@ -1182,24 +1176,42 @@ class ReplicationManager:
         return done, hasError, error_message
 
     def wait_for_repl_init(self, conn, agmtdn):
-        done = False
         haserror = 0
         start = datetime.datetime.now()
-        while not done and not haserror:
-            time.sleep(1)  # give it a few seconds to get going
-            done, haserror = self.check_repl_init(conn, agmtdn, start)
+        for entry in conn.watch_entry(agmtdn, REPL_INIT_STATUS_ATTRS):
+            done, haserror = self.check_repl_init(conn, agmtdn, start, entry)
+            if done or haserror:
+                break
         print("")
         return haserror
 
     def wait_for_repl_update(self, conn, agmtdn, maxtries=600):
+        """Wait until an incremental update of the agreement is done.
+
+        The status reported by the agreement right after an update was
+        forced may still describe the previous update. It is trusted only
+        after one of the status attributes changed or after a second.
+
+        :param maxtries: number of seconds to wait
+        """
         done = False
         haserror = 0
         error_message = ''
-        while not done and not haserror and maxtries > 0:
-            time.sleep(1)  # give it a few seconds to get going
-            done, haserror, error_message = self.check_repl_update(conn, agmtdn)
-            maxtries -= 1
-        if maxtries == 0: # too many tries
+        start = time.monotonic()
+        watch = conn.watch_entry(
+            agmtdn, REPL_UPDATE_STATUS_ATTRS, timeout=maxtries)
+        for i, entry in enumerate(watch):
+            status = dict(entry.raw) if entry is not None else None
+            if i == 0:
+                initial = status
+                continue
+            if status == initial and time.monotonic() - start < 1:
+                continue
+            done, haserror, error_message = self.check_repl_update(
+                conn, agmtdn, entry)
+            if done or haserror:
+                break
+        if not done and not haserror:  # timeout
             print("Error: timeout: could not determine agreement status: please check your directory server logs for possible errors")
             haserror = 1
         return haserror, error_message
@@ -1458,7 +1470,18 @@ class ReplicationManager:
                     dn, newschedule)
         mod = [(ldap.MOD_REPLACE, 'nsDS5ReplicaUpdateSchedule', [ newschedule ])]
         conn.modify_s(dn, mod)
-        time.sleep(1)
+        # give the agreement a second to pick up the new schedule, stop
+        # waiting as soon as it starts an update
+        busy = None
+        for entry in conn.watch_entry(
+                dn, ['nsds5replicaUpdateInProgress'], timeout=1):
+            in_progress = bool(
+                entry and entry.single_value.get(
+                    'nsds5replicaUpdateInProgress'))
+            if busy is None:
+                busy = in_progress
+            elif in_progress and not busy:
+                break
         logger.info("Deleting schedule %s from agreement %s",
                     newschedule, dn)
         mod = [(ldap.MOD_DELETE, 'nsDS5ReplicaUpdateSchedule', None)]
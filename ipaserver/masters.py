@@ -50,6 +50,24 @@ SERVICES = [
 
 SERVICE_LIST = {s.service_entry: s for s in SERVICES}
 
+# Services which have to be started before a service, by systemd service
+# name. All services require the Directory Server. A service missing here is
+# started only after all services with a lower start order.
+SERVICE_DEPENDENCIES = {
+    'krb5kdc': (),
+    'kadmin': ('krb5kdc',),
+    'named': (),
+    'httpd': ('krb5kdc',),
+    'ipa-custodia': ('httpd',),
+    'pki-tomcatd': (),
+    'smb': ('krb5kdc',),
+    'winbind': ('smb',),
+    'ipa-otpd': (),
+    'ipa-ods-exporter': (),
+    'ods-enforcerd': ('ipa-ods-exporter',),
+    'ipa-dnskeysyncd': ('named', 'ods-enforcerd'),
+}
+
 
 def find_providing_servers(svcname, conn=None, preferred_hosts=(), api=api):
     """Find servers that provide the given service.
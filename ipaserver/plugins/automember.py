@@ -17,12 +17,12 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import uuid
-import time
 
 import ldap as _ldap
 import six
 
-from ipalib import api, errors, Str, StrEnum, DNParam, Flag, _, ngettext
+from ipalib import (
+    api, errors, Int, Str, StrEnum, DNParam, Flag, _, ngettext)
 from ipalib import output, Method, Object
 from ipalib.plugable import Registry
 from .baseldap import (
@@ -141,6 +141,10 @@ EXAMPLES:
 """) + _("""
  Rebuild membership for specified hosts:
     ipa automember-rebuild --hosts=web1.example.com --hosts=web2.example.com
+""") + _("""
+ Start rebuilding membership for all hosts and follow the task's progress:
+    ipa automember-rebuild --type=hostgroup --no-wait
+    ipa automember-rebuild-status --wait=60 "cn=<task ID>,cn=automember rebuild membership,cn=tasks,cn=config"
 """)
 
 register = Registry()
@@ -798,24 +802,106 @@ class automember_rebuild(Method):
         if not options.get('no_wait'):
             summary = _('Automember rebuild membership task completed')
             result = {}
-            start_time = time.time()
 
-            while True:
-                try:
-                    task = ldap.get_entry(task_dn)
-                except errors.NotFound:
-                    break
+            # longer rebuilds are followed with no_wait and
+            # automember_rebuild_status
+            try:
+                for task in ldap.watch_task(task_dn, timeout=60):
+                    pass
+            except errors.NotFound:
+                task = None
 
-                if 'nstaskexitcode' in task:
-                    if str(task.single_value['nstaskexitcode']) == '0':
-                        summary=task.single_value['nstaskstatus']
-                        break
+            if task is not None:
+                if task.single_value.get('nstaskexitcode') is None:
+                    raise errors.TaskTimeout(
+                        task=_('Automember'), task_dn=task_dn)
+                if str(task.single_value['nstaskexitcode']) != '0':
                     raise errors.DatabaseError(
                         desc=task.single_value['nstaskstatus'],
                         info=_("Task DN = '%s'" % task_dn))
-                time.sleep(1)
-                if time.time() > (start_time + 60):
-                   raise errors.TaskTimeout(task=_('Automember'), task_dn=task_dn)
+                summary = task.single_value['nstaskstatus']
+
+        return dict(
+            result=result,
+            summary=unicode(summary),
+            value=pkey_to_value(None, options))
+
+
+@register()
+class automember_rebuild_status(Method):
+    __doc__ = _('Show the status of an automember rebuild membership task.')
+
+    obj_name = 'automember_task'
+    attr_name = 'rebuild_status'
+
+    takes_args = (
+        DNParam(
+            'dn',
+            label=_('Task DN'),
+            doc=_('DN of the rebuild membership task'),
+        ),
+    )
+
+    takes_options = (
+        Int(
+            'wait?',
+            minvalue=0,
+            maxvalue=60,
+            label=_('Wait'),
+            doc=_('Number of seconds to wait for the task to finish, '
+                  'at most 60'),
+        ),
+    )
+
+    has_output = output.standard_entry
+
+    has_output_params = (
+        Str(
+            'nstaskstatus',
+            label=_('Task status'),
+        ),
+        Int(
+            'nstaskexitcode',
+            label=_('Task exit code'),
+        ),
+        Int(
+            'nstaskcurrentitem',
+            label=_('Processed entries'),
+        ),
+        Int(
+            'nstasktotalitems',
+            label=_('Total entries'),
+        ),
+    )
+
+    def execute(self, dn, **options):
+        ldap = self.api.Backend.ldap2
+
+        if (len(dn) != len(REBUILD_TASK_CONTAINER) + 1 or
+                not dn.endswith(REBUILD_TASK_CONTAINER)):
+            raise errors.ValidationError(
+                name='dn',
+                error=_('not an automember rebuild membership task'))
+
+        try:
+            for task in ldap.watch_task(dn, timeout=options.get('wait') or 0):
+                pass
+        except errors.NotFound:
+            raise errors.NotFound(
+                reason=_("%(dn)s: task not found") % dict(dn=dn))
+
+        result = {'dn': dn}
+        for attr in ('nstaskstatus', 'nstaskexitcode', 'nstaskcurrentitem',
+                     'nstasktotalitems'):
+            value = task.single_value.get(attr)
+            if value is not None:
+                result[attr] = value
+
+        if 'nstaskexitcode' in result:
+            summary = result.get('nstaskstatus') or _(
+                'Automember rebuild membership task completed')
+        else:
+            summary = _('Automember rebuild membership task in progress')
 
         return dict(
             result=result,
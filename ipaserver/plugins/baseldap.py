@@ -22,6 +22,7 @@ Base classes for LDAP plugins.
 
 import re
 import time
+from collections import defaultdict
 from copy import deepcopy
 import base64
 
@@ -761,70 +762,92 @@ class LDAPObject(Object):
                         new_attr.append(new_value)
                         break
 
-    def get_indirect_members(self, entry_attrs, attrs_list):
+    def get_indirect_members(self, entry_attrs, attrs_list, graph=None):
         if 'memberindirect' in attrs_list:
-            self.get_memberindirect(entry_attrs)
+            self.get_memberindirect(entry_attrs, graph)
         if 'memberofindirect' in attrs_list:
-            self.get_memberofindirect(entry_attrs)
+            self.get_memberofindirect(entry_attrs, graph)
 
-    def get_memberindirect(self, group_entry):
+    def get_membership_graph(self, entries, attrs_list):
+        """
+        Build a `MembershipGraph` to get the indirect members in
+        ``attrs_list`` of ``entries``.
+        """
+        return MembershipGraph(
+            self.backend, self.api.env.basedn,
+            [entry.dn for entry in entries],
+            nested='memberindirect' in attrs_list,
+            containers='memberofindirect' in attrs_list)
+
+    def get_memberindirect(self, group_entry, graph=None):
         """
         Get indirect members
+
+        If ``graph`` is given, the members are looked up in the
+        `MembershipGraph` instead of the directory.
         """
 
-        mo_filter = self.backend.make_filter({'memberof': group_entry.dn})
-        filter = self.backend.combine_filters(
-            ('(member=*)', mo_filter), self.backend.MATCH_ALL)
-        try:
-            result = self.backend.get_entries(
+        indirect = set()
+        if graph is not None:
+            indirect.update(graph.get_nested_members(group_entry.dn))
+        else:
+            mo_filter = self.backend.make_filter({'memberof': group_entry.dn})
+            filter = self.backend.combine_filters(
+                ('(member=*)', mo_filter), self.backend.MATCH_ALL)
+            result = self.backend.iter_entries(
                 self.api.env.basedn,
                 filter=filter,
                 attrs_list=['member'],
                 size_limit=-1, # paged search will get everything anyway
                 paged_search=True)
-        except errors.NotFound:
-            result = []
-
-        indirect = set()
-        for entry in result:
-            indirect.update(entry.raw.get('member', []))
+            try:
+                for entry in result:
+                    indirect.update(entry.raw.get('member', []))
+            except errors.NotFound:
+                pass
         indirect.difference_update(group_entry.raw.get('member', []))
 
         if indirect:
             group_entry.raw['memberindirect'] = list(indirect)
 
-    def get_memberofindirect(self, entry):
+    def get_memberofindirect(self, entry, graph=None):
 
         dn = entry.dn
-        filter = self.backend.make_filter(
-            {
-                'member': dn,
-                'memberuser': dn,
-                'memberhost': dn,
-                'ipaowner': dn
-            }
-        )
-        try:
-            result = self.backend.get_entries(
+        if graph is not None:
+            containers = graph.get_containers(dn)
+        else:
+            filter = self.backend.make_filter(
+                {
+                    'member': dn,
+                    'memberuser': dn,
+                    'memberhost': dn,
+                    'ipaowner': dn
+                }
+            )
+            result = self.backend.iter_entries(
                 self.api.env.basedn,
                 filter=filter,
                 attrs_list=[''],
                 size_limit=-1,  # paged search will get everything anyway
                 paged_search=True)
-        except errors.NotFound:
-            result = []
+            containers = set()
+            try:
+                for group_entry in result:
+                    containers.add(group_entry.dn)
+            except errors.NotFound:
+                pass
 
-        direct = set()
-        indirect = set(entry.raw.get('memberof', []))
-        for group_entry in result:
-            dn = str(group_entry.dn).encode('utf-8')
-            if dn in indirect:
-                indirect.remove(dn)
-                direct.add(dn)
+        direct = []
+        indirect = []
+        for value in entry.raw.get('memberof', []):
+            if DN(value.decode('utf-8')) in containers:
+                direct.append(value)
+            else:
+                indirect.append(value)
 
-        entry.raw['memberof'] = list(direct)
+        entry.raw['memberof'] = direct
         if indirect:
-            entry.raw['memberofindirect'] = list(indirect)
+            entry.raw['memberofindirect'] = indirect
 
     def get_password_attributes(self, ldap, dn, entry_attrs):
         """
@@ -1955,6 +1978,100 @@ class LDAPRemoveMember(LDAPModMember):
         raise exc
 
 
+class MembershipGraph:
+    """
+    In-memory index of group-like membership of a set of entries.
+
+    The index answers the same questions as the per-entry searches done by
+    `LDAPObject.get_memberindirect` and `LDAPObject.get_memberofindirect`
+    for many entries at once. It is built with paged searches whose filters
+    list up to ``batch_size`` of the entries, so its cost grows with the
+    number of entries and not with the size of the directory.
+
+    DNs are compared in their normalized `DN` form.
+    """
+    container_attrs = ('member', 'memberuser', 'memberhost', 'ipaowner')
+    batch_size = 100
+
+    def __init__(self, ldap, base_dn, dns, nested=True, containers=True):
+        """
+        :param dns: DNs of the entries to index
+        :param nested: index members of entries nested in the entries
+        :param containers: index entries which list the entries directly
+        """
+        # raw DN value -> DN
+        self._dns = {}
+        # group DN -> raw member values of entries nested in that group
+        self._nested = defaultdict(set)
+        # DN -> DNs of the entries which list it directly
+        self._containers = defaultdict(set)
+
+        dns = [DN(dn) for dn in dns]
+        for i in range(0, len(dns), self.batch_size):
+            batch = dns[i:i + self.batch_size]
+            if nested:
+                self._add_nested(ldap, base_dn, batch)
+            if containers:
+                self._add_containers(ldap, base_dn, batch)
+
+    def _get_dn(self, value):
+        dn = self._dns.get(value)
+        if dn is None:
+            dn = self._dns[value] = DN(value.decode('utf-8'))
+        return dn
+
+    def _iter_entries(self, ldap, base_dn, filter, attrs_list):
+        entries = ldap.iter_entries(
+            base_dn,
+            filter=filter,
+            attrs_list=attrs_list,
+            size_limit=-1,  # paged search will get everything anyway
+            paged_search=True)
+        try:
+            for entry in entries:
+                yield entry
+        except errors.NotFound:
+            pass
+
+    def _add_nested(self, ldap, base_dn, groups):
+        filter = ldap.combine_filters(
+            ('(member=*)', ldap.make_filter({'memberof': groups})),
+            ldap.MATCH_ALL)
+        groups = set(groups)
+        for entry in self._iter_entries(
+                ldap, base_dn, filter, ['member', 'memberof']):
+            members = entry.raw.get('member', [])
+            for value in entry.raw.get('memberof', []):
+                group = self._get_dn(value)
+                if group in groups:
+                    self._nested[group].update(members)
+
+    def _add_containers(self, ldap, base_dn, dns):
+        filter = ldap.make_filter(
+            {attr: dns for attr in self.container_attrs})
+        dns = set(dns)
+        for entry in self._iter_entries(
+                ldap, base_dn, filter, list(self.container_attrs)):
+            for attr in self.container_attrs:
+                for value in entry.raw.get(attr, []):
+                    dn = self._get_dn(value)
+                    if dn in dns:
+                        self._containers[dn].add(entry.dn)
+
+    def get_nested_members(self, dn):
+        """
+        Return raw member values of all entries nested in the group ``dn``.
+        """
+        return self._nested.get(DN(dn), set())
+
+    def get_containers(self, dn):
+        """
+        Return DNs of entries which have ``dn`` as a direct member, user,
+        host or owner.
+        """
+        return self._containers.get(DN(dn), set())
+
+
 def gen_pkey_only_option(cli_name):
     return Flag('pkey_only?',
                 label=_('Primary key only'),
@@ -2180,8 +2297,13 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
                 entries.sort(key=sort_key)
 
         if not options.get('raw', False):
+            graph = None
+            if (len(entries) > 1 and
+                    {'memberindirect', 'memberofindirect'} & set(attrs_list)):
+                # batched searches instead of one or two per entry
+                graph = self.obj.get_membership_graph(entries, attrs_list)
             for entry in entries:
-                self.obj.get_indirect_members(entry, attrs_list)
+                self.obj.get_indirect_members(entry, attrs_list, graph)
                 self.obj.convert_attribute_members(entry, *args, **options)
 
         for (i, e) in enumerate(entries):
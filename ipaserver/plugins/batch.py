@@ -18,17 +18,19 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
 import logging
+import threading
 
 import six
 
-from ipalib import api, errors
+from ipalib import api, crud, errors
 from ipalib import Command
 from ipalib.frontend import Local
-from ipalib.parameters import Str, Dict
+from ipalib.parameters import Flag, Str, Dict
 from ipalib.output import Output
 from ipalib.text import _
-from ipalib.request import context
+from ipalib.request import context, destroy_context
 from ipalib.plugable import Registry
 
 __doc__ = _("""
@@ -46,6 +48,13 @@ where the contents of the file batch_request.json follow the below example
         {"method":"user_show","params":[["admin"],{"all":true}]}
         ],{}],"id":1}
 
+With the "parallel" option set to true, consecutive read-only methods
+(*_show and *_find) are executed concurrently over separate LDAP connections
+bound as the same user. Other methods are executed one at a time in their
+original position, so they see the effects of all methods before them and
+the methods after them see theirs. Results are always returned in request
+order.
+
 The format of the response is nested the same way.  At the top you will see
   "error": null,
     "id": 1,
@@ -81,6 +90,9 @@ class batch(Command):
             doc=_('Keep specified attributes in the output, '
                   'remove everything else.'),
         ),
+        Flag('parallel?',
+            doc=_('Execute read-only methods concurrently'),
+        ),
     )
 
     has_output = (
@@ -152,60 +164,142 @@ class batch(Command):
             logger.debug('batch: %s',
                          ', '.join(super(batch, self)._repr_iter(**params)))
 
-    def execute(self, methods=None, **options):
-        results = []
-        op_account = getattr(context, 'principal', '[autobind]')
+    def _is_read_only(self, request):
+        """
+        Check whether a request in a batch only reads data and can be run
+        concurrently with other read-only requests.
+        """
+        try:
+            command = self.api.Command[request['method']]
+        except (KeyError, TypeError):
+            return False
+        return isinstance(command, (crud.Retrieve, crud.Search))
+
+    def _execute_method(self, arg, options, op_account):
+        params = dict()
+        name = None
         keeponly = options.get("keeponly", None)
-        for arg in (methods or []):
-            params = dict()
-            name = None
-            try:
-                self._validate_request(arg)
-                name = arg['method']
-                a, kw = arg['params']
-                newkw = dict((str(k), v) for k, v in kw.items())
-                params = api.Command[name].args_options_2_params(
-                    *a, **newkw)
-                newkw.setdefault('version', options['version'])
-
-                result = api.Command[name](*a, **newkw)
+        try:
+            self._validate_request(arg)
+            name = arg['method']
+            a, kw = arg['params']
+            newkw = dict((str(k), v) for k, v in kw.items())
+            params = api.Command[name].args_options_2_params(
+                *a, **newkw)
+            newkw.setdefault('version', options['version'])
+
+            result = api.Command[name](*a, **newkw)
+            logger.info(
+                '%s: batch: %s(%s): SUCCESS',
+                op_account,
+                name,
+                ', '.join(api.Command[name]._repr_iter(**params))
+            )
+            result['error'] = None
+            res = result.get('result', None)
+            if keeponly is not None and isinstance(res, dict):
+                result["result"] = dict(
+                    filter(lambda x: x[0] in keeponly, res.items())
+                )
+        except Exception as e:
+            if (isinstance(e, errors.RequirementError) or
+                    isinstance(e, errors.CommandError) or
+                    isinstance(e, errors.ConversionError)):
                 logger.info(
-                    '%s: batch: %s(%s): SUCCESS',
+                    '%s: batch: %s',
                     op_account,
-                    name,
-                    ', '.join(api.Command[name]._repr_iter(**params))
+                    e.__class__.__name__
                 )
-                result['error'] = None
-                res = result.get('result', None)
-                if keeponly is not None and isinstance(res, dict):
-                    result["result"] = dict(
-                        filter(lambda x: x[0] in keeponly, res.items())
-                    )
-            except Exception as e:
-                if (isinstance(e, errors.RequirementError) or
-                        isinstance(e, errors.CommandError) or
-                        isinstance(e, errors.ConversionError)):
-                    logger.info(
-                        '%s: batch: %s',
-                        op_account,
-                        e.__class__.__name__
-                    )
-                else:
-                    logger.info(
-                        '%s: batch: %s(%s): %s',
-                        op_account, name,
-                        ', '.join(api.Command[name]._repr_iter(**params)),
-                        e.__class__.__name__
-                    )
-                if isinstance(e, errors.PublicError):
-                    reported_error = e
-                else:
-                    reported_error = errors.InternalError()
-                result = dict(
-                    error=reported_error.strerror,
-                    error_code=reported_error.errno,
-                    error_name=unicode(type(reported_error).__name__),
-                    error_kw=reported_error.kw,
+            else:
+                logger.info(
+                    '%s: batch: %s(%s): %s',
+                    op_account, name,
+                    ', '.join(api.Command[name]._repr_iter(**params)),
+                    e.__class__.__name__
                 )
-            results.append(result)
+            if isinstance(e, errors.PublicError):
+                reported_error = e
+            else:
+                reported_error = errors.InternalError()
+            result = dict(
+                error=reported_error.strerror,
+                error_code=reported_error.errno,
+                error_name=unicode(type(reported_error).__name__),
+                error_kw=reported_error.kw,
+            )
+        return result
+
+    def _execute_concurrently(self, indexes, methods, results, options,
+                              op_account):
+        """
+        Execute the methods at the given indexes in worker threads, each
+        with its own LDAP connection bound with the caller's credentials.
+        """
+        pending = collections.deque(indexes)
+        ccache_name = context.ccache_name
+        principal = getattr(context, 'principal', None)
+        languages = getattr(context, 'languages', None)
+
+        def worker():
+            try:
+                if principal is not None:
+                    context.principal = principal
+                if languages is not None:
+                    context.languages = languages
+                context.ccache_name = ccache_name
+                self.api.Backend.ldap2.connect(
+                    ccache=ccache_name, size_limit=None, time_limit=None)
+                while True:
+                    try:
+                        i = pending.popleft()
+                    except IndexError:
+                        break
+                    results[i] = self._execute_method(
+                        methods[i], options, op_account)
+            except Exception as e:
+                logger.warning('batch: parallel worker failed: %s', e)
+            finally:
+                destroy_context()
+
+        num_workers = min(self.api.env.batch_parallel_workers, len(indexes))
+        threads = [threading.Thread(target=worker)
+                   for _i in range(num_workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # run whatever the workers could not handle, e.g. because they
+        # failed to connect
+        for i in indexes:
+            if results[i] is None:
+                results[i] = self._execute_method(
+                    methods[i], options, op_account)
+
+    def execute(self, methods=None, **options):
+        methods = methods or []
+        results = [None] * len(methods)
+        op_account = getattr(context, 'principal', '[autobind]')
+
+        parallel = (
+            options.get('parallel', False)
+            and self.api.env.batch_parallel_workers > 1
+            and getattr(context, 'ccache_name', None) is not None
+        )
+
+        i = 0
+        while i < len(methods):
+            if parallel and self._is_read_only(methods[i]):
+                # collect the run of consecutive read-only methods
+                run = []
+                while i < len(methods) and self._is_read_only(methods[i]):
+                    run.append(i)
+                    i += 1
+                if len(run) > 1:
+                    self._execute_concurrently(
+                        run, methods, results, options, op_account)
+                    continue
+                i = run[0]
+            results[i] = self._execute_method(methods[i], options, op_account)
+            i += 1
         return dict(count=len(results) , results=results)
@@ -1894,8 +1894,14 @@ class cert_find(Search, CertMethod):
 
         if not pkey_only:
             ca_objs = {}
-            if ca_enabled:
-                ra = self.api.Backend.ra
+            certs = {}
+            if ca_enabled and all:
+                # fetch all certificates at once rather than one by one
+                certs = self.api.Backend.ra.get_certificates(
+                    serial_number
+                    for (_issuer, serial_number), obj in result.items()
+                    if 'cacn' in obj
+                )
 
             for key, obj in six.iteritems(result):
                 if all and 'cacn' in obj:
@@ -1908,9 +1914,7 @@ class cert_find(Search, CertMethod):
                         ca_obj = ca_objs[cacn] = (
                             self.api.Command.ca_show(cacn, all=True)['result'])
 
-                    obj.update(
-                        ra.get_certificate(serial_number)
-                    )
+                    obj.update(certs[serial_number])
                     if not raw:
                         obj['certificate'] = (
                             obj['certificate'].replace('\r\n', ''))
@@ -249,22 +249,28 @@ digits and nothing else follows.
 
 from __future__ import absolute_import
 
+import concurrent.futures
+import http.client
 import json
 import logging
 
 from lxml import etree
 import time
+import threading
 import contextlib
 
 import six
 
 from ipalib import Backend, api, x509
+from ipalib.request import context
+from ipalib.util import create_https_connection
 from ipapython.dn import DN
 import ipapython.cookie
 from ipapython import dogtag, ipautil
 from ipaserver.masters import find_providing_server
 
 import pki
+from pki.account import AccountClient
 from pki.client import PKIConnection
 import pki.crypto as cryptoutil
 from pki.kra import KRAClient
@@ -498,7 +504,7 @@ def parse_updateCRL_xml(doc):
 
 #-------------------------------------------------------------------------------
 
-from ipalib import Registry, errors, SkipPluginModule
+from ipalib import Registry, errors, profiler, SkipPluginModule
 
 # We only load the dogtag RA plugin if it is necessary to do so.
 # This is legacy code from when multiple RA backends were supported.
@@ -519,6 +525,63 @@ from ipaplatform.paths import paths
 register = Registry()
 
 
+class _KeepAliveConnection:
+    """
+    HTTPS connection reused for consecutive requests to one server.
+
+    A request which fails on a connection the server may have closed, e.g.
+    after its keep-alive timeout, is retried once on a new connection, so
+    only idempotent requests may be sent over it.
+    """
+
+    def __init__(self, host, port, connection_factory):
+        self.host = host
+        self.port = port
+        self.connection_factory = connection_factory
+        self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def request(self, method, path, headers=None, body=None):
+        """
+        :return:   (http_status, http_headers, http_body)
+                   as (integer, dict, str)
+        """
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = self.connection_factory(self.host, self.port)
+            try:
+                self.conn.request(method, path, body=body,
+                                  headers=headers or {})
+                res = self.conn.getresponse()
+                http_body = res.read()
+            except (OSError, http.client.HTTPException) as e:
+                self.close()
+                if attempt:
+                    raise errors.NetworkError(
+                        uri='https://%s%s' % (
+                            ipautil.format_netloc(self.host, self.port),
+                            path),
+                        error=str(e))
+                continue
+            if res.will_close:
+                self.close()
+            http_body = dogtag.decode_content(
+                res.getheader('Content-Encoding'), http_body)
+            return res.status, res.msg, http_body
+        # unreachable
+        raise AssertionError
+
+
 class RestClient(Backend):
     """Simple Dogtag REST client to be subclassed by other backends.
 
@@ -623,7 +686,23 @@ class RestClient(Backend):
         )
         object.__setattr__(self, 'cookie', None)
 
-    def _ssldo(self, method, path, headers=None, body=None, use_session=True):
+    def _keepalive_connection(self, host, port):
+        """
+        Create a connection for requests sent with ``_ssldo(connection=)``.
+        """
+        def connection_factory(host, port):
+            return create_https_connection(
+                host, port,
+                cafile=self.ca_cert,
+                client_certfile=self.client_certfile,
+                client_keyfile=self.client_keyfile,
+                tls_version_min=self.api.env.tls_version_min,
+                tls_version_max=self.api.env.tls_version_max)
+
+        return _KeepAliveConnection(host, port, connection_factory)
+
+    def _ssldo(self, method, path, headers=None, body=None, use_session=True,
+               connection=None):
         """
         Perform an HTTPS request.
 
@@ -634,6 +713,9 @@ class RestClient(Backend):
         :param body: Request body.
         :param use_session: If ``True``, session cookie is added to request
             (client must be logged in).
+        :param connection: Connection from ``_keepalive_connection()`` to
+            send the request over. A new connection to ``ca_host`` is made
+            for the request if None.
 
         :return:   (http_status, http_headers, http_body)
                    as (integer, dict, str)
@@ -657,14 +739,24 @@ class RestClient(Backend):
             resource = os.path.join(resource, path)
 
         # perform main request
-        status, resp_headers, resp_body = dogtag.https_request(
-            self.ca_host, self.override_port or self.env.ca_agent_port,
-            url=resource,
-            cafile=self.ca_cert,
-            client_certfile=self.client_certfile,
-            client_keyfile=self.client_keyfile,
-            method=method, headers=headers, body=body
-        )
+        start = time.perf_counter()
+        try:
+            if connection is not None:
+                status, resp_headers, resp_body = connection.request(
+                    method, resource, headers=headers, body=body)
+            else:
+                status, resp_headers, resp_body = dogtag.https_request(
+                    self.ca_host,
+                    self.override_port or self.env.ca_agent_port,
+                    url=resource,
+                    cafile=self.ca_cert,
+                    client_certfile=self.client_certfile,
+                    client_keyfile=self.client_keyfile,
+                    method=method, headers=headers, body=body
+                )
+        finally:
+            profiler.record('dogtag', '%s %s' % (self.name, method),
+                            time.perf_counter() - start)
         if status < 200 or status >= 300:
             explanation = self._parse_dogtag_error(resp_body) or ''
             raise errors.HTTPRequestError(
@@ -916,9 +1008,94 @@ class ra(rabase.rabase, RestClient):
                 detail=e.status  # pylint: disable=no-member
             )
 
+        return self._parse_certificate(http_body)
+
+    def get_certificates(self, serial_numbers):
+        """
+        Retrieve many existing certificates.
+
+        The certificates are fetched in parallel over at most
+        ``ca_bulk_connections`` HTTPS connections. Each connection is kept
+        alive and reused for consecutive requests, so the TLS handshake
+        and client authentication are paid once per connection rather
+        than once per certificate.
+
+        :param serial_numbers: iterable of certificate serial numbers
+        :return: dict mapping each serial number to the result of
+                 get_certificate()
+        """
+        logger.debug('%s.get_certificates()', type(self).__name__)
+
+        serial_numbers = list(serial_numbers)
+        if len(serial_numbers) <= 1:
+            return super(ra, self).get_certificates(serial_numbers)
+
+        # ca_host may need LDAP, which is only available in this thread
+        ca_host = self.ca_host
+        port = self.override_port or self.env.ca_agent_port
+        profile = profiler.get_profile()
+
+        workers = max(1, min(self.api.env.ca_bulk_connections,
+                             len(serial_numbers)))
+        chunks = [serial_numbers[i::workers] for i in range(workers)]
+
+        result = {}
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers) as executor:
+            futures = [
+                executor.submit(self._get_certificates_chunk,
+                                ca_host, port, chunk, profile)
+                for chunk in chunks
+            ]
+            for future in futures:
+                result.update(future.result())
+        return result
+
+    def _get_certificates_chunk(self, host, port, serial_numbers,
+                                profile=None):
+        """
+        Retrieve certificates one after another over a single persistent
+        HTTPS connection.
+
+        :param profile: profile of the request to record the calls in
+        """
+        if profile is not None:
+            context.profile = profile
+        result = {}
+        try:
+            with self._keepalive_connection(host, port) as connection:
+                for serial_number in serial_numbers:
+                    try:
+                        _http_status, _http_headers, http_body = self._ssldo(
+                            'GET', 'certs/{}'.format(serial_number),
+                            use_session=False,
+                            headers={
+                                'Accept': 'application/json',
+                            },
+                            connection=connection,
+                        )
+                    except errors.HTTPRequestError as e:
+                        self.raise_certificate_operation_error(
+                            'get_certificates',
+                            err_msg=e.msg,
+                            detail=e.status  # pylint: disable=no-member
+                        )
+                    result[serial_number] = self._parse_certificate(
+                        http_body)
+        finally:
+            if profile is not None:
+                del context.profile
+
+        return result
+
+    def _parse_certificate(self, http_body):
+        """
+        Convert the JSON representation of a certificate returned by the
+        REST API to the result of get_certificate().
+        """
         try:
             resp = json.loads(ipautil.decode_json(http_body))
-        except ValueError:
+        except ValueError as e:
             logger.debug("Response from CA was not valid JSON: %s", e)
             raise errors.RemoteRetrieveError(
                 reason=_("Response from CA was not valid JSON")
@@ -1536,6 +1713,20 @@ class ra(rabase.rabase, RestClient):
 
 
 # ----------------------------------------------------------------------------
+class _KRASession:
+    """
+    A KRA client logged in with its account client.
+    """
+
+    __slots__ = ('client', 'account', 'started', 'discarded')
+
+    def __init__(self, client, account):
+        self.client = client
+        self.account = account
+        self.started = time.monotonic()
+        self.discarded = False
+
+
 @register()
 class kra(Backend):
     """
@@ -1544,6 +1735,11 @@ class kra(Backend):
 
     def __init__(self, api, kra_port=443):
         self.kra_port = kra_port
+        self.__sessions_lock = threading.Lock()
+        # idle logged in sessions, least recently used first
+        self.__sessions = []
+        # sessions in use, keyed by id() of their client
+        self.__busy = {}
         super(kra, self).__init__(api)
 
     @property
@@ -1567,18 +1763,12 @@ class kra(Backend):
             kra_host = api.env.ca_host
         return kra_host
 
-    @contextlib.contextmanager
-    def get_client(self):
+    def _login(self):
         """
-        Returns an authenticated KRA client to access KRA services.
+        Connect to KRA and log in.
 
-        Raises a generic exception if KRA is not enabled.
+        :return: tuple of the KRA client and its account client
         """
-
-        if not self.api.Command.kra_is_enabled()['result']:
-            # TODO: replace this with a more specific exception
-            raise RuntimeError('KRA service is not enabled')
-
         crypto = cryptoutil.CryptographyCryptoProvider(
             transport_cert_nick="ra_agent",
             transport_cert=x509.load_certificate_from_file(paths.RA_AGENT_PEM)
@@ -1597,7 +1787,117 @@ class kra(Backend):
         connection.set_authentication_cert(paths.RA_AGENT_PEM,
                                            paths.RA_AGENT_KEY)
 
-        yield KRAClient(connection, crypto)
+        kra_client = KRAClient(connection, crypto)
+        kra_account = AccountClient(connection)
+        start = time.perf_counter()
+        kra_account.login()
+        profiler.record('dogtag', 'kra login', time.perf_counter() - start)
+        return kra_client, kra_account
+
+    def _logout(self, kra_account):
+        """
+        Log out of KRA and close the connection, ignoring failures.
+        """
+        try:
+            kra_account.logout()
+        except Exception as e:
+            logger.debug("Failed to log out of KRA: %s", e)
+        finally:
+            kra_account.connection.session.close()
+
+    def _checkout_session(self, lifetime):
+        """
+        Take the most recently used idle session younger than ``lifetime``
+        seconds out of the pool, or return None.
+        """
+        now = time.monotonic()
+        stale = []
+        session = None
+        with self.__sessions_lock:
+            for candidate in list(self.__sessions):
+                if now - candidate.started >= lifetime:
+                    self.__sessions.remove(candidate)
+                    stale.append(candidate)
+            if self.__sessions:
+                session = self.__sessions.pop()
+                self.__busy[id(session.client)] = session
+        for candidate in stale:
+            self._logout(candidate.account)
+        return session
+
+    def _release_session(self, session, lifetime):
+        """
+        Return a session to the pool, or log it out if it was discarded,
+        has expired or the pool is full.
+        """
+        evicted = []
+        size = self.api.env.kra_session_pool_size
+        with self.__sessions_lock:
+            self.__busy.pop(id(session.client), None)
+            if (session.discarded or
+                    time.monotonic() - session.started >= lifetime):
+                evicted.append(session)
+            else:
+                self.__sessions.append(session)
+                while len(self.__sessions) > size:
+                    evicted.append(self.__sessions.pop(0))
+        for session in evicted:
+            self._logout(session.account)
+
+    def discard_client(self, kra_client):
+        """
+        Log out the session of a client obtained from get_client() when it
+        is released instead of returning it to the pool.
+        """
+        with self.__sessions_lock:
+            session = self.__busy.get(id(kra_client))
+            if session is not None:
+                session.discarded = True
+
+    @contextlib.contextmanager
+    def get_client(self):
+        """
+        Returns an authenticated KRA client to access KRA services.
+
+        The client is logged in to KRA. After use, the session is kept in
+        a pool of at most ``kra_session_pool_size`` idle sessions shared by
+        all threads of the process, and reused by later calls until it is
+        older than ``kra_session_lifetime`` seconds. A session is logged
+        out when an exception other than NotFound is raised while it is
+        used, so a session the KRA no longer accepts is not reused.
+
+        Raises a generic exception if KRA is not enabled.
+        """
+
+        if not self.api.Command.kra_is_enabled()['result']:
+            # TODO: replace this with a more specific exception
+            raise RuntimeError('KRA service is not enabled')
+
+        lifetime = self.api.env.kra_session_lifetime
+        if lifetime <= 0 or self.api.env.kra_session_pool_size <= 0:
+            kra_client, kra_account = self._login()
+            try:
+                yield kra_client
+            finally:
+                self._logout(kra_account)
+            return
+
+        session = self._checkout_session(lifetime)
+        if session is None:
+            kra_client, kra_account = self._login()
+            session = _KRASession(kra_client, kra_account)
+            with self.__sessions_lock:
+                self.__busy[id(kra_client)] = session
+
+        try:
+            yield session.client
+        except errors.NotFound:
+            raise
+        except BaseException:
+            session.discarded = True
+            raise
+        finally:
+            self._release_session(session, lifetime)
 
 
 @register()
@@ -17,7 +17,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
 import logging
+import threading
 
 from ipalib import api, errors, output, util
 from ipalib import Command, Str, Flag, Int
@@ -25,6 +27,7 @@ from ipalib import _
 from ipapython.dn import DN
 from ipalib.plugable import Registry
 from ipalib.messages import VersionMissing
+from ipalib.request import context
 
 if api.env.in_server:
     try:
@@ -147,6 +150,28 @@ EXAMPLES:
       Not matched rules: new-rule
       Matched rules: allow_all
 
+    8. Test several users against several services at once:
+    $ ipa hbactest-many --user=a1a --user=b2b --host=bar \\
+          --service=sshd --service=login --rules=myrule
+    ------------------------------------
+    Access granted in 1 of 4 simulations
+    ------------------------------------
+      a1a, bar, sshd: Access granted
+        Matched rules: myrule
+      a1a, bar, login: Access denied
+        Not matched rules: myrule
+      b2b, bar, sshd: Access denied
+        Not matched rules: myrule
+      b2b, bar, login: Access denied
+        Not matched rules: myrule
+
+ hbactest-many accepts the same rule selection options as hbactest and
+ simulates every combination of the given users, hosts and services. Each
+ user, host and service is looked up only once and the selected rules are
+ fetched once for all simulations.
+
+ Rule sets selected with --enabled or --disabled are cached by the server
+ until any HBAC rule is added, modified or removed.
 
 HBACTEST AND TRUSTED DOMAINS
 
@@ -221,6 +246,43 @@ logger = logging.getLogger(__name__)
 
 register = Registry()
 
+
+class HBACRuleSetCache:
+    """
+    Per-process cache of HBAC rule sets compiled to pyhbac rules.
+
+    Keys contain the modification state of the HBAC rules, so a change to
+    any rule leaves the cached rule sets unused until they are evicted.
+    """
+    def __init__(self, size=16):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                return None
+            self._entries[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_rule_cache = HBACRuleSetCache()
+
+
 def _convert_to_ipa_rule(rule):
     # convert a dict with a rule to an pyhbac rule
     ipa_rule = pyhbac.HbacRule(rule['cn'][0])
@@ -319,22 +381,67 @@ class hbactest(Command):
             return u'%s.%s' % (host, self.env.domain)
         return host
 
-    def execute(self, *args, **options):
-        # First receive all needed information:
-        # 1. HBAC rules (whether enabled or disabled)
-        # 2. Required options are (user, target host, service)
-        # 3. Options: rules to test (--rules, --enabled, --disabled), request for detail output
+    def _get_rules_state(self):
+        """
+        Return a hashable snapshot of the modification state of all HBAC
+        rules visible to the caller, or None if it cannot be determined.
+        """
+        ldap = self.api.Backend.ldap2
+        container = DN(self.api.env.container_hbac, self.api.env.basedn)
+        try:
+            entries = ldap.get_entries(
+                container, ldap.SCOPE_ONELEVEL, '(objectclass=ipahbacrule)',
+                ['entryusn', 'modifytimestamp'],
+                size_limit=-1,  # paged search will get everything anyway
+                paged_search=True)
+        except errors.NotFound:
+            return ()
+        except errors.LimitsExceeded:
+            return None
+        return tuple(sorted(
+            (str(entry.dn),
+             entry.single_value.get('entryusn'),
+             str(entry.single_value.get('modifytimestamp')))
+            for entry in entries
+        ))
+
+    def _compile_rules(self, hbacset, testrules, all_enabled, all_disabled):
+        # --enabled will import all enabled rules (default)
+        # --disabled will import all disabled rules
+        # --rules will implicitly add the rules from a rule list
         rules = []
-        result = {
-            'warning':None, 'matched':None, 'notmatched':None, 'error':None
-        }
+        for rule in hbacset:
+            ipa_rule = _convert_to_ipa_rule(rule)
+            if ipa_rule.name in testrules:
+                ipa_rule.enabled = True
+                rules.append(ipa_rule)
+                testrules.remove(ipa_rule.name)
+            elif all_enabled and ipa_rule.enabled:
+                # Option --enabled forces to include all enabled IPA rules into test
+                rules.append(ipa_rule)
+            elif all_disabled and not ipa_rule.enabled:
+                # Option --disabled forces to include all disabled IPA rules into test
+                ipa_rule.enabled = True
+                rules.append(ipa_rule)
+        return rules
+
+    def _get_rules(self, options):
+        """
+        Fetch the HBAC rules selected by options and compile them to pyhbac
+        rules.
+
+        Rule sets selected by --enabled and --disabled are cached, keyed by
+        the modification state of the HBAC rules, so repeated simulations
+        do not fetch and convert all rules again unless they have changed.
 
+        Returns a tuple (rules, unresolved rule names, messages).
+        """
         # Use all enabled IPA rules by default
         all_enabled = True
         all_disabled = False
 
         # We need a local copy of test rules in order find incorrect ones
-        testrules = {}
+        testrules = []
         if 'rules' in options:
             testrules = list(options['rules'])
             # When explicit rules are provided, disable assumptions
@@ -354,133 +461,159 @@ class hbactest(Command):
         if options['enabled']:
             all_enabled = True
 
-        hbacset = []
-        if len(testrules) == 0:
-            hbacrules = self.api.Command.hbacrule_find(
-                sizelimit=sizelimit, no_members=False)
-            hbacset = hbacrules['result']
-            for message in hbacrules['messages']:
-                if message['code'] != VersionMissing.errno:
-                    result.setdefault('messages', []).append(message)
-        else:
+        if testrules:
+            hbacset = []
             for rule in testrules:
                 try:
                     hbacset.append(self.api.Command.hbacrule_show(rule)['result'])
                 except Exception:
                     pass
+            rules = self._compile_rules(
+                hbacset, testrules, all_enabled, all_disabled)
+            return rules, testrules, []
+
+        key = None
+        state = self._get_rules_state()
+        if state is not None:
+            key = (getattr(context, 'principal', None), all_enabled,
+                   all_disabled, sizelimit, state)
+            cached = _rule_cache.get(key)
+            if cached is not None:
+                rules, messages = cached
+                return rules, [], messages
+
+        hbacrules = self.api.Command.hbacrule_find(
+            sizelimit=sizelimit, no_members=False)
+        messages = [
+            message for message in hbacrules['messages']
+            if message['code'] != VersionMissing.errno
+        ]
+        rules = self._compile_rules(
+            hbacrules['result'], testrules, all_enabled, all_disabled)
+        if key is not None:
+            _rule_cache.set(key, (rules, messages))
+        return rules, [], messages
+
+    def _get_user(self, user):
+        """
+        Return the name and the groups of the user to put in a request,
+        or None if the request should match all users.
+        """
+        if user == u'all':
+            return None
+
+        # check first if this is not a trusted domain user
+        if _dcerpc_bindings_installed:
+            # pylint: disable=used-before-assignment
+            is_valid_sid = ipaserver.dcerpc.is_sid_valid(user)
+            # pylint: enable=used-before-assignment
+        else:
+            is_valid_sid = False
+        components = util.normalize_name(user)
+        if is_valid_sid or 'domain' in components or 'flatname' in components:
+            # this is a trusted domain user
+            if not _dcerpc_bindings_installed:
+                raise errors.NotFound(reason=_(
+                    'Cannot perform external member validation without '
+                    'Samba 4 support installed. Make sure you have installed '
+                    'server-trust-ad sub-package of IPA on the server'))
+            domain_validator = ipaserver.dcerpc.DomainValidator(self.api)
+            if not domain_validator.is_configured():
+                raise errors.NotFound(reason=_(
+                    'Cannot search in trusted domains without own domain configured. '
+                    'Make sure you have run ipa-adtrust-install on the IPA server first'))
+            user_sid, group_sids = domain_validator.get_trusted_domain_user_and_groups(user)
+
+            # Now search for all external groups that have this user or
+            # any of its groups in its external members. Found entires
+            # memberOf links will be then used to gather all groups where
+            # this group is assigned, including the nested ones
+            filter_sids = "(&(objectclass=ipaexternalgroup)(|(ipaExternalMember=%s)))" \
+                    % ")(ipaExternalMember=".join(group_sids + [user_sid])
+
+            ldap = self.api.Backend.ldap2
+            group_container = DN(api.env.container_group, api.env.basedn)
+            try:
+                entries, _truncated = ldap.find_entries(
+                    filter_sids, ['memberof'], group_container)
+            except errors.NotFound:
+                return user_sid, []
+            groups = []
+            for entry in entries:
+                memberof_dns = entry.get('memberof', [])
+                for memberof_dn in memberof_dns:
+                    if memberof_dn.endswith(group_container):
+                        groups.append(memberof_dn[0][0].value)
+            return user_sid, sorted(set(groups))
+
+        # try searching for a local user
+        groups = []
+        try:
+            search_result = self.api.Command.user_show(user)['result']
+            groups = search_result['memberof_group']
+            if 'memberofindirect_group' in search_result:
+                groups += search_result['memberofindirect_group']
+        except Exception:
+            pass
+        return user, sorted(set(groups))
+
+    def _get_service(self, service):
+        """
+        Return the name and the groups of the service to put in a request,
+        or None if the request should match all services.
+        """
+        if service == u'all':
+            return None
+
+        groups = []
+        try:
+            service_result = self.api.Command.hbacsvc_show(service)['result']
+            if 'memberof_hbacsvcgroup' in service_result:
+                groups = service_result['memberof_hbacsvcgroup']
+        except Exception:
+            pass
+        return service, groups
+
+    def _get_targethost(self, targethost):
+        """
+        Return the name and the groups of the target host to put in a
+        request, or None if the request should match all hosts.
+        """
+        if targethost == u'all':
+            return None
+
+        targethost = self.canonicalize(targethost)
+        groups = []
+        try:
+            tgthost_result = self.api.Command.host_show(targethost)['result']
+            groups = tgthost_result['memberof_hostgroup']
+            if 'memberofindirect_hostgroup' in tgthost_result:
+                groups += tgthost_result['memberofindirect_hostgroup']
+        except Exception:
+            pass
+        return targethost, sorted(set(groups))
+
+    def _evaluate(self, rules, user, targethost, service, nodetail):
+        """
+        Build a pyhbac request from the (name, groups) pairs returned by
+        _get_user(), _get_targethost() and _get_service() and evaluate it
+        against rules.
 
-        # We have some rules, import them
-        # --enabled will import all enabled rules (default)
-        # --disabled will import all disabled rules
-        # --rules will implicitly add the rules from a rule list
-        for rule in hbacset:
-            ipa_rule = _convert_to_ipa_rule(rule)
-            if ipa_rule.name in testrules:
-                ipa_rule.enabled = True
-                rules.append(ipa_rule)
-                testrules.remove(ipa_rule.name)
-            elif all_enabled and ipa_rule.enabled:
-                # Option --enabled forces to include all enabled IPA rules into test
-                rules.append(ipa_rule)
-            elif all_disabled and not ipa_rule.enabled:
-                # Option --disabled forces to include all disabled IPA rules into test
-                ipa_rule.enabled = True
-                rules.append(ipa_rule)
-
-        # Check if there are unresolved rules left
-        if len(testrules) > 0:
-            # Error, unresolved rules are left in --rules
-            return {'summary' : unicode(_(u'Unresolved rules in --rules')),
-                    'error': testrules, 'matched': None, 'notmatched': None,
-                    'warning' : None, 'value' : False}
-
-        # Rules are converted to pyhbac format, build request and then test it
+        Returns a tuple (access granted, matched rule names, not matched
+        rule names, invalid rule names).
+        """
         request = pyhbac.HbacRequest()
-
-        if options['user'] != u'all':
-            # check first if this is not a trusted domain user
-            if _dcerpc_bindings_installed:
-                # pylint: disable=used-before-assignment
-                is_valid_sid = ipaserver.dcerpc.is_sid_valid(options['user'])
-                # pylint: enable=used-before-assignment
-            else:
-                is_valid_sid = False
-            components = util.normalize_name(options['user'])
-            if is_valid_sid or 'domain' in components or 'flatname' in components:
-                # this is a trusted domain user
-                if not _dcerpc_bindings_installed:
-                    raise errors.NotFound(reason=_(
-                        'Cannot perform external member validation without '
-                        'Samba 4 support installed. Make sure you have installed '
-                        'server-trust-ad sub-package of IPA on the server'))
-                domain_validator = ipaserver.dcerpc.DomainValidator(self.api)
-                if not domain_validator.is_configured():
-                    raise errors.NotFound(reason=_(
-                        'Cannot search in trusted domains without own domain configured. '
-                        'Make sure you have run ipa-adtrust-install on the IPA server first'))
-                user_sid, group_sids = domain_validator.get_trusted_domain_user_and_groups(options['user'])
-                request.user.name = user_sid
-
-                # Now search for all external groups that have this user or
-                # any of its groups in its external members. Found entires
-                # memberOf links will be then used to gather all groups where
-                # this group is assigned, including the nested ones
-                filter_sids = "(&(objectclass=ipaexternalgroup)(|(ipaExternalMember=%s)))" \
-                        % ")(ipaExternalMember=".join(group_sids + [user_sid])
-
-                ldap = self.api.Backend.ldap2
-                group_container = DN(api.env.container_group, api.env.basedn)
-                try:
-                    entries, _truncated = ldap.find_entries(
-                        filter_sids, ['memberof'], group_container)
-                except errors.NotFound:
-                    request.user.groups = []
-                else:
-                    groups = []
-                    for entry in entries:
-                        memberof_dns = entry.get('memberof', [])
-                        for memberof_dn in memberof_dns:
-                            if memberof_dn.endswith(group_container):
-                                groups.append(memberof_dn[0][0].value)
-                    request.user.groups = sorted(set(groups))
-            else:
-                # try searching for a local user
-                try:
-                    request.user.name = options['user']
-                    search_result = self.api.Command.user_show(request.user.name)['result']
-                    groups = search_result['memberof_group']
-                    if 'memberofindirect_group' in search_result:
-                        groups += search_result['memberofindirect_group']
-                    request.user.groups = sorted(set(groups))
-                except Exception:
-                    pass
-
-        if options['service'] != u'all':
-            try:
-                request.service.name = options['service']
-                service_result = self.api.Command.hbacsvc_show(request.service.name)['result']
-                if 'memberof_hbacsvcgroup' in service_result:
-                    request.service.groups = service_result['memberof_hbacsvcgroup']
-            except Exception:
-                pass
-
-        if options['targethost'] != u'all':
-            try:
-                request.targethost.name = self.canonicalize(options['targethost'])
-                tgthost_result = self.api.Command.host_show(request.targethost.name)['result']
-                groups = tgthost_result['memberof_hostgroup']
-                if 'memberofindirect_hostgroup' in tgthost_result:
-                    groups += tgthost_result['memberofindirect_hostgroup']
-                request.targethost.groups = sorted(set(groups))
-            except Exception:
-                pass
+        for element, value in ((request.user, user),
+                               (request.targethost, targethost),
+                               (request.service, service)):
+            if value is not None:
+                element.name, element.groups = value
 
         matched_rules = []
         notmatched_rules = []
         error_rules = []
-        warning_rules = []
 
-        if not options['nodetail']:
+        if not nodetail:
             # Validate runs rules one-by-one and reports failed ones
             for ipa_rule in rules:
                 try:
@@ -504,6 +637,38 @@ class hbactest(Command):
             res = request.evaluate(rules)
             access_granted = (res == pyhbac.HBAC_EVAL_ALLOW)
 
+        return access_granted, matched_rules, notmatched_rules, error_rules
+
+    def execute(self, *args, **options):
+        # First receive all needed information:
+        # 1. HBAC rules (whether enabled or disabled)
+        # 2. Required options are (user, target host, service)
+        # 3. Options: rules to test (--rules, --enabled, --disabled), request for detail output
+        result = {
+            'warning':None, 'matched':None, 'notmatched':None, 'error':None
+        }
+
+        rules, testrules, messages = self._get_rules(options)
+        for message in messages:
+            result.setdefault('messages', []).append(message)
+
+        # Check if there are unresolved rules left
+        if len(testrules) > 0:
+            # Error, unresolved rules are left in --rules
+            return {'summary' : unicode(_(u'Unresolved rules in --rules')),
+                    'error': testrules, 'matched': None, 'notmatched': None,
+                    'warning' : None, 'value' : False}
+
+        # Rules are converted to pyhbac format, build request and then test it
+        access_granted, matched_rules, notmatched_rules, error_rules = \
+            self._evaluate(
+                rules,
+                self._get_user(options['user']),
+                self._get_targethost(options['targethost']),
+                self._get_service(options['service']),
+                options['nodetail'])
+        warning_rules = []
+
         result['summary'] = _('Access granted: %s') % (access_granted)
 
 
@@ -518,3 +683,76 @@ class hbactest(Command):
 
         result['value'] = access_granted
         return result
+
+
+@register()
+class hbactest_many(hbactest):
+    __doc__ = _('Simulate use of Host-based access controls for many '
+                'users, hosts and services at once')
+
+    has_output = (
+        output.summary,
+        output.Output('result', (list, tuple), _('Simulation results')),
+        output.Output('count', int, _('Number of simulations')),
+    )
+
+    takes_options = (
+        Str('user+',
+            cli_name='user',
+            label=_('User name'),
+        ),
+        Str('targethost+',
+            cli_name='host',
+            label=_('Target host'),
+        ),
+        Str('service+',
+            cli_name='service',
+            label=_('Service'),
+        ),
+    ) + tuple(
+        option for option in hbactest.takes_options
+        if option.name not in ('user', 'sourcehost', 'targethost', 'service')
+    )
+
+    def execute(self, *args, **options):
+        rules, testrules, messages = self._get_rules(options)
+        if testrules:
+            raise errors.NotFound(
+                reason=_('Unresolved rules in --rules: %(rules)s') % dict(
+                    rules=', '.join(testrules)))
+
+        # every user, host and service is looked up only once
+        users = [(name, self._get_user(name)) for name in options['user']]
+        targethosts = [(name, self._get_targethost(name))
+                       for name in options['targethost']]
+        services = [(name, self._get_service(name))
+                    for name in options['service']]
+
+        results = []
+        for user, user_info in users:
+            for targethost, targethost_info in targethosts:
+                for service, service_info in services:
+                    access_granted, matched, notmatched, error = \
+                        self._evaluate(rules, user_info, targethost_info,
+                                       service_info, options['nodetail'])
+                    results.append(dict(
+                        user=user,
+                        targethost=targethost,
+                        service=service,
+                        value=access_granted,
+                        matched=matched or None,
+                        notmatched=notmatched or None,
+                        error=error or None,
+                    ))
+
+        granted = sum(1 for r in results if r['value'])
+        result = dict(
+            summary=_('Access granted in %(granted)d of %(count)d '
+                      'simulations') % dict(granted=granted,
+                                            count=len(results)),
+            result=results,
+            count=len(results),
+        )
+        if messages:
+            result['messages'] = messages
+        return result
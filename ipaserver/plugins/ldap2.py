@@ -29,9 +29,13 @@ Backend plugin for LDAP.
 
 from __future__ import absolute_import
 
+import collections
 import logging
 import os
+import threading
+import time
 
+import gssapi
 import ldap as _ldap
 
 from ipalib import krb_utils
@@ -40,7 +44,7 @@ from ipapython.dn import DN
 from ipapython.ipaldap import (LDAPCache, AUTOBIND_AUTO, AUTOBIND_ENABLED,
                                AUTOBIND_DISABLED)
 
-from ipalib import Registry, errors, _
+from ipalib import Registry, errors, profiler, _
 from ipalib.crud import CrudBackend
 from ipalib.request import context
 
@@ -51,6 +55,224 @@ register = Registry()
 _missing = object()
 
 
+class _PooledConnection:
+    __slots__ = ('conn', 'principal', 'expires', 'last_used')
+
+    def __init__(self, conn, principal, expires):
+        self.conn = conn
+        self.principal = principal
+        self.expires = expires
+        self.last_used = time.monotonic()
+
+
+class LDAPConnectionPool:
+    """
+    Per-process pool of LDAP connections bound as individual principals.
+
+    A connection is checked out for the duration of one request and handed
+    back to the pool instead of being unbound when the request ends. An idle
+    connection is only ever reused by a request authenticated as the same
+    principal, so the directory server keeps enforcing the caller's ACIs.
+
+    Idle connections are dropped once they exceed ``idle_timeout`` seconds
+    or outlive the Kerberos ticket they were bound with. Connections idle
+    for longer than ``health_check_interval`` seconds are probed with an
+    LDAP "Who am I?" extended operation before being reused.
+    """
+
+    def __init__(self, size, idle_timeout, health_check_interval):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self._lock = threading.Lock()
+        # idle connections, least recently used first
+        self._idle = []
+        # connections handed out to requests, keyed by id(conn)
+        self._busy = {}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._idle) + len(self._busy)
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.unbind_s()
+        except _ldap.LDAPError:
+            pass
+
+    def _is_expired(self, pooled, now):
+        return (
+            pooled.expires <= now
+            or now - pooled.last_used > self.idle_timeout
+        )
+
+    def _is_healthy(self, pooled, now):
+        if now - pooled.last_used <= self.health_check_interval:
+            return True
+        try:
+            pooled.conn.whoami_s()
+        except _ldap.LDAPError as e:
+            logger.debug("Dropping stale pooled LDAP connection for %s: %s",
+                         pooled.principal, e)
+            return False
+        return True
+
+    def checkout(self, principal):
+        """
+        Return an idle connection bound as ``principal`` or None.
+        """
+        while True:
+            now = time.monotonic()
+            stale = []
+            pooled = None
+            with self._lock:
+                for candidate in list(self._idle):
+                    if self._is_expired(candidate, now):
+                        self._idle.remove(candidate)
+                        stale.append(candidate)
+                for candidate in reversed(self._idle):
+                    if candidate.principal == principal:
+                        self._idle.remove(candidate)
+                        break
+                else:
+                    candidate = None
+                pooled = candidate
+            for candidate in stale:
+                self._close(candidate.conn)
+
+            if pooled is None:
+                return None
+
+            if not self._is_healthy(pooled, now):
+                self._close(pooled.conn)
+                continue
+
+            pooled.last_used = now
+            with self._lock:
+                self._busy[id(pooled.conn)] = pooled
+            return pooled.conn
+
+    def register(self, conn, principal, lifetime):
+        """
+        Track a freshly bound connection so that it is pooled on release.
+
+        :param lifetime: remaining lifetime of the bind credentials
+                         in seconds
+        """
+        pooled = _PooledConnection(
+            conn, principal, time.monotonic() + lifetime)
+        with self._lock:
+            self._busy[id(conn)] = pooled
+
+    def release(self, conn):
+        """
+        Return a connection obtained from `checkout` or added by `register`.
+
+        Returns False if the connection is not managed by this pool and the
+        caller is responsible for unbinding it.
+        """
+        evicted = []
+        with self._lock:
+            pooled = self._busy.pop(id(conn), None)
+            if pooled is None:
+                return False
+            now = time.monotonic()
+            pooled.last_used = now
+            if self._is_expired(pooled, now):
+                evicted.append(pooled)
+            else:
+                self._idle.append(pooled)
+                while len(self._idle) > self.size:
+                    evicted.append(self._idle.pop(0))
+        for pooled in evicted:
+            self._close(pooled.conn)
+        return True
+
+    def discard(self, conn):
+        """
+        Stop tracking a connection and unbind it.
+        """
+        with self._lock:
+            self._busy.pop(id(conn), None)
+        self._close(conn)
+
+    def clear(self):
+        """
+        Unbind all idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._close(pooled.conn)
+
+
+class SharedLDAPCache:
+    """
+    Per-process cache of LDAP search results shared by all requests.
+
+    Only searches based in one of ``subtrees`` are cached. These are meant
+    for entries which are read by almost every request but rarely change,
+    like the IPA configuration, servers and their roles, ID ranges, CAs and
+    certificate profiles. Results are cached per bound principal, because
+    ACIs may give different principals different views of an entry.
+
+    The cache is tied to the ``lastusn`` value of the root DSE. Every write
+    to the directory, local or replicated, increases it, so checking it once
+    per request with `validate` is enough to notice changes made by other
+    processes or servers.
+    """
+
+    def __init__(self, subtrees, size):
+        self.subtrees = tuple(subtrees)
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._usn = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def covers(self, dn):
+        return any(dn.endswith(subtree) for subtree in self.subtrees)
+
+    def validate(self, usn):
+        """
+        Drop all cached results if the directory changed since the last
+        call.
+        """
+        with self._lock:
+            if usn != self._usn:
+                self._entries.clear()
+                self._usn = usn
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._usn = None
+
+
 @register()
 class ldap2(CrudBackend, LDAPCache):
     """
@@ -72,6 +294,31 @@ class ldap2(CrudBackend, LDAPCache):
         self._time_limit = float(LDAPCache.time_limit)
         self._size_limit = int(LDAPCache.size_limit)
 
+        if api.env.ldap_pool and api.env.ldap_pool_size > 0:
+            self._pool = LDAPConnectionPool(
+                size=api.env.ldap_pool_size,
+                idle_timeout=api.env.ldap_pool_idle_timeout,
+                health_check_interval=api.env.ldap_pool_health_check_interval,
+            )
+        else:
+            self._pool = None
+
+        if (api.env.ldap_shared_cache and api.env.ldap_shared_cache_size > 0
+                and not force_schema_updates):
+            basedn = api.env.basedn
+            self._shared_cache = SharedLDAPCache(
+                subtrees=(
+                    DN(('cn', 'ipaconfig'), ('cn', 'etc'), basedn),
+                    DN(api.env.container_masters, basedn),
+                    DN(api.env.container_ranges, basedn),
+                    DN(api.env.container_ca, basedn),
+                    DN(api.env.container_certprofile, basedn),
+                ),
+                size=api.env.ldap_shared_cache_size,
+            )
+        else:
+            self._shared_cache = None
+
     @property
     def ldap_uri(self):
         return self.api.env.ldap_uri
@@ -118,6 +365,8 @@ class ldap2(CrudBackend, LDAPCache):
     def close(self):
         if self.isconnected():
             self.disconnect()
+        if self._pool is not None:
+            self._pool.clear()
 
     def __str__(self):
         return self.ldap_uri
@@ -158,6 +407,30 @@ class ldap2(CrudBackend, LDAPCache):
         if size_limit is not _missing:
             object.__setattr__(self, 'size_limit', size_limit)
 
+        ldapi = self.ldap_uri.startswith('ldapi://')
+
+        # Only plain GSSAPI binds on behalf of a request principal are
+        # pooled, connections with custom controls or other bind methods
+        # are always created from scratch.
+        pooled = (
+            self._pool is not None and ccache is not None
+            and not bind_pw and serverctrls is None and clientctrls is None
+            and not (autobind != AUTOBIND_DISABLED and os.getegid() == 0
+                     and ldapi)
+        )
+        if pooled:
+            os.environ['KRB5CCNAME'] = ccache
+            try:
+                creds = krb_utils.get_credentials(ccache_name=ccache)
+                principal = str(creds.name)
+                lifetime = creds.lifetime
+            except gssapi.exceptions.GSSError as e:
+                raise errors.CCacheError(message=str(e))
+            conn = self._pool.checkout(principal)
+            if conn is not None:
+                setattr(context, 'principal', principal)
+                return conn
+
         client = LDAPCache(
             self.ldap_uri,
             force_schema_updates=self._force_schema_updates,
@@ -176,8 +449,6 @@ class ldap2(CrudBackend, LDAPCache):
                 if maxssf < minssf:
                     conn.set_option(_ldap.OPT_X_SASL_SSF_MAX, minssf)
 
-        ldapi = self.ldap_uri.startswith('ldapi://')
-
         if bind_pw:
             client.simple_bind(bind_dn, bind_pw,
                                server_controls=serverctrls,
@@ -200,18 +471,23 @@ class ldap2(CrudBackend, LDAPCache):
             else:
                 os.environ['KRB5CCNAME'] = ccache
 
-            principal = krb_utils.get_principal(ccache_name=ccache)
+            if not pooled:
+                principal = krb_utils.get_principal(ccache_name=ccache)
 
             client.gssapi_bind(server_controls=serverctrls,
                                client_controls=clientctrls)
             setattr(context, 'principal', principal)
 
+            if pooled:
+                self._pool.register(conn, principal, lifetime)
+
         return conn
 
     def destroy_connection(self):
         """Disconnect from LDAP server."""
         try:
-            if self.conn is not None:
+            if self.conn is not None and (
+                    self._pool is None or not self._pool.release(self.conn)):
                 self.unbind()
         except errors.PublicError:
             # ignore when trying to unbind multiple times
@@ -220,6 +496,121 @@ class ldap2(CrudBackend, LDAPCache):
         object.__delattr__(self, 'time_limit')
         object.__delattr__(self, 'size_limit')
         self.clear_cache()
+        if self._shared_cache is not None:
+            self.emit("SHARED: Hits %d Misses %d Size %d",
+                      self._shared_cache.hits, self._shared_cache.misses,
+                      len(self._shared_cache))
+
+    def _get_shared_cache(self):
+        """
+        Return the shared cache if it can be used for the current request.
+
+        The first call in a request checks that the cached results are still
+        up to date.
+        """
+        cache = self._shared_cache
+        if cache is None or getattr(context, 'principal', None) is None:
+            return None
+
+        valid = getattr(context, 'ldap_shared_cache_valid', None)
+        if valid is None:
+            try:
+                result = self.conn.search_s(
+                    '', _ldap.SCOPE_BASE, attrlist=['lastusn'])
+                attrs = {k.lower(): v for k, v in result[0][1].items()}
+                usn = attrs['lastusn'][0]
+            except (_ldap.LDAPError, IndexError, KeyError) as e:
+                logger.debug("Not using shared LDAP cache: %s", e)
+                valid = False
+            else:
+                cache.validate(usn)
+                valid = True
+            context.ldap_shared_cache_valid = valid
+
+        return cache if valid else None
+
+    def _shared_cache_changed(self, dn):
+        # Writes of this request are not reflected in the USN checked at
+        # its start, so drop the cached results right away.
+        cache = self._shared_cache
+        if cache is not None and cache.covers(dn):
+            cache.clear()
+
+    def find_entries(
+            self, filter=None, attrs_list=None, base_dn=None,
+            scope=_ldap.SCOPE_SUBTREE, time_limit=None, size_limit=None,
+            paged_search=False, get_effective_rights=False):
+        cache = None
+        if (base_dn is not None and not paged_search
+                and not get_effective_rights):
+            cache = self._get_shared_cache()
+        if cache is None or not cache.covers(base_dn):
+            return super(ldap2, self).find_entries(
+                filter=filter, attrs_list=attrs_list, base_dn=base_dn,
+                scope=scope, time_limit=time_limit, size_limit=size_limit,
+                paged_search=paged_search,
+                get_effective_rights=get_effective_rights)
+
+        key = (context.principal, base_dn, scope, filter,
+               tuple(attrs_list) if attrs_list else None, size_limit)
+        cached = cache.get(key)
+        if cached is None:
+            try:
+                cached = super(ldap2, self).find_entries(
+                    filter=filter, attrs_list=attrs_list, base_dn=base_dn,
+                    scope=scope, time_limit=time_limit,
+                    size_limit=size_limit)
+            except errors.EmptyResult as e:
+                cached = e
+            else:
+                entries, truncated = cached
+                cached = (
+                    [self.copy_entry(e.dn, e) for e in entries], truncated)
+            cache.set(key, cached)
+        elif isinstance(cached, errors.EmptyResult):
+            profiler.record('ldap', 'find_entries', 0, cache_hit=True)
+        else:
+            profiler.record('ldap', 'find_entries', 0,
+                            entries=len(cached[0]), cache_hit=True)
+
+        if isinstance(cached, errors.EmptyResult):
+            raise cached
+        entries, truncated = cached
+        return [self.copy_entry(e.dn, e) for e in entries], truncated
+
+    def add_entry(self, entry):
+        self._shared_cache_changed(entry.dn)
+        super(ldap2, self).add_entry(entry)
+
+    def add_entry_async(self, entry):
+        self._shared_cache_changed(entry.dn)
+        return super(ldap2, self).add_entry_async(entry)
+
+    def update_entry(self, entry):
+        self._shared_cache_changed(entry.dn)
+        super(ldap2, self).update_entry(entry)
+
+    def update_entry_async(self, entry):
+        self._shared_cache_changed(entry.dn)
+        return super(ldap2, self).update_entry_async(entry)
+
+    def delete_entry(self, entry_or_dn):
+        if isinstance(entry_or_dn, DN):
+            self._shared_cache_changed(entry_or_dn)
+        else:
+            self._shared_cache_changed(entry_or_dn.dn)
+        super(ldap2, self).delete_entry(entry_or_dn)
+
+    def move_entry(self, dn, new_dn, del_old=True):
+        self._shared_cache_changed(dn)
+        self._shared_cache_changed(new_dn)
+        super(ldap2, self).move_entry(dn, new_dn, del_old)
+
+    def modify_s(self, dn, modlist):
+        if not isinstance(dn, DN):
+            dn = DN(dn)
+        self._shared_cache_changed(dn)
+        return super(ldap2, self).modify_s(dn, modlist)
 
     def get_ipa_config(self, attrs_list=None):
         """Returns the IPA configuration entry (dn, entry_attrs)."""
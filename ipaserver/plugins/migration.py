@@ -19,9 +19,12 @@
 
 from __future__ import absolute_import
 
+import collections
+import functools
 import logging
 import re
-from ldap import MOD_ADD
+import time
+from ldap import MOD_ADD, MOD_DELETE
 from ldap import SCOPE_BASE, SCOPE_ONELEVEL, SCOPE_SUBTREE
 
 import six
@@ -130,6 +133,16 @@ For every 100 users migrated an info-level message will be displayed to
 give the current progress and duration to make it possible to track
 the progress of migration.
 
+BULK MODE
+
+For large directories use the --bulk option. Entries are read from the
+remote server page by page, the DNs, primary keys and GID numbers of all
+remote users and groups as well as the Kerberos principals of the IPA
+users are looked up once at the beginning, and entries are added to IPA
+without waiting for each add to complete. Users are added to the default
+user group in a single operation at the end of the migration. Progress
+and throughput are logged for every 1000 entries.
+
 If the log level is debug, either by setting debug = True in
 /etc/ipa/default.conf or /etc/ipa/server.conf, then an entry will be printed
 for each user added plus a summary when the default user group is
@@ -154,8 +167,122 @@ _supported_schemas = (u'RFC2307bis', u'RFC2307')
 _supported_scopes = {u'base': SCOPE_BASE, u'onelevel': SCOPE_ONELEVEL, u'subtree': SCOPE_SUBTREE}
 _default_scope = u'onelevel'
 
+# number of outstanding asynchronous writes in bulk mode
+_bulk_window = 100
+# how often is progress logged in bulk mode
+_bulk_progress_cnt = 1000
+
+
+class _AsyncWriter:
+    """
+    Bounded window of asynchronous LDAP writes used in bulk mode.
 
-def _create_kerberos_principals(ldap, pkey, entry_attrs, failed):
+    Each write is given a callback which is called with None on success
+    or with the exception raised for the write once its result is
+    collected. Callbacks may issue further writes.
+    """
+
+    def __init__(self, ldap, window):
+        self.ldap = ldap
+        self.window = window
+        self._pending = collections.OrderedDict()
+        self._collecting = False
+
+    def add(self, entry, callback):
+        self._submit(self.ldap.add_entry_async(entry), callback)
+
+    def modify(self, dn, modlist, callback):
+        with self.ldap.error_handler():
+            modlist = [(a, b, self.ldap.encode(c)) for a, b, c in modlist]
+            msgid = self.ldap.conn.modify_ext(str(dn), modlist)
+        self._submit(msgid, callback)
+
+    def _submit(self, msgid, callback):
+        self._pending[msgid] = callback
+        if self._collecting:
+            # called from a callback, the window is enforced by the caller
+            return
+        self._collecting = True
+        try:
+            while len(self._pending) > self.window:
+                self._collect()
+        finally:
+            self._collecting = False
+
+    def _collect(self):
+        msgid, callback = self._pending.popitem(last=False)
+        try:
+            self.ldap.wait_for_result(msgid)
+        except errors.ExecutionError as e:
+            callback(e)
+        else:
+            callback(None)
+
+    def flush(self):
+        """Wait for all outstanding writes"""
+        self._collecting = True
+        try:
+            while self._pending:
+                self._collect()
+        finally:
+            self._collecting = False
+
+
+def _prefetch_remote_entries(ds_ldap, search_bases):
+    """
+    Index the remote users and groups for bulk mode.
+
+    Returns a dict mapping DNs to the primary key attributes of remote
+    entries and the set of GID numbers of remote POSIX groups, or
+    (None, None) if the remote server did not return all entries.
+    """
+    user_pkey = api.Object.user.primary_key.name
+    group_pkey = api.Object.group.primary_key.name
+    entries = {}
+    gids = set()
+    for search_base in set(search_bases.values()):
+        try:
+            for entry in ds_ldap.iter_entries(
+                    search_base, SCOPE_SUBTREE, '(objectclass=*)',
+                    [user_pkey, group_pkey, 'gidnumber', 'objectclass'],
+                    paged_search=True, time_limit=0, size_limit=-1):
+                entries[entry.dn] = {
+                    attr: entry[attr] for attr in (user_pkey, group_pkey)
+                    if attr in entry
+                }
+                if ('gidnumber' in entry and 'posixgroup' in
+                        (oc.lower() for oc in entry.get('objectclass', []))):
+                    gids.update(entry['gidnumber'])
+        except errors.NotFound:
+            pass
+        except errors.LimitsExceeded:
+            # a partial index would turn valid references into dangling
+            # ones, look every entry up on the remote server instead
+            logger.warning('Search limit exceeded indexing remote entries '
+                           'in %s, not using the index', search_base)
+            return None, None
+    logger.debug('Indexed %d remote entries', len(entries))
+    return entries, gids
+
+
+def _prefetch_principals(ldap):
+    """Return the set of Kerberos principal names of IPA users"""
+    principals = set()
+    try:
+        for entry in ldap.iter_entries(
+                DN(api.env.container_user, api.env.basedn), SCOPE_SUBTREE,
+                '(&(objectclass=krbprincipalaux)(krbprincipalname=*))',
+                ['krbprincipalname'], paged_search=True, time_limit=-1,
+                size_limit=-1):
+            principals.update(
+                unicode(p) for p in entry.get('krbprincipalname', []))
+    except errors.NotFound:
+        pass
+    return principals
+
+
+def _create_kerberos_principals(ldap, pkey, entry_attrs, failed,
+                                principals=None):
     """
     Create 'krbprincipalname' and 'krbcanonicalname' attributes for incoming
     user entry or skip it if there already is a user with such principal name.
@@ -165,8 +292,20 @@ def _create_kerberos_principals(ldap, pkey, entry_attrs, failed):
     are set to default value generated from uid and realm.
 
     Note: the migration does not currently preserve principal aliases
+
+    In bulk mode, principals is the set of principal names already present
+    in IPA and is used instead of a search.
     """
     principal = Principal((pkey,), realm=api.env.realm)
+    if principals is not None:
+        if unicode(principal) in principals:
+            failed[pkey] = unicode(_krb_err_msg % unicode(principal))
+        else:
+            principals.add(unicode(principal))
+            entry_attrs['krbprincipalname'] = principal
+            entry_attrs['krbcanonicalname'] = principal
+        return
+
     try:
         ldap.find_entry_by_attr(
             'krbprincipalname', principal, 'krbprincipalaux', [''],
@@ -199,6 +338,13 @@ def _pre_migrate_user(ldap, pkey, dn, entry_attrs, failed, config, ctx, **kwargs
             logger.warning('GID number %s of migrated user %s does not point '
                            'to a known group.',
                            entry_attrs['gidnumber'][0], pkey)
+        elif 'remote_gids' in ctx:
+            # bulk mode, all remote groups are known already
+            if entry_attrs['gidnumber'][0] not in ctx['remote_gids']:
+                logger.warning('GID number %s of migrated user %s does not '
+                               'point to a known group.',
+                               entry_attrs['gidnumber'][0], pkey)
+                invalid_gids.add(entry_attrs['gidnumber'][0])
         elif entry_attrs['gidnumber'][0] not in valid_gids:
             try:
                 remote_entry = ds_ldap.find_entry_by_attr(
@@ -250,7 +396,8 @@ def _pre_migrate_user(ldap, pkey, dn, entry_attrs, failed, config, ctx, **kwargs
             except ValueError:  # object class not present
                 pass
 
-    _create_kerberos_principals(ldap, pkey, entry_attrs, failed)
+    _create_kerberos_principals(ldap, pkey, entry_attrs, failed,
+                                ctx.get('ipa_principals'))
 
     # Fix any attributes with DN syntax that point to entries in the old
     # tree
@@ -274,7 +421,12 @@ def _pre_migrate_user(ldap, pkey, dn, entry_attrs, failed, config, ctx, **kwargs
                                        pkey, value, type(value), attr, e)
                         continue
                 try:
-                    remote_entry = ds_ldap.get_entry(value, [api.Object.user.primary_key.name, api.Object.group.primary_key.name])
+                    if 'remote_entries' in ctx:
+                        remote_entry = ctx['remote_entries'].get(value)
+                        if remote_entry is None:
+                            raise errors.NotFound(reason=unicode(value))
+                    else:
+                        remote_entry = ds_ldap.get_entry(value, [api.Object.user.primary_key.name, api.Object.group.primary_key.name])
                 except errors.NotFound:
                     logger.warning('%s: attribute %s refers to non-existent '
                                    'entry %s', pkey, attr, value)
@@ -307,11 +459,22 @@ def _pre_migrate_user(ldap, pkey, dn, entry_attrs, failed, config, ctx, **kwargs
 def _post_migrate_user(ldap, pkey, dn, entry_attrs, failed, config, ctx):
     assert isinstance(dn, DN)
 
-    if 'def_group_dn' in ctx:
+    writer = ctx.get('writer')
+
+    # in bulk mode the default group is updated once at the end
+    if 'def_group_dn' in ctx and writer is None:
         _update_default_group(ldap, ctx, False)
 
     if 'description' in entry_attrs and NO_UPG_MAGIC in entry_attrs['description']:
         entry_attrs['description'].remove(NO_UPG_MAGIC)
+        if writer is not None:
+            def removed(exc):
+                if exc is not None:
+                    logger.debug('%s: removing %s from description failed: '
+                                 '%s', pkey, NO_UPG_MAGIC, exc)
+            writer.modify(dn, [(MOD_DELETE, 'description', [NO_UPG_MAGIC])],
+                          removed)
+            return
         try:
             update_attrs = ldap.get_entry(dn, ['description'])
             update_attrs['description'] = entry_attrs['description']
@@ -624,6 +787,13 @@ class migrate_ds(Command):
             label=_('Base DN'),
             doc=_('Base DN on remote LDAP server'),
         ),
+        Flag('bulk?',
+            label=_('Bulk mode'),
+            doc=_('Page through the remote entries, resolve references from '
+                  'an index built in advance and add entries asynchronously. '
+                  'Recommended for large directories'),
+            default=False,
+        ),
         Flag('compat?',
             cli_name='with_compat',
             label=_('Ignore compat plugin'),
@@ -744,6 +914,12 @@ migration process might be incomplete\n''')
 
         scope = _supported_scopes[options.get('scope')]
 
+        bulk = options.get('bulk', False)
+        if bulk:
+            remote_entries, remote_gids = _prefetch_remote_entries(
+                ds_ldap, search_bases)
+            ipa_principals = _prefetch_principals(ldap)
+
         for ldap_obj_name in self.migrate_order:
             ldap_obj = self.api.Object[ldap_obj_name]
 
@@ -757,30 +933,37 @@ migration process might be incomplete\n''')
             migrated[ldap_obj_name] = []
             failed[ldap_obj_name] = {}
 
-            try:
-                entries, truncated = ds_ldap.find_entries(
-                    search_filter, ['*'], search_bases[ldap_obj_name],
-                    scope,
-                    time_limit=0, size_limit=-1
-                )
-            except errors.NotFound:
-                if not options.get('continue',False):
-                    raise errors.NotFound(
-                        reason=_('%(container)s LDAP search did not return any result '
-                                 '(search base: %(search_base)s, '
-                                 'objectclass: %(objectclass)s)')
-                                 % {'container': ldap_obj_name,
-                                    'search_base': search_bases[ldap_obj_name],
-                                    'objectclass': ', '.join(oc_list)}
+            not_found = errors.NotFound(
+                reason=_('%(container)s LDAP search did not return any result '
+                         '(search base: %(search_base)s, '
+                         'objectclass: %(objectclass)s)')
+                         % {'container': ldap_obj_name,
+                            'search_base': search_bases[ldap_obj_name],
+                            'objectclass': ', '.join(oc_list)}
+            )
+            if bulk:
+                entries = self._iter_remote_entries(
+                    ds_ldap, ldap_obj, search_filter,
+                    search_bases[ldap_obj_name], scope,
+                    None if options.get('continue', False) else not_found)
+            else:
+                try:
+                    entries, truncated = ds_ldap.find_entries(
+                        search_filter, ['*'], search_bases[ldap_obj_name],
+                        scope,
+                        time_limit=0, size_limit=-1
+                    )
+                except errors.NotFound:
+                    if not options.get('continue',False):
+                        raise not_found
+                    else:
+                        truncated = False
+                        entries = []
+                if truncated:
+                    logger.error(
+                        '%s: %s',
+                        ldap_obj.name, self.truncated_err_msg
                     )
-                else:
-                    truncated = False
-                    entries = []
-            if truncated:
-                logger.error(
-                    '%s: %s',
-                    ldap_obj.name, self.truncated_err_msg
-                )
 
             blocklists = {}
             for blocklist in ('oc_blocklist', 'attr_blocklist'):
@@ -806,6 +989,17 @@ migration process might be incomplete\n''')
 
             context['has_upg'] = ldap.has_upg()
 
+            writer = None
+            if bulk:
+                writer = _AsyncWriter(ldap, _bulk_window)
+                context['writer'] = writer
+                if remote_entries is not None:
+                    context['remote_entries'] = remote_entries
+                    context['remote_gids'] = remote_gids
+                context['ipa_principals'] = ipa_principals
+                bulk_start = time.monotonic()
+                queued = 0
+
             valid_gids = set()
             invalid_gids = set()
             migrate_cnt = 0
@@ -854,28 +1048,35 @@ migration process might be incomplete\n''')
                         failed[ldap_obj_name][pkey] = unicode(e.reason)
                         continue
 
+                if writer is not None:
+                    try:
+                        writer.add(entry_attrs, functools.partial(
+                            self._entry_added, ldap, ldap_obj_name, pkey,
+                            entry_attrs, migrated, failed, config, context,
+                            options))
+                    except errors.ExecutionError as e:
+                        self._entry_added(
+                            ldap, ldap_obj_name, pkey, entry_attrs, migrated,
+                            failed, config, context, options, e)
+                    queued += 1
+                    if queued % _bulk_progress_cnt == 0:
+                        self._log_bulk_progress(
+                            ldap_obj_name, len(migrated[ldap_obj_name]),
+                            queued, bulk_start)
+                    continue
+
                 try:
                     ldap.add_entry(entry_attrs)
                 except errors.ExecutionError as e:
-                    callback = self.migrate_objects[ldap_obj_name]['exc_callback']
-                    if callable(callback):
-                        try:
-                            callback(
-                                ldap, entry_attrs.dn, entry_attrs, e, options)
-                        except errors.ExecutionError as e2:
-                            failed[ldap_obj_name][pkey] = unicode(e2)
-                            continue
-                    else:
-                        failed[ldap_obj_name][pkey] = unicode(e)
+                    if not self._entry_added(
+                            ldap, ldap_obj_name, pkey, entry_attrs, migrated,
+                            failed, config, context, options, e):
                         continue
+                else:
+                    self._entry_added(
+                        ldap, ldap_obj_name, pkey, entry_attrs, migrated,
+                        failed, config, context, options, None)
 
-                migrated[ldap_obj_name].append(pkey)
-
-                callback = self.migrate_objects[ldap_obj_name]['post_callback']
-                if callable(callback):
-                    callback(
-                        ldap, pkey, entry_attrs.dn, entry_attrs,
-                        failed[ldap_obj_name], config, context)
                 e = datetime.datetime.now()
                 d = e - s
                 total_dur = e - migration_start
@@ -886,11 +1087,76 @@ migration process might be incomplete\n''')
                 logger.debug("%d %ss migrated, duration: %s (total %s)",
                              migrate_cnt, ldap_obj_name, d, total_dur)
 
+            if writer is not None:
+                writer.flush()
+                self._log_bulk_progress(
+                    ldap_obj_name, len(migrated[ldap_obj_name]), queued,
+                    bulk_start)
+
         if 'def_group_dn' in context:
             _update_default_group(ldap, context, True)
 
         return (migrated, failed)
 
+    def _iter_remote_entries(self, ds_ldap, ldap_obj, search_filter,
+                             search_base, scope, not_found):
+        """
+        Read the remote entries to migrate page by page.
+
+        not_found is raised if there are no entries to migrate, unless it
+        is None.
+        """
+        found = False
+        try:
+            for entry in ds_ldap.iter_entries(
+                    search_base, scope, search_filter, ['*'],
+                    paged_search=True, time_limit=0, size_limit=-1):
+                found = True
+                yield entry
+        except errors.NotFound:
+            pass
+        except errors.LimitsExceeded:
+            logger.error('%s: %s', ldap_obj.name, self.truncated_err_msg)
+        if not found and not_found is not None:
+            raise not_found
+
+    def _entry_added(self, ldap, ldap_obj_name, pkey, entry_attrs, migrated,
+                     failed, config, context, options, exc):
+        """
+        Record the result of adding an entry to IPA.
+
+        exc is the exception raised by the add or None. Returns False if
+        the entry was not migrated.
+        """
+        if exc is not None:
+            callback = self.migrate_objects[ldap_obj_name]['exc_callback']
+            if callable(callback):
+                try:
+                    callback(ldap, entry_attrs.dn, entry_attrs, exc, options)
+                except errors.ExecutionError as e:
+                    failed[ldap_obj_name][pkey] = unicode(e)
+                    return False
+            else:
+                failed[ldap_obj_name][pkey] = unicode(exc)
+                return False
+
+        migrated[ldap_obj_name].append(pkey)
+
+        callback = self.migrate_objects[ldap_obj_name]['post_callback']
+        if callable(callback):
+            callback(
+                ldap, pkey, entry_attrs.dn, entry_attrs,
+                failed[ldap_obj_name], config, context)
+        return True
+
+    @staticmethod
+    def _log_bulk_progress(ldap_obj_name, migrated_cnt, queued, start):
+        elapsed = time.monotonic() - start
+        logger.info("%d %ss migrated, %d added. %.1f sec elapsed, "
+                    "%.1f %ss/sec.", migrated_cnt, ldap_obj_name, queued,
+                    elapsed, queued / elapsed if elapsed else 0.0,
+                    ldap_obj_name)
+
     def execute(self, ldapuri, bindpw, **options):
         ldap = self.api.Backend.ldap2
         self.normalize_options(options)
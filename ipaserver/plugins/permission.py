@@ -705,6 +705,47 @@ class permission(baseldap.LDAPObject):
                 msg,
             )
 
+    def _get_aci_index(self, location, acis):
+        """Get a mapping of ACI names to ACI strings of the given ACIs
+
+        The index is kept in the request context for every location, and
+        only ACIs which were not there when it was last built are parsed.
+        Looking up many permissions, as permission-find and the managed
+        permission updater do, thus parses every ACI only once.
+
+        :param location: DN of the entry holding the ACIs
+        :param acis: the ACI strings of the entry
+        """
+        indexes = getattr(context, 'permission_aci_index', None)
+        if indexes is None:
+            indexes = context.permission_aci_index = {}
+        acis = tuple(acis)
+        cached = indexes.get(location)
+        if cached is not None:
+            cached_acis, index, names = cached
+            if cached_acis == acis:
+                return index
+        else:
+            names = {}
+
+        index = {}
+        new_names = {}
+        for acistring in acis:
+            try:
+                name = names[acistring]
+            except KeyError:
+                try:
+                    name = ACI(acistring).name
+                except SyntaxError as e:
+                    logger.warning('Unparseable ACI %s: %s (at %s)',
+                                   acistring, e, location)
+                    name = None
+            new_names[acistring] = name
+            if name is not None:
+                index.setdefault(name, acistring)
+        indexes[location] = (acis, index, new_names)
+        return index
+
     def _get_aci_entry_and_string(self, permission_entry, name=None,
                                   notfound_ok=False, cached_acientry=None):
         """Get the entry and ACI corresponding to the permission entry
@@ -732,16 +773,10 @@ class permission(baseldap.LDAPObject):
             except errors.NotFound:
                 acientry = ldap.make_entry(location)
 
-        acis = acientry.get('aci', ())
-        for acistring in acis:
-            try:
-                aci = ACI(acistring)
-            except SyntaxError as e:
-                logger.warning('Unparseable ACI %s: %s (at %s)',
-                               acistring, e, location)
-                continue
-            if aci.name == wanted_aciname:
-                return acientry, acistring
+        index = self._get_aci_index(location, acientry.get('aci', ()))
+        acistring = index.get(wanted_aciname)
+        if acistring is not None:
+            return acientry, acistring
 
         if notfound_ok:
             return acientry, None
@@ -69,6 +69,19 @@ class rabase(Backend):
         """
         raise errors.NotImplementedError(name='%s.get_certificate' % self.name)
 
+    def get_certificates(self, serial_numbers):
+        """
+        Retrieve many existing certificates.
+
+        :param serial_numbers: iterable of certificate serial numbers
+        :return: dict mapping each serial number to the result of
+                 get_certificate()
+        """
+        return {
+            serial_number: self.get_certificate(serial_number)
+            for serial_number in serial_numbers
+        }
+
     def request_certificate(
             self, csr, profile_id, ca_id, request_type='pkcs10'):
         """
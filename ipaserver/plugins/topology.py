@@ -14,7 +14,7 @@ from ipalib import _, ngettext
 from ipalib import output
 from ipalib.constants import MIN_DOMAIN_LEVEL, DOMAIN_LEVEL_1
 from ipaserver.topology import (
-    create_topology_graph, get_topology_connection_errors,
+    analyze_topology, create_topology_graph, get_topology_connection_errors,
     map_masters_to_suffixes)
 from ipapython.dn import DN
 
@@ -45,6 +45,11 @@ To verify that no server is disconnected in the topology of the given suffix,
 use:
   ipa topologysuffix-verify $suffix
 """) + _("""
+To find out which servers and segments are critical for the topology of the
+given suffix, i.e. their removal would disconnect it, and how many hops a
+change needs at most to reach all servers, use:
+  ipa topologysuffix-analyze $suffix
+""") + _("""
 
 Examples:
   Find all IPA servers:
@@ -76,6 +81,9 @@ Examples:
 """) + _("""
   Verify topology of 'ca' suffix:
     ipa topologysuffix-verify ca
+""") + _("""
+  Find critical servers and segments in topology of 'domain' suffix:
+    ipa topologysuffix-analyze domain
 """)
 
 register = Registry()
@@ -562,3 +570,48 @@ Checks done:
                 'max_agmts': self.api.env.recommended_max_agmts
             },
         )
+
+
+@register()
+class topologysuffix_analyze(LDAPQuery):
+    __doc__ = _('''
+Analyze replication topology for suffix.
+
+Reports:
+  1. servers and segments whose removal disconnects the topology, together
+     with the servers which would stop replicating with each other
+  2. the longest replication path, in hops, between two servers
+''')
+
+    def execute(self, *keys, **options):
+
+        validate_domain_level(self.api)
+
+        masters = self.api.Command.server_find(
+            '', sizelimit=0, no_members=False)['result']
+        masters = map_masters_to_suffixes(masters).get(keys[0], [])
+        segments = self.api.Command.topologysegment_find(
+            keys[0], sizelimit=0)['result']
+        graph = create_topology_graph(masters, segments)
+
+        analysis = analyze_topology(graph, segments)
+        max_hops, supplier, consumer = analysis['max_hops']
+
+        return dict(
+            result={
+                'in_order': not analysis['connect_errors'],
+                'connect_errors': analysis['connect_errors'],
+                'max_hops': max_hops,
+                'max_hops_path': [m for m in (supplier, consumer) if m],
+                'critical_masters': [
+                    (m, errors)
+                    for m, errors in analysis['master_removal_errors']
+                    if errors
+                ],
+                'critical_segments': [
+                    (s, errors)
+                    for s, errors in analysis['segment_removal_errors']
+                    if errors
+                ],
+            },
+        )
@@ -21,14 +21,14 @@ import six
 
 from ipalib.frontend import Command, Object
 from ipalib import api, errors
-from ipalib import Bytes, Flag, Str, StrEnum
+from ipalib import Bytes, Flag, Int, Str, StrEnum
 from ipalib import output
 from ipalib.constants import (
     VAULT_WRAPPING_SUPPORTED_ALGOS, VAULT_WRAPPING_DEFAULT_ALGO,
     VAULT_WRAPPING_3DES, VAULT_WRAPPING_AES128_CBC,
 )
 from ipalib.crud import PKQuery, Retrieve
-from ipalib.parameters import Principal
+from ipalib.parameters import Dict, Principal
 from ipalib.plugable import Registry
 from .baseldap import LDAPObject, LDAPCreate, LDAPDelete,\
     LDAPSearch, LDAPUpdate, LDAPRetrieve, LDAPAddMember, LDAPRemoveMember,\
@@ -41,7 +41,6 @@ from ipapython.dn import DN
 from ipaserver.masters import is_service_enabled
 
 if api.env.in_server:
-    import pki.account
     import pki.key
     from pki.crypto import DES_EDE3_CBC_OID
     from pki.crypto import AES_128_CBC_OID
@@ -224,6 +223,20 @@ vault_options = (
     ),
 )
 
+vault_chunk_options = (
+    Str(
+        'chunk_set?',
+        pattern='^[0-9a-f]{32}$',
+        pattern_errmsg='must be 32 lowercase hexadecimal digits',
+        doc=_('Identifier of a set of vault data chunks'),
+    ),
+    Int(
+        'chunk?',
+        minvalue=0,
+        doc=_('Index of a vault data chunk in the set'),
+    ),
+)
+
 
 class VaultModMember(LDAPModMember):
     def get_options(self):
@@ -748,10 +761,17 @@ class vault(LDAPObject):
         for entry in entries:
             self.backend.add_entry(entry)
 
-    def get_key_id(self, dn):
+    def get_key_id(self, dn, chunk_set=None, chunk=None):
         """
         Generates a client key ID to archive/retrieve data in KRA.
+
+        If ``chunk_set`` and ``chunk`` are specified, the ID of the chunk
+        of vault data archived in chunks is generated.
         """
+        if (chunk_set is None) != (chunk is None):
+            raise errors.ValidationError(
+                name='chunk',
+                error=_('chunk and chunk_set must be specified together'))
 
         # TODO: create container_dn after object initialization then reuse it
         container_dn = DN(self.container_dn, self.api.env.basedn)
@@ -766,8 +786,90 @@ class vault(LDAPObject):
             name = rdn['cn']
             id = u'/' + name + id
 
+        if chunk_set is not None:
+            return 'ipa:%s;%s/%d' % (id, chunk_set, chunk)
         return 'ipa:' + id
 
+    def retrieve_key(self, kra_client, client_key_id, wrapped_session_key):
+        """
+        Retrieves vault data archived in KRA under ``client_key_id``.
+
+        Returns the KRA key whose data are encrypted with the session key.
+        """
+        # find vault record in KRA
+        response = kra_client.keys.list_keys(
+            client_key_id,
+            pki.key.KeyClient.KEY_STATUS_ACTIVE)
+
+        if not len(response.key_infos):
+            raise errors.NotFound(reason=_('No archived data.'))
+
+        key_info = response.key_infos[0]
+
+        # retrieve encrypted data from KRA
+        try:
+            return kra_client.keys.retrieve_key(
+                key_info.get_key_id(),
+                wrapped_session_key)
+        except PKIException as e:
+            raise errors.EncodingError(
+                message=_("Unable to retrieve key: %s") % e)
+
+    def deactivate_key(self, kra_client, client_key_id, status=None):
+        """
+        Deactivates vault data archived in KRA under ``client_key_id``.
+
+        Returns False if KRA holds no vault data with ``status`` under the
+        ID, any status by default.
+        """
+        response = kra_client.keys.list_keys(client_key_id, status)
+
+        for key_info in response.key_infos:
+            if key_info.status == pki.key.KeyClient.KEY_STATUS_ACTIVE:
+                kra_client.keys.modify_key_status(
+                    key_info.get_key_id(),
+                    pki.key.KeyClient.KEY_STATUS_INACTIVE)
+
+        return bool(response.key_infos)
+
+    def deactivate_chunk_set(self, kra_client, dn, chunk_set):
+        """
+        Deactivates vault data chunks archived in KRA in ``chunk_set``.
+        """
+        # chunks are archived in order, the set ends with the first chunk
+        # KRA holds no data for
+        chunk = 0
+        while self.deactivate_key(
+                kra_client, self.get_key_id(dn, chunk_set, chunk)):
+            chunk += 1
+
+    def add_chunk_set(self, dn, chunk_set):
+        """
+        Records that vault data chunks are archived in ``chunk_set``.
+        """
+        entry = self.backend.get_entry(dn, ['ipavaultchunkset'])
+        chunk_sets = entry.get('ipavaultchunkset', [])
+        if chunk_set not in chunk_sets:
+            entry['ipavaultchunkset'] = chunk_sets + [chunk_set]
+            self.backend.update_entry(entry)
+
+    def deactivate_chunks(self, kra_client, dn, keep=None):
+        """
+        Deactivates vault data chunks recorded for the vault except the
+        chunks of the ``keep`` chunk set.
+        """
+        entry = self.backend.get_entry(dn, ['ipavaultchunkset'])
+        chunk_sets = entry.get('ipavaultchunkset', [])
+
+        for chunk_set in chunk_sets:
+            if chunk_set != keep:
+                self.deactivate_chunk_set(kra_client, dn, chunk_set)
+
+        remaining = [keep] if keep in chunk_sets else []
+        if remaining != chunk_sets:
+            entry['ipavaultchunkset'] = remaining
+            self.backend.update_entry(entry)
+
     def get_container_attribute(self, entry, options):
         if options.get('raw', False):
             return
@@ -836,29 +938,27 @@ class vault_del(LDAPDelete):
             raise errors.InvocationError(
                 format=_('KRA service is not enabled'))
 
+        # the recorded chunk sets are deleted with the vault entry
+        try:
+            entry = ldap.get_entry(dn, ['ipavaultchunkset'])
+        except errors.NotFound:
+            raise self.obj.handle_not_found(*keys)
+        self.context.chunk_sets = entry.get('ipavaultchunkset', [])
+
         return dn
 
     def post_callback(self, ldap, dn, *args, **options):
         assert isinstance(dn, DN)
 
         with self.api.Backend.kra.get_client() as kra_client:
-            # pylint: disable=used-before-assignment
-            kra_account = pki.account.AccountClient(kra_client.connection)
-            # pylint: enable=used-before-assignment
-            kra_account.login()
-
-            client_key_id = self.obj.get_key_id(dn)
-
             # deactivate vault record in KRA
-            response = kra_client.keys.list_keys(
-                client_key_id, pki.key.KeyClient.KEY_STATUS_ACTIVE)
-
-            for key_info in response.key_infos:
-                kra_client.keys.modify_key_status(
-                    key_info.get_key_id(),
-                    pki.key.KeyClient.KEY_STATUS_INACTIVE)
+            self.obj.deactivate_key(
+                kra_client, self.obj.get_key_id(dn),
+                pki.key.KeyClient.KEY_STATUS_ACTIVE)
 
-            kra_account.logout()
+            # deactivate vault data chunks in KRA
+            for chunk_set in self.context.chunk_sets:
+                self.obj.deactivate_chunk_set(kra_client, dn, chunk_set)
 
         return True
 
@@ -1037,7 +1137,7 @@ class vault_archive_internal(PKQuery):
 
     NO_CLI = True
 
-    takes_options = vault_options + (
+    takes_options = vault_options + vault_chunk_options + (
         Bytes(
             'session_key',
             doc=_('Session key wrapped with transport certificate'),
@@ -1072,6 +1172,8 @@ class vault_archive_internal(PKQuery):
         wrapped_vault_data = options.pop('vault_data')
         nonce = options.pop('nonce')
         wrapped_session_key = options.pop('session_key')
+        chunk_set = options.pop('chunk_set', None)
+        chunk = options.pop('chunk', None)
 
         wrapping_algo = options.pop('wrapping_algo', None)
         algorithm_oid = self.obj._translate_algorithm(wrapping_algo)
@@ -1079,23 +1181,22 @@ class vault_archive_internal(PKQuery):
         # retrieve vault info
         vault = self.api.Command.vault_show(*args, **options)['result']
 
-        # connect to KRA
-        with self.api.Backend.kra.get_client() as kra_client:
-            kra_account = pki.account.AccountClient(kra_client.connection)
-            kra_account.login()
-
+        if chunk is None:
+            # chunk_set names the chunks the vault record refers to
             client_key_id = self.obj.get_key_id(vault['dn'])
+        else:
+            client_key_id = self.obj.get_key_id(
+                vault['dn'], chunk_set, chunk)
+            if chunk == 0:
+                self.obj.add_chunk_set(vault['dn'], chunk_set)
 
+        # connect to KRA
+        with self.api.Backend.kra.get_client() as kra_client:
             # deactivate existing vault record in KRA
-            response = kra_client.keys.list_keys(
-                client_key_id,
+            self.obj.deactivate_key(
+                kra_client, client_key_id,
                 pki.key.KeyClient.KEY_STATUS_ACTIVE)
 
-            for key_info in response.key_infos:
-                kra_client.keys.modify_key_status(
-                    key_info.get_key_id(),
-                    pki.key.KeyClient.KEY_STATUS_INACTIVE)
-
             # forward wrapped data to KRA
             try:
                 kra_client.keys.archive_encrypted_data(
@@ -1107,11 +1208,13 @@ class vault_archive_internal(PKQuery):
                     nonce_iv=nonce,
                 )
             except PKIException as e:
-                kra_account.logout()
                 raise errors.EncodingError(
                     message=_("Unable to archive key: %s") % e)
-            finally:
-                kra_account.logout()
+
+            # deactivate chunks the replaced vault record referred to
+            if chunk is None:
+                self.obj.deactivate_chunks(
+                    kra_client, vault['dn'], keep=chunk_set)
 
         response = {
             'value': args[-1],
@@ -1129,7 +1232,7 @@ class vault_retrieve_internal(PKQuery):
 
     NO_CLI = True
 
-    takes_options = vault_options + (
+    takes_options = vault_options + vault_chunk_options + (
         Bytes(
             'session_key',
             doc=_('Session key wrapped with transport certificate'),
@@ -1154,6 +1257,8 @@ class vault_retrieve_internal(PKQuery):
                 format=_('KRA service is not enabled'))
 
         wrapped_session_key = options.pop('session_key')
+        chunk_set = options.pop('chunk_set', None)
+        chunk = options.pop('chunk', None)
 
         wrapping_algo = options.pop('wrapping_algo', None)
         algorithm_oid = self.obj._translate_algorithm(wrapping_algo)
@@ -1161,38 +1266,15 @@ class vault_retrieve_internal(PKQuery):
         # retrieve vault info
         vault = self.api.Command.vault_show(*args, **options)['result']
 
+        client_key_id = self.obj.get_key_id(vault['dn'], chunk_set, chunk)
+
         # connect to KRA
         with self.api.Backend.kra.get_client() as kra_client:
-            kra_account = pki.account.AccountClient(kra_client.connection)
-            kra_account.login()
-
-            client_key_id = self.obj.get_key_id(vault['dn'])
-
-            # find vault record in KRA
-            response = kra_client.keys.list_keys(
-                client_key_id,
-                pki.key.KeyClient.KEY_STATUS_ACTIVE)
-
-            if not len(response.key_infos):
-                raise errors.NotFound(reason=_('No archived data.'))
-
-            key_info = response.key_infos[0]
-
             # XXX hack
             kra_client.keys.encrypt_alg_oid = algorithm_oid
 
-            # retrieve encrypted data from KRA
-            try:
-
-                key = kra_client.keys.retrieve_key(
-                    key_info.get_key_id(),
-                    wrapped_session_key)
-            except PKIException as e:
-                kra_account.logout()
-                raise errors.EncodingError(
-                    message=_("Unable to retrieve key: %s") % e)
-            finally:
-                kra_account.logout()
+            key = self.obj.retrieve_key(
+                kra_client, client_key_id, wrapped_session_key)
 
         response = {
             'value': args[-1],
@@ -1207,6 +1289,121 @@ class vault_retrieve_internal(PKQuery):
         return response
 
 
+@register()
+class vault_retrieve_many_internal(Command):
+    __doc__ = _('Retrieve data from multiple vaults.')
+
+    NO_CLI = True
+
+    takes_args = (
+        Dict(
+            'vaults+',
+            doc=_('Vaults to retrieve, each given by its name (cn) and the '
+                  'service, shared, username, chunk_set and chunk options '
+                  'of vault_retrieve_internal'),
+        ),
+    )
+
+    takes_options = (
+        Bytes(
+            'session_key',
+            doc=_('Session key wrapped with transport certificate'),
+        ),
+        StrEnum(
+            'wrapping_algo?',
+            doc=_('Key wrapping algorithm'),
+            values=VAULT_WRAPPING_SUPPORTED_ALGOS,
+            default=VAULT_WRAPPING_3DES,
+            autofill=True,
+        ),
+    )
+
+    has_output = (
+        output.Output('count', int, doc=_('Number of retrieved vaults')),
+        output.Output('results', (list, tuple),
+                      doc=_('Data of each vault or the error retrieving it')),
+    )
+
+    def _parse_vault(self, vault):
+        """
+        Splits a vault description to the vault name, the chunk options and
+        the vault options.
+        """
+        vault = dict(vault)
+        if 'cn' not in vault:
+            raise errors.RequirementError(name='cn')
+        name = self.api.Object.vault.params['cn'](vault.pop('cn'))
+
+        chunk_options = {}
+        for param in vault_chunk_options:
+            if param.name in vault:
+                chunk_options[param.name] = param(vault.pop(param.name))
+
+        options = {}
+        for param in vault_options:
+            if param.name in vault:
+                options[param.name] = param(vault.pop(param.name))
+
+        if vault:
+            raise errors.OptionError(
+                _('Unknown option: %(option)s'),
+                option=sorted(vault)[0])
+
+        return name, chunk_options, options
+
+    def execute(self, vaults, **options):
+        if not self.api.Command.kra_is_enabled()['result']:
+            raise errors.InvocationError(
+                format=_('KRA service is not enabled'))
+
+        vault_obj = self.api.Object.vault
+        wrapped_session_key = options['session_key']
+        algorithm_oid = vault_obj._translate_algorithm(
+            options.get('wrapping_algo'))
+
+        # all vaults are retrieved in a single KRA session
+        results = []
+        with self.api.Backend.kra.get_client() as kra_client:
+            # XXX hack
+            kra_client.keys.encrypt_alg_oid = algorithm_oid
+
+            for vault in vaults:
+                name = vault.get('cn')
+                try:
+                    name, chunk_options, show_options = self._parse_vault(
+                        vault)
+                    vault = self.api.Command.vault_show(
+                        name, **show_options)['result']
+                    client_key_id = vault_obj.get_key_id(
+                        vault['dn'], **chunk_options)
+                    key = vault_obj.retrieve_key(
+                        kra_client, client_key_id, wrapped_session_key)
+                except errors.PublicError as e:
+                    if isinstance(e, errors.EncodingError):
+                        # the KRA may have stopped accepting the session,
+                        # do not reuse it
+                        self.api.Backend.kra.discard_client(kra_client)
+                    results.append(dict(
+                        value=name,
+                        error=e.strerror,
+                        error_code=e.errno,
+                        error_name=unicode(type(e).__name__),
+                        error_kw=e.kw,
+                    ))
+                    continue
+
+                results.append(dict(
+                    value=name,
+                    result={
+                        'vault_data': key.encrypted_data,
+                        'nonce': key.nonce_data,
+                    },
+                    error=None,
+                ))
+
+        return dict(count=len(results), results=results)
+
+
 @register()
 class vault_add_owner(VaultModMember, LDAPAddMember):
     __doc__ = _('Add owners to a vault.')
@@ -25,6 +25,7 @@ Also see the `ipalib.rpc` module.
 
 from __future__ import absolute_import
 
+import itertools
 import logging
 from xml.sax.saxutils import escape
 import os
@@ -43,7 +44,7 @@ from pyasn1.type import univ, namedtype
 from pyasn1.codec.ber import encoder
 import six
 
-from ipalib import plugable, errors
+from ipalib import plugable, errors, profiler
 from ipalib.capabilities import VERSION_WITHOUT_CAPABILITIES
 from ipalib.frontend import Local
 from ipalib.install.kinit import kinit_armor, kinit_password
@@ -55,7 +56,8 @@ from ipalib.errors import (
     UserLocked)
 from ipalib.request import context, destroy_context
 from ipalib.rpc import xml_dumps, xml_loads
-from ipalib.ipajson import json_encode_binary, json_decode_binary
+from ipalib.ipajson import (json_encode_binary, json_encode_binary_iter,
+                            json_decode_binary)
 from ipapython.dn import DN
 from ipaserver.plugins.ldap2 import ldap2
 from ipalib.backend import Backend
@@ -392,6 +394,9 @@ class WSGIExecutioner(Executioner):
             return self.marshal(result, RefererError(referer=environ['HTTP_REFERER']), _id)
         if self.api.env.debug:
             time_start = time.perf_counter_ns()
+        profile = None
+        if self.api.env.profile_requests:
+            profile = profiler.start(reply='HTTP_X_IPA_PROFILE' in environ)
         try:
             if 'KRB5CCNAME' in environ:
                 setattr(context, "ccache_name", environ['KRB5CCNAME'])
@@ -471,8 +476,16 @@ class WSGIExecutioner(Executioner):
                         name,
                         type(error).__name__)
 
+        if profile is not None:
+            profile.finish(name)
+            logger.info('[%s] %s: %s: profile %s',
+                        type(self).__name__,
+                        principal,
+                        name,
+                        profile.to_json())
+
         version = options.get('version', VERSION_WITHOUT_CAPABILITIES)
-        return self.marshal(result, error, _id, version)
+        return self.marshal_iter(result, error, _id, version)
 
     def simple_unmarshal(self, environ):
         name = environ['PATH_INFO'].strip('/')
@@ -504,7 +517,9 @@ class WSGIExecutioner(Executioner):
             headers.append(('IPASESSION', logout_cookie))
 
         start_response(status, headers)
-        return [response]
+        if isinstance(response, bytes):
+            return [response]
+        return response
 
     def unmarshal(self, data):
         raise NotImplementedError('%s.unmarshal()' % type(self).__name__)
@@ -513,6 +528,14 @@ class WSGIExecutioner(Executioner):
                 version=VERSION_WITHOUT_CAPABILITIES):
         raise NotImplementedError('%s.marshal()' % type(self).__name__)
 
+    def marshal_iter(self, result, error, _id=None,
+                     version=VERSION_WITHOUT_CAPABILITIES):
+        """
+        Return the marshaled response as an iterable of bytes, suitable as
+        a WSGI response body.
+        """
+        return [self.marshal(result, error, _id, version)]
+
 
 class jsonserver(WSGIExecutioner, HTTP_Status):
     """
@@ -534,8 +557,7 @@ class jsonserver(WSGIExecutioner, HTTP_Status):
         response = super(jsonserver, self).__call__(environ, start_response)
         return response
 
-    def marshal(self, result, error, _id=None,
-                version=VERSION_WITHOUT_CAPABILITIES):
+    def _make_response(self, result, error, _id):
         if error:
             assert isinstance(error, PublicError)
             error = dict(
@@ -552,11 +574,50 @@ class jsonserver(WSGIExecutioner, HTTP_Status):
             principal=unicode(principal),
             version=unicode(VERSION),
         )
+        profile = profiler.get_profile()
+        if profile is not None and profile.reply:
+            response['profile'] = profile.as_dict()
+        return response
+
+    def marshal(self, result, error, _id=None,
+                version=VERSION_WITHOUT_CAPABILITIES):
+        response = self._make_response(result, error, _id)
         dump = json_encode_binary(
             response, version, pretty_print=self.api.env.debug
         )
         return dump.encode('utf-8')
 
+    def marshal_iter(self, result, error, _id=None,
+                     version=VERSION_WITHOUT_CAPABILITIES):
+        """
+        Stream the response in chunks instead of building the whole JSON
+        document in memory first. Pretty printed responses in debug mode
+        are still produced at once.
+        """
+        if self.api.env.debug:
+            return [self.marshal(result, error, _id, version)]
+        response = self._make_response(result, error, _id)
+        chunks = json_encode_binary_iter(response, version)
+        # Encode the first chunk before the status is sent, so that a
+        # response which cannot be encoded still fails with an HTTP error.
+        # Responses smaller than a chunk are encoded here completely.
+        first = next(chunks, None)
+        if first is None:
+            return []
+        return itertools.chain([first.encode('utf-8')],
+                               self._iter_chunks(chunks))
+
+    def _iter_chunks(self, chunks):
+        # The status has already been sent when the rest of the response
+        # is encoded, so an error can only be logged and the response cut
+        # short.
+        try:
+            for chunk in chunks:
+                yield chunk.encode('utf-8')
+        except Exception:
+            logger.exception('WSGI %s: failed to encode response', self.name)
+            raise
+
     def unmarshal(self, data):
         try:
             d = json_decode_binary(data)
@@ -49,6 +49,9 @@ if __name__ == '__main__':
             'ipaserver.install.plugins',
             'ipaserver.install.server',
         ],
+        package_data={
+            'ipaserver.plugins': ['plugin_manifest.json'],
+        },
         install_requires=[
             "cryptography",
             "dbus-python",
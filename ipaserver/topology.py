@@ -6,7 +6,7 @@
 set of functions and classes useful for management of domain level 1 topology
 """
 
-from copy import deepcopy
+from collections import Counter
 
 from ipalib import _
 from ipapython.graph import Graph
@@ -34,42 +34,144 @@ def create_topology_graph(masters, segments):
         graph.add_vertex(m['cn'][0])
 
     for s in segments:
-        direction = s['iparepltoposegmentdirection'][0]
-        left = s['iparepltoposegmentleftnode'][0]
-        right = s['iparepltoposegmentrightnode'][0]
         try:
-            if direction == u'both':
-                graph.add_edge(left, right)
-                graph.add_edge(right, left)
-            elif direction == u'left-right':
-                graph.add_edge(left, right)
-            elif direction == u'right-left':
-                graph.add_edge(right, left)
+            for tail, head in get_segment_edges(s):
+                graph.add_edge(tail, head)
         except ValueError:  # ignore segments with deleted master
             pass
 
     return graph
 
 
-def get_topology_connection_errors(graph):
+def get_topology_connection_errors(graph, removed_masters=(),
+                                   removed_edges=()):
     """
-    Traverse graph from each master and find out which masters are not
-    reachable.
+    Find out which masters are not reachable from each master.
+
+    Reachability is computed over strongly connected components of the graph
+    so a connected topology is checked in linear time. Masters in
+    `removed_masters` and edges in `removed_edges` are ignored, which allows
+    to check the topology as if they were deleted.
 
     :param graph: topology graph where vertices are masters
+    :param removed_masters: masters to leave out of the topology
+    :param removed_edges: (tail, head) edges to leave out of the topology
     :returns: list of errors, error is: (master, visited, not_visited)
     """
     connect_errors = []
-    master_cns = list(graph.vertices)
-    master_cns.sort()
+    reachable = graph.reachable_sets(removed_masters, removed_edges)
+    master_cns = sorted(reachable)
     for m in master_cns:
-        visited = graph.bfs(m)
-        not_visited = graph.vertices - visited
-        if not_visited:
-            connect_errors.append((m, list(visited), list(not_visited)))
+        visited = reachable[m]
+        if len(visited) < len(master_cns):
+            not_visited = [cn for cn in master_cns if cn not in visited]
+            connect_errors.append((m, sorted(visited), not_visited))
     return connect_errors
 
 
+def get_segment_edges(segment):
+    """
+    Get (tail, head) edges a segment contributes to the topology graph.
+    """
+    direction = segment['iparepltoposegmentdirection'][0]
+    left = segment['iparepltoposegmentleftnode'][0]
+    right = segment['iparepltoposegmentrightnode'][0]
+    edges = []
+    if direction in (u'both', u'left-right'):
+        edges.append((left, right))
+    if direction in (u'both', u'right-left'):
+        edges.append((right, left))
+    return edges
+
+
+def get_topology_max_hops(graph):
+    """
+    Find the longest replication path, counted in hops, which a change has to
+    travel between two masters using the shortest route.
+
+    :param graph: topology graph where vertices are masters
+    :returns: tuple (hops, supplier, consumer), supplier and consumer are
+        None for a topology without any agreement
+    """
+    max_hops = (0, None, None)
+    for m in sorted(graph.vertices):
+        for cn, hops in graph.distances(m).items():
+            if hops > max_hops[0]:
+                max_hops = (hops, m, cn)
+    return max_hops
+
+
+def analyze_topology(graph, segments):
+    """
+    Simulate removal of every master and every segment of the topology.
+
+    The masters and segments whose removal disconnects a connected
+    topology are exactly the articulation points and bridges of the graph,
+    found in O(V + E), and only those are re-checked. A topology which is
+    already disconnected or contains one-way segments is re-checked for
+    every master and segment.
+
+    :param graph: topology graph where vertices are masters
+    :param segments: topology segments the graph was created from
+    :returns: dict with current connection errors, the longest replication
+        path and, for each master and segment, connection errors its removal
+        would introduce
+    """
+    connect_errors = get_topology_connection_errors(graph)
+    edges = set(graph.edges)
+    symmetric = all((head, tail) in edges for tail, head in edges)
+
+    if not connect_errors and symmetric:
+        cut_vertices = graph.articulation_points()
+        bridges = set(frozenset(b) for b in graph.bridges())
+    else:
+        cut_vertices = graph.vertices
+        bridges = None
+
+    reachable = graph.reachable_sets()
+
+    def new_errors(errors):
+        # report only masters which can replicate with each other now
+        result = []
+        for m, visited, not_visited in errors:
+            not_visited = [cn for cn in not_visited if cn in reachable[m]]
+            if not_visited:
+                result.append((m, visited, not_visited))
+        return result
+
+    master_errors = []
+    for m in sorted(graph.vertices):
+        errors = []
+        if m in cut_vertices:
+            errors = new_errors(
+                get_topology_connection_errors(graph, removed_masters=[m]))
+        master_errors.append((m, errors))
+
+    # a segment does not disconnect anything as long as another segment
+    # provides the same agreements
+    segment_edges = {s['cn'][0]: get_segment_edges(s) for s in segments}
+    edge_count = Counter(
+        e for s_edges in segment_edges.values() for e in s_edges)
+
+    segment_errors = []
+    for name in sorted(segment_edges):
+        removed = [e for e in segment_edges[name]
+                   if e in edges and edge_count[e] == 1]
+        errors = []
+        if removed and (bridges is None or
+                        any(frozenset(e) in bridges for e in removed)):
+            errors = new_errors(
+                get_topology_connection_errors(graph, removed_edges=removed))
+        segment_errors.append((name, errors))
+
+    return dict(
+        connect_errors=connect_errors,
+        max_hops=get_topology_max_hops(graph),
+        master_removal_errors=master_errors,
+        segment_removal_errors=segment_errors,
+    )
+
+
 def map_masters_to_suffixes(masters):
     masters_to_suffix = {}
     managed_suffix_attr = 'iparepltopomanagedsuffix_topologysuffix'
@@ -148,19 +250,13 @@ class TopologyConnectivity:
         return errors_by_suffix
 
     def errors_after_master_removal(self, master_cn):
-        graphs_before = deepcopy(self.graphs)
-
-        for s in self.graphs:
-            try:
-                self.graphs[s].remove_vertex(master_cn)
-            except ValueError:
-                pass
-
-        errors_after_removal = self.errors
-
-        self.graphs = graphs_before
+        errors_by_suffix = {}
+        for suffix in self.graphs:
+            errors_by_suffix[suffix] = get_topology_connection_errors(
+                self.graphs[suffix], removed_masters=[master_cn]
+            )
 
-        return errors_after_removal
+        return errors_by_suffix
 
     def check_current_state(self):
         err_msg = ""
@@ -49,6 +49,7 @@ MARKERS = [
     'ds_acceptance: Acceptance test suite for 389 Directory Server',
     'skip_ipaclient_unittest: Skip in ipaclient unittest mode',
     'needs_ipaapi: Test needs IPA API',
+    'benchmark: Performance measurement, only run with --run-benchmarks',
     ('skip_if_platform(platform, reason): Skip test on platform '
      '(ID and ID_LIKE)'),
     ('skip_if_container(type, reason): Skip test on container '
@@ -118,6 +119,11 @@ def pytest_addoption(parser):
         help='Do not run tests that depends on IPA API',
         action='store_true',
     )
+    group.addoption(
+        '--run-benchmarks',
+        help='Run performance benchmarks and print their timings',
+        action='store_true',
+    )
 
 
 def pytest_cmdline_main(config):
@@ -156,6 +162,9 @@ def pytest_runtest_setup(item):
         if item.get_closest_marker('needs_ipaapi'):
             if item.config.option.skip_ipaapi:
                 pytest.skip("Skip tests that needs an IPA API")
+        if item.get_closest_marker('benchmark'):
+            if not item.config.option.run_benchmarks:
+                pytest.skip("Benchmarks only run with --run-benchmarks")
     if osinfo is not None:
         for mark in item.iter_markers(name="skip_if_platform"):
             platform = mark.kwargs.get("platform")
@@ -1649,7 +1649,7 @@ def resolve_record(nameserver, query, rtype="SOA", retry=True, timeout=100):
 
 
 def ipa_backup(host, disable_role_check=False, data_only=False,
-               raiseonerr=True):
+               raiseonerr=True, incremental=None):
     """Run backup on host and return the run_command result.
     """
     cmd = ['ipa-backup', '-v']
@@ -1657,6 +1657,8 @@ def ipa_backup(host, disable_role_check=False, data_only=False,
         cmd.append('--disable-role-check')
     if data_only:
         cmd.append('--data')
+    if incremental:
+        cmd.append('--incremental=%s' % incremental)
     result = host.run_command(cmd, raiseonerr=raiseonerr)
 
     # Test for ticket 7632: check that services are restarted
@@ -1686,10 +1688,12 @@ def ipa_epn(
     return host.run_command(cmd, raiseonerr=raiseonerr)
 
 
-def get_backup_dir(host, data_only=False, raiseonerr=True):
+def get_backup_dir(host, data_only=False, raiseonerr=True,
+                   incremental=None):
     """Wrapper around ipa_backup: returns the backup directory.
     """
-    result = ipa_backup(host, data_only=data_only, raiseonerr=raiseonerr)
+    result = ipa_backup(host, data_only=data_only, raiseonerr=raiseonerr,
+                        incremental=incremental)
 
     # Get the backup location from the command's output
     for line in result.stderr_text.splitlines():
@@ -1,10 +1,13 @@
 #
 # Copyright (C) 2021  FreeIPA Contributors see COPYING for license
 #
+import os
 import pytest
 import time
+from types import SimpleNamespace
 
 from ipaclient.remote_plugins import ServerInfo
+from ipaclient.remote_plugins.schema import Schema
 
 
 class TestServerInfo(ServerInfo):
@@ -29,6 +32,58 @@ class TestServerInfo(ServerInfo):
         """Running on test controller, this is a no-op"""
 
 
+class FakeSchema(Schema):
+    """Schema which is "fetched" from hardcoded values"""
+    def _fetch(self, client, ignore_cache=False):
+        self._dict['commands'] = {
+            u'ping/1': dict(
+                name=u'ping', version=u'1', full_name=u'ping/1',
+                doc=u'Ping a remote server.\n\nMore details.',
+                topic_topic=u'ping/1', params=[], output=[],
+            ),
+        }
+        self._dict['topics'] = {
+            u'ping/1': dict(
+                name=u'ping', version=u'1', full_name=u'ping/1',
+                doc=u'Ping the remote IPA server.',
+            ),
+        }
+        self._dict['fingerprint'] = u'deadbeef'
+        return u'deadbeef', 3600
+
+
+@pytest.fixture
+def schema_client(tmpdir):
+    return SimpleNamespace(
+        api=SimpleNamespace(env=SimpleNamespace(cache_dir=str(tmpdir))))
+
+
+@pytest.mark.tier0
+class TestSchemaCache:
+    """Test the on-disk schema cache"""
+
+    def test_read_cached(self, schema_client):
+        fetched = FakeSchema(schema_client)
+        assert fetched.fingerprint == u'deadbeef'
+
+        cached = Schema(schema_client, u'deadbeef', 3600)
+        assert list(cached['commands']) == [u'ping/1']
+        assert cached['commands'][u'ping/1'] == fetched['commands'][u'ping/1']
+        assert cached['topics'][u'ping/1'][u'doc'] == (
+            u'Ping the remote IPA server.')
+        halp = cached['commands'].get_help(u'ping/1')
+        assert halp[u'summary'] == u'Ping a remote server.'
+
+    def test_corrupted_cache(self, schema_client):
+        fetched = FakeSchema(schema_client)
+        filename = os.path.join(fetched._dir, u'deadbeef')
+        with open(filename, 'wb') as f:
+            f.write(b'garbage')
+
+        schema = FakeSchema(schema_client, u'deadbeef')
+        assert schema['commands'][u'ping/1'][u'name'] == u'ping'
+
+
 @pytest.mark.tier0
 class TestIPAServerInfo:
     """Test that ServerInfo detects changes in remote configuration"""
@@ -222,6 +222,22 @@ class TestUpdate:
         entry = entries[0]
         assert sorted(entry.get('cn')) == sorted(['Test User'])
 
+    def test_6_update_2(self):
+        """
+        Test the pipelined updater adding and removing a value (test_6_update_2)
+        """
+        updater = LDAPUpdate(pipelined=True)
+        modified = updater.update([os.path.join(self.testdir, f)
+                                   for f in ("5_update.update",
+                                             "6_update.update")])
+        assert modified
+
+        entries = self.ld.get_entries(
+            self.user_dn, self.ld.SCOPE_BASE, 'objectclass=*', ['*'])
+        assert len(entries) == 1
+        entry = entries[0]
+        assert sorted(entry.get('cn')) == sorted(['Test User'])
+
     def test_7_cleanup(self):
         """
         Reset the test data to a known initial state (test_7_cleanup)
@@ -210,6 +210,43 @@ class TestBackupAndRestore(IntegrationTest):
                                            '"%a %G:%U"', log_path])
             assert "770 dirsrv:dirsrv" in cmd.stdout_text
 
+    def test_incremental_backup_and_restore(self):
+        """full backup, change a file, incremental backup, uninstall,
+        restore the chain"""
+        with restore_checker(self.master):
+            base_path = tasks.get_backup_dir(self.master)
+
+            self.master.run_command(['ipa', 'user-add', 'incuser',
+                                     '--first', 'inc',
+                                     '--last', 'user'])
+            # krb5.conf is only in the base backup
+            krb5_conf = self.master.get_file_contents(paths.KRB5_CONF)
+            hosts = self.master.get_file_contents(paths.HOSTS)
+            self.master.put_file_contents(
+                paths.HOSTS, hosts + b'\n# incremental backup test\n')
+
+            backup_path = tasks.get_backup_dir(
+                self.master, incremental=base_path)
+            header = self.master.get_file_contents(
+                os.path.join(backup_path, 'header'), encoding='utf-8')
+            assert 'parent = %s' % os.path.basename(base_path) in header
+
+            self.master.run_command(['ipa-server-install',
+                                     '--uninstall',
+                                     '-U'])
+
+            dirman_password = self.master.config.dirman_password
+            self.master.run_command(['ipa-restore', backup_path],
+                                    stdin_text=dirman_password + '\nyes')
+
+            assert self.master.get_file_contents(paths.KRB5_CONF) == krb5_conf
+            assert b'# incremental backup test' in (
+                self.master.get_file_contents(paths.HOSTS))
+
+        # LDAP data of the incremental backup is complete
+        self.master.run_command(['ipa', 'user-show', 'incuser'])
+        self.master.run_command(['ipa', 'user-del', 'incuser'])
+
     def test_data_backup_and_restore(self):
         """backup data only then restore"""
         with restore_checker(self.master):
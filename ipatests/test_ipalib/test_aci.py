@@ -174,3 +174,20 @@ def test_aci_parsing_10():
                       '(version 3.0;acl "Allow trust agents to retrieve '
                       'keytab keys for cross realm principals";allow (read) '
                       'userattr = "ipaAllowedToPerform;read_keys#GROUPDN";)')
+
+
+@pytest.mark.parametrize('target, expected', [
+    ('(targetattr != "cn || sn")(target = "ldap:///cn=*,dc=example")',
+     ['(', 'targetattr', '!', '=', '"cn || sn"', ')',
+      '(', 'target', '=', '"ldap:///cn=*,dc=example"', ')']),
+    ("(targetfilter='(objectclass=*)')",
+     ['(', 'targetfilter', '=', "'(objectclass=*)'", ')']),
+    ('( a.b\t=\n"x" )', ['(', 'a.b', '=', '"x"', ')']),
+])
+def test_aci_tokenize(target, expected):
+    assert list(ACI._tokenize(target)) == expected
+
+
+def test_aci_tokenize_unclosed_quote():
+    with pytest.raises(ValueError):
+        list(ACI._tokenize('(targetattr = "cn)'))
@@ -21,6 +21,8 @@
 Test the `ipalib.frontend` module.
 """
 
+import timeit
+
 import pytest
 import six
 
@@ -505,6 +507,111 @@ class test_Command(ClassChecker):
         e = raises(errors.RequirementError, sub.validate, **fail)
         assert e.name == 'option1'
 
+    def get_wide_instance(self, count=100):
+        """
+        Return a finalized command with many options, like the big find
+        commands.
+        """
+        options = [
+            Str('first'),
+            Str('last'),
+            Str('login', default_from=lambda first, last: first + last),
+            Str('email', default_from=lambda login: login + u'@example.com'),
+        ]
+        for i in range(count):
+            options.append(parameters.Flag('flag%d' % i))
+            options.append(Str('opt%d' % i, required=False, maxlength=8))
+
+        class wide(self.cls):
+            takes_options = tuple(options)
+
+        api, _home = create_test_api(in_server=True)
+        api.finalize()
+        o = wide(api)
+        o.finalize()
+        return o
+
+    def test_param_plans(self):
+        """
+        Test that the precompiled parameter plans match a full scan.
+        """
+        o = self.get_wide_instance(count=10)
+        kw = dict(first=u'john', last=u'doe', opt3=u'x')
+
+        defaults = o.get_default(**kw)
+        expected = dict(
+            (p.name, p.get_default())
+            for p in o.params()
+            if p.name not in kw and p.autofill and p.default_from is None
+        )
+        expected.update(login=u'johndoe', email=u'johndoe@example.com')
+        assert defaults == expected
+        assert o.get_default_of('email', **kw) == u'johndoe@example.com'
+        # Plans are cached per set of missing parameters
+        assert o.get_default(**kw) == defaults
+        assert o.get_default(first=u'jane', last=u'roe')['email'] == (
+            u'janeroe@example.com')
+
+        params = dict(kw, **defaults)
+        o.validate(**params)
+        e = raises(errors.RequirementError, o.validate, first=u'john')
+        assert e.name == 'last'
+        e = raises(errors.ValidationError, o.validate,
+                   **dict(params, login=u'john', opt3=u'x' * 9))
+        assert e.name == 'opt3'
+
+        options = dict(first=u'john', opt5=u'y', version=API_VERSION)
+        assert o.args_options_2_params(**options) == dict(
+            first=u'john', opt5=u'y', version=API_VERSION)
+        e = raises(errors.OptionError, o.args_options_2_params,
+                   first=u'john', nope=u'x')
+        assert e.option == 'nope'
+
+    @pytest.mark.benchmark
+    def test_param_plans_overhead(self):
+        """
+        Compare the compiled parameter plans with the full scans over all
+        params that `Command.get_default` and `Command.validate` used to do.
+        """
+        o = self.get_wide_instance()
+        kw = dict(first=u'john', last=u'doe', opt3=u'x')
+
+        def full_scan():
+            missing = [p.name for p in o.params()
+                       if p.name not in kw and (p.required or p.autofill)]
+            dep = set()
+            for param in reversed(o.params_by_default):
+                if param.name in missing or param.name in dep:
+                    if param.default_from is not None:
+                        dep.update(param.default_from.keys)
+            defaults = {}
+            values = dict(kw)
+            for param in o.params_by_default():
+                if param.name in dep and param.name not in values:
+                    default = param(None, **values)
+                    if default is not None:
+                        values[param.name] = default
+                if param.name in missing:
+                    default = param.get_default(**values)
+                    if default is not None:
+                        defaults[param.name] = default
+            params = dict(kw, **defaults)
+            for param in o.params():
+                param.validate(params.get(param.name),
+                               supplied=param.name in params)
+            return defaults
+
+        def compiled():
+            defaults = o.get_default(**kw)
+            o.validate(**dict(kw, **defaults))
+            return defaults
+
+        assert compiled() == full_scan()
+        before = min(timeit.repeat(full_scan, number=100, repeat=3))
+        after = min(timeit.repeat(compiled, number=100, repeat=3))
+        print('\nper-call overhead: full scan %.1f us, compiled %.1f us' % (
+            before * 1e4, after * 1e4))
+
     def test_execute(self):
         """
         Test the `ipalib.frontend.Command.execute` method.
@@ -0,0 +1,76 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the `ipalib.ipajson` module.
+"""
+
+import datetime
+from decimal import Decimal
+
+import pytest
+
+from ipalib.ipajson import (json_encode_binary, json_encode_binary_iter,
+                            json_decode_binary)
+from ipapython.dn import DN
+from ipapython.dnsutil import DNSName
+
+pytestmark = pytest.mark.tier0
+
+VERSION = u'2.253'
+
+
+def make_response(count):
+    entries = [
+        dict(
+            dn=DN(('cn', u'host%d' % i), ('dc', 'example'), ('dc', 'test')),
+            cn=(u'host%d' % i,),
+            usercertificate=[b'\x00\x01\x02'],
+            krblastpwdchange=[datetime.datetime(2020, 1, 1, 12, 0, 0)],
+            idnsname=[DNSName(u'host%d' % i)],
+            ipatokenotpdigits=[Decimal('6')],
+        )
+        for i in range(count)
+    ]
+    return dict(
+        result=dict(result=entries, count=count, truncated=False,
+                    summary=None),
+        error=None,
+        id=0,
+        principal=u'admin@EXAMPLE.TEST',
+        version=u'4.12',
+    )
+
+
+def test_encode_iter_same_text():
+    response = make_response(100)
+    chunks = list(json_encode_binary_iter(response, VERSION, chunk_size=1024))
+    assert len(chunks) > 1
+    assert u''.join(chunks) == json_encode_binary(response, VERSION)
+
+
+def test_encode_iter_round_trip():
+    response = make_response(3)
+    decoded = json_decode_binary(
+        u''.join(json_encode_binary_iter(response, VERSION)))
+    entry = decoded['result']['result'][0]
+    assert entry['dn'] == u'cn=host0,dc=example,dc=test'
+    assert entry['usercertificate'] == (b'\x00\x01\x02',)
+    assert entry['krblastpwdchange'] == (
+        datetime.datetime(2020, 1, 1, 12, 0, 0),)
+    assert entry['idnsname'] == (DNSName(u'host0'),)
+    assert entry['ipatokenotpdigits'] == (u'6',)
+
+
+def test_encode_iter_non_string_keys():
+    val = {1: [b'x'], u'a': None}
+    assert (u''.join(json_encode_binary_iter(val, VERSION)) ==
+            json_encode_binary(val, VERSION))
+
+
+def test_encode_unknown_type():
+    with pytest.raises(TypeError):
+        json_encode_binary(dict(value=object()), VERSION)
+    with pytest.raises(TypeError):
+        list(json_encode_binary_iter(dict(value=object()), VERSION))
@@ -24,6 +24,7 @@ Test the `ipalib.plugable` module.
 # FIXME: Pylint errors
 # pylint: disable=no-member
 
+import importlib
 import os
 import sys
 import textwrap
@@ -343,3 +344,122 @@ class test_cli(ClassChecker):
             api.bootstrap_with_global_options(context='unit_test')
         except errors.OptionError as e:
             assert e.msg == 'Unable to parse option rbose'
+
+
+PLUGIN_MODULES = {
+    'cmds': """
+        from ipalib import Command, Registry
+        register = Registry()
+
+        @register()
+        class lazy_cmd(Command):
+            pass
+
+        @register()
+        class lazy_other(Command):
+            pass
+        """,
+    'cond': """
+        from ipalib import Command, Registry
+        register = Registry()
+
+        if True:
+            @register()
+            class lazy_cond(Command):
+                pass
+        """,
+    'override': """
+        from ipalib import Registry
+        from lazy_plugins_test.plugins import cmds
+        register = Registry()
+
+        @register(override=True)
+        class lazy_cmd(cmds.lazy_cmd):
+            pass
+        """,
+}
+
+
+@pytest.fixture
+def plugin_package(tmp_path, monkeypatch):
+    plugins_dir = tmp_path / 'lazy_plugins_test' / 'plugins'
+    plugins_dir.mkdir(parents=True)
+    (plugins_dir.parent / '__init__.py').write_text('')
+    (plugins_dir / '__init__.py').write_text('')
+    for name, source in PLUGIN_MODULES.items():
+        (plugins_dir / (name + '.py')).write_text(textwrap.dedent(source))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield importlib.import_module('lazy_plugins_test.plugins')
+    for name in list(sys.modules):
+        if name.startswith('lazy_plugins_test'):
+            del sys.modules[name]
+
+
+class test_plugin_manifest:
+    """
+    Test lazy plugin registration from `ipalib.plugable.PLUGIN_MANIFEST`.
+    """
+
+    def write_manifest(self, package):
+        api = create_api(mode='unit_test')
+        filename = plugable.write_plugin_manifest(package, api.bases)
+        for name in PLUGIN_MODULES:
+            sys.modules.pop('lazy_plugins_test.plugins.' + name, None)
+            if hasattr(package, name):
+                delattr(package, name)
+        return filename
+
+    def create_api(self, package):
+        api = create_api(mode='unit_test')
+        api.bootstrap(plugins_on_demand=True)
+        api.add_package(package)
+        api.finalize()
+        return api
+
+    def test_manifest(self, plugin_package):
+        api = create_api(mode='unit_test')
+        manifest = plugable.make_plugin_manifest(plugin_package, api.bases)
+        modules = {m['name']: m for m in manifest['modules']}
+        assert sorted(modules) == ['cmds', 'cond', 'override']
+        assert modules['cond']['eager'] is True
+        assert modules['cmds']['eager'] is False
+        assert modules['cmds']['plugins'] == [
+            dict(name='lazy_cmd', version='1', bases=['Command'],
+                 override=False, no_fail=False),
+            dict(name='lazy_other', version='1', bases=['Command'],
+                 override=False, no_fail=False),
+        ]
+        assert modules['override']['plugins'][0]['override'] is True
+
+    def test_lazy_import(self, plugin_package):
+        self.write_manifest(plugin_package)
+        api = self.create_api(plugin_package)
+
+        assert 'lazy_plugins_test.plugins.cond' in sys.modules
+        assert 'lazy_plugins_test.plugins.cmds' not in sys.modules
+        assert 'lazy_plugins_test.plugins.override' not in sys.modules
+        assert 'lazy_cmd' in api.Command
+        assert len(api.Command) == 3
+
+        cmd = api.Command.lazy_cmd
+        cmds = sys.modules['lazy_plugins_test.plugins.cmds']
+        override = sys.modules['lazy_plugins_test.plugins.override']
+        assert type(cmd) is override.lazy_cmd
+        assert api.get_plugin_next(override.lazy_cmd) is cmds.lazy_cmd
+        assert api.Command.get_plugin('lazy_other') is cmds.lazy_other
+        assert sorted(p.name for p in api.Command) == [
+            'lazy_cmd', 'lazy_cond', 'lazy_other']
+        assert not any(isinstance(p, plugable.LazyPlugin)
+                       for p in api.Command)
+
+    def test_stale_manifest(self, plugin_package):
+        filename = self.write_manifest(plugin_package)
+        with open(os.path.join(os.path.dirname(filename), 'cmds.py'),
+                  'a') as f:
+            f.write('# modified\n')
+        api = self.create_api(plugin_package)
+
+        assert 'lazy_plugins_test.plugins.cmds' in sys.modules
+        assert 'lazy_plugins_test.plugins.override' in sys.modules
+        assert not any(isinstance(p, plugable.LazyPlugin)
+                       for p in api.Command)
@@ -0,0 +1,76 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the `ipalib.profiler` module.
+"""
+
+import pytest
+
+from ipalib import frontend, profiler
+from ipalib.request import context, destroy_context
+
+pytestmark = pytest.mark.tier0
+
+
+@pytest.fixture(autouse=True)
+def clean_context():
+    yield
+    destroy_context()
+
+
+@profiler.profiled('ldap', count_entries=len)
+def search(count):
+    return list(range(count))
+
+
+@profiler.profiled('ldap', name='failing')
+def fail():
+    raise ValueError('failed')
+
+
+def test_inactive():
+    assert profiler.get_profile() is None
+    assert search(3) == [0, 1, 2]
+    profiler.record('ldap', 'get_entry', 0.1)
+    assert not hasattr(context, 'profile')
+
+
+def test_record():
+    profile = profiler.start(reply=True)
+    assert profiler.get_profile() is profile
+    search(3)
+    search(2)
+    with pytest.raises(ValueError):
+        fail()
+    profiler.record('ldap', 'get_entry', 0, entries=1, cache_hit=True)
+    profile.finish('user_show')
+
+    result = profile.as_dict()
+    assert result['command'] == 'user_show'
+    assert result['etime'] >= 0
+    operations = {op['name']: op for op in result['operations']}
+    assert operations['search']['count'] == 2
+    assert operations['search']['entries'] == 5
+    assert operations['search']['category'] == 'ldap'
+    assert operations['failing']['count'] == 1
+    assert operations['get_entry']['cache_hits'] == 1
+    assert '"command": "user_show"' in profile.to_json()
+
+
+def test_callbacks():
+    class user_show(frontend.Command):
+        def pre_callback(self):
+            return 'pre'
+
+    callback = list(user_show.get_callbacks('pre'))[0]
+    assert callback is user_show.pre_callback
+
+    profile = profiler.start()
+    callback = list(user_show.get_callbacks('pre'))[0]
+    assert callback(None) == 'pre'
+    operations = profile.as_dict()['operations']
+    assert [op['name'] for op in operations] == [
+        'user_show test_callbacks.<locals>.user_show.pre_callback']
+    assert operations[0]['category'] == 'callback'
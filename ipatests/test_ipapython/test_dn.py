@@ -1,11 +1,14 @@
 
 import contextlib
+import timeit
+
 import pytest
 
 from cryptography import x509
 import six
 
-from ipapython.dn import DN, RDN, AVA, str2dn, dn2str, DECODING_ERROR
+from ipapython.dn import DN, RDN, AVA, LazyDN, str2dn, dn2str, DECODING_ERROR
+from ipapython import dn as dn_module
 from ipapython import dn_ctypes
 
 
@@ -1441,3 +1444,90 @@ def test_dn2str_special():
     assert dn2str(dn) == dnstring2
     assert dn_ctypes.str2dn(dnstring) == dn
     assert dn_ctypes.dn2str(dn) == dnstring2
+
+
+class TestLazyDN:
+    def test_lazy(self):
+        dn = LazyDN('CN=Bob,cn=users,cn=accounts,dc=example,dc=com')
+        assert dn._rdns is None
+        assert isinstance(dn, DN)
+        assert dn == DN('cn=bob,cn=users,cn=accounts,dc=example,dc=com')
+        assert hash(dn) == hash(
+            DN('cn=bob,cn=users,cn=accounts,dc=example,dc=com'))
+        assert dn.endswith(DN('dc=example,dc=com'))
+        assert DN('cn=accounts') in dn
+        assert str(dn) == 'CN=Bob,cn=users,cn=accounts,dc=example,dc=com'
+        assert dn[0].value == 'Bob'
+        assert dn[1:] == DN('cn=users,cn=accounts,dc=example,dc=com')
+        assert dn + DN('dc=test') == DN(
+            'cn=bob,cn=users,cn=accounts,dc=example,dc=com,dc=test')
+
+    def test_malformed(self):
+        dn = LazyDN('cn')
+        with pytest.raises(ValueError):
+            str(dn)
+
+    def test_sequence(self):
+        dn = LazyDN(('cn', 'bob'), 'dc=example,dc=com')
+        assert dn == DN('cn=bob,dc=example,dc=com')
+
+
+def test_parse_cache():
+    value = 'cn=cached,cn=users,cn=accounts,dc=example,dc=com'
+    dn1 = DN(value)
+    dn2 = DN(value)
+    assert dn1.rdns is dn2.rdns
+    assert dn1 == dn2
+    assert DN(dn1) == dn1
+    assert dn_module._parse_dn.cache_info().maxsize == dn_module.DN_CACHE_SIZE
+    with pytest.raises(ValueError):
+        DN('cn=foo,')
+
+
+@pytest.mark.benchmark
+def test_dn_benchmark():
+    """
+    Time DN parsing and comparison on a list of 1000 member DNs.
+    """
+    base_dn = DN('cn=users,cn=accounts,dc=example,dc=com')
+    members = [
+        'uid=user%d,cn=users,cn=accounts,dc=example,dc=com' % i
+        for i in range(1000)
+    ]
+    parse = dn_module._parse_dn
+
+    def parse_cold():
+        parse.cache_clear()
+        return [DN(m) for m in members]
+
+    def parse_warm():
+        return [DN(m) for m in members]
+
+    def parse_lazy():
+        return [LazyDN(m) for m in members]
+
+    dns = parse_warm()
+    other = [DN(m.upper()) for m in members]
+
+    def compare():
+        return sum(a == b for a, b in zip(dns, other))
+
+    def hashes():
+        return len(set(dns) | set(other))
+
+    def endswith():
+        return sum(dn.endswith(base_dn) for dn in dns)
+
+    assert compare() == len(members)
+    assert hashes() == len(members)
+    assert endswith() == len(members)
+
+    print()
+    for name, func in (('DN(str) uncached', parse_cold),
+                       ('DN(str) cached', parse_warm),
+                       ('LazyDN(str)', parse_lazy),
+                       ('__eq__', compare),
+                       ('__hash__', hashes),
+                       ('endswith', endswith)):
+        elapsed = min(timeit.repeat(func, number=1, repeat=5))
+        print('%s: %.2f us per DN' % (name, elapsed * 1e6 / len(members)))
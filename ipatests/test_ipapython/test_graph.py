@@ -0,0 +1,72 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+from ipapython.graph import Graph
+
+import pytest
+
+pytestmark = pytest.mark.tier0
+
+
+def mkgraph(vertices, edges, both=True):
+    graph = Graph()
+    for v in vertices:
+        graph.add_vertex(v)
+    for tail, head in edges:
+        graph.add_edge(tail, head)
+        if both:
+            graph.add_edge(head, tail)
+    return graph
+
+
+def test_strongly_connected_components():
+    graph = mkgraph('abcde', [('a', 'b'), ('b', 'c'), ('c', 'a'),
+                              ('c', 'd'), ('d', 'e'), ('e', 'd')],
+                    both=False)
+    components = graph.strongly_connected_components()
+    assert sorted(sorted(c) for c in components) == [
+        ['a', 'b', 'c'], ['d', 'e']]
+    # reverse topological order
+    assert components[-1] == {'a', 'b', 'c'}
+
+    components = graph.strongly_connected_components(
+        ignore_edges=[('b', 'c')])
+    assert sorted(sorted(c) for c in components) == [
+        ['a'], ['b'], ['c'], ['d', 'e']]
+
+
+def test_reachable_sets():
+    graph = mkgraph('abcd', [('a', 'b'), ('b', 'a'), ('b', 'c'),
+                             ('d', 'c')], both=False)
+    reachable = graph.reachable_sets()
+    assert reachable['a'] == {'a', 'b', 'c'}
+    assert reachable['b'] == {'a', 'b', 'c'}
+    assert reachable['c'] == {'c'}
+    assert reachable['d'] == {'c', 'd'}
+
+    reachable = graph.reachable_sets(ignore_vertices=['b'])
+    assert 'b' not in reachable
+    assert reachable['a'] == {'a'}
+
+
+def test_articulation_points_and_bridges():
+    # two triangles joined by the c-d bridge, plus a dangling e-f
+    graph = mkgraph('abcdefg', [('a', 'b'), ('b', 'c'), ('c', 'a'),
+                                ('c', 'd'), ('d', 'e'), ('e', 'g'),
+                                ('g', 'd'), ('e', 'f')])
+    assert graph.articulation_points() == {'c', 'd', 'e'}
+    assert sorted(sorted(b) for b in graph.bridges()) == [
+        ['c', 'd'], ['e', 'f']]
+
+
+def test_ring_has_no_cuts():
+    graph = mkgraph(range(50), [(i, (i + 1) % 50) for i in range(50)])
+    assert graph.articulation_points() == set()
+    assert graph.bridges() == []
+
+
+def test_distances():
+    graph = mkgraph('abcd', [('a', 'b'), ('b', 'c'), ('c', 'd')])
+    assert graph.distances('a') == {'a': 0, 'b': 1, 'c': 2, 'd': 3}
+    assert graph.distances('c') == {'a': 2, 'b': 1, 'c': 0, 'd': 1}
@@ -6,6 +6,7 @@ Test the `ipaserver/dnssec` package.
 """
 import dns.name
 
+from ipaserver.dnssec.keysyncer import KeySyncer
 from ipaserver.dnssec.odsmgr import ODSZoneListReader
 
 
@@ -39,3 +40,36 @@ def test_ods_zonelist_reader():
     assert reader.mapping == {uuid: name}
     assert reader.names == {name}
     assert reader.uuids == {uuid}
+
+
+def test_keysyncer_coalesces_changes(monkeypatch):
+    monkeypatch.delenv('ISMASTER', raising=False)
+    syncer = KeySyncer('ldap://localhost', ipa_api=None)
+
+    calls = []
+    monkeypatch.setattr(syncer.bindmgr, 'ldap_event', lambda *args: None)
+    monkeypatch.setattr(syncer, 'hsm_replica_sync',
+                        lambda: calls.append('hsm'))
+    monkeypatch.setattr(syncer, 'bindmgr_sync',
+                        lambda zones: calls.append('bind'))
+
+    # nothing is queued during the initial LDAP dump
+    syncer.key_meta_add('0', None, {})
+    assert syncer.sync_timeout() is None
+
+    syncer.init_done = True
+    for uuid in range(10):
+        syncer.key_meta_add(str(uuid), None, {})
+        syncer.key_metadata_sync(str(uuid), None, {}, {})
+    syncer.key_meta_del('0', None, {})
+    assert syncer.sync_queue_depth == 21
+    assert 0 < syncer.sync_timeout() <= syncer.sync_delay
+
+    # changes are collected until the window is over
+    syncer.sync_queued()
+    assert calls == []
+
+    syncer.sync_queued(force=True)
+    assert calls == ['hsm', 'bind', 'hsm']
+    assert syncer.sync_timeout() is None
+    assert syncer.sync_queue_depth == 0
@@ -0,0 +1,190 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test bulk retrieval of certificates by the dogtag RA backend.
+"""
+
+import gzip
+import http.client
+import json
+import zlib
+from types import SimpleNamespace
+
+import pytest
+
+from ipalib import errors, profiler
+from ipalib.request import destroy_context
+from ipaserver.plugins import dogtag
+
+pytestmark = pytest.mark.tier0
+
+CA_HOST = 'ca.example.test'
+CA_PORT = 8443
+
+
+class FakeResponse:
+    def __init__(self, status, body, will_close=False, headers=None):
+        self.status = status
+        self.msg = headers or {}
+        self.body = body
+        self.will_close = will_close
+
+    def getheader(self, name, default=None):
+        return self.msg.get(name, default)
+
+    def read(self):
+        return self.body
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.closed = False
+        self.requests = []
+
+    def request(self, method, url, body=None, headers=None):
+        assert not self.closed
+        self.requests.append((method, url))
+
+    def getresponse(self):
+        response = self.server.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        self.closed = True
+
+
+class FakeServer:
+    """
+    Scripted CA, each request takes the next of ``responses``.
+    """
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.connections = []
+
+    def connect(self, host, port, **kwargs):
+        assert (host, port) == (CA_HOST, CA_PORT)
+        conn = FakeConnection(self)
+        self.connections.append(conn)
+        return conn
+
+
+def cert(serial, **kwargs):
+    body = json.dumps({'id': hex(serial)}).encode('utf-8')
+    return FakeResponse(200, body, **kwargs)
+
+
+@pytest.fixture
+def ra():
+    api = SimpleNamespace(env=SimpleNamespace(
+        tls_ca_cert='/etc/ipa/ca.crt',
+        in_tree=False,
+        ca_agent_port=CA_PORT,
+        ca_bulk_connections=1,
+        tls_version_min='tls1.2',
+        tls_version_max='tls1.3',
+    ))
+    ra = dogtag.ra(api)
+    ra._ca_host = CA_HOST
+    yield ra
+    destroy_context()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    def make_server(responses):
+        server = FakeServer(responses)
+        monkeypatch.setattr(dogtag, 'create_https_connection',
+                            server.connect)
+        return server
+    return make_server
+
+
+def test_keepalive(ra, server):
+    ca = server([cert(1), cert(2), cert(3)])
+    profiler.start()
+
+    result = ra.get_certificates([1, 2, 3])
+
+    assert sorted(result) == [1, 2, 3]
+    assert result[2]['serial_number'] == u'2'
+    assert len(ca.connections) == 1
+    assert ca.connections[0].requests == [
+        ('GET', '/ca/rest/certs/1'),
+        ('GET', '/ca/rest/certs/2'),
+        ('GET', '/ca/rest/certs/3'),
+    ]
+    assert ca.connections[0].closed
+    operations = profiler.get_profile().as_dict()['operations']
+    assert [(op['category'], op['name'], op['count'])
+            for op in operations] == [('dogtag', 'ra GET', 3)]
+
+
+def test_retry_closed_connection(ra, server):
+    ca = server([
+        cert(1),
+        http.client.RemoteDisconnected('closed'),
+        cert(2),
+    ])
+
+    result = ra.get_certificates([1, 2])
+
+    assert sorted(result) == [1, 2]
+    assert len(ca.connections) == 2
+    assert ca.connections[0].closed
+    assert ca.connections[1].requests == [('GET', '/ca/rest/certs/2')]
+
+
+def test_retry_once(ra, server):
+    ca = server([
+        http.client.RemoteDisconnected('closed'),
+        ConnectionResetError('reset'),
+    ])
+
+    with pytest.raises(errors.NetworkError):
+        ra.get_certificates([1, 2])
+    assert len(ca.connections) == 2
+
+
+def test_will_close(ra, server):
+    ca = server([cert(1, will_close=True), cert(2)])
+
+    result = ra.get_certificates([1, 2])
+
+    assert sorted(result) == [1, 2]
+    assert len(ca.connections) == 2
+    assert ca.connections[0].requests == [('GET', '/ca/rest/certs/1')]
+    assert ca.connections[1].requests == [('GET', '/ca/rest/certs/2')]
+
+
+def test_content_encoding(ra, server):
+    def body(serial):
+        return json.dumps({'id': hex(serial)}).encode('utf-8')
+
+    server([
+        FakeResponse(200, gzip.compress(body(1)),
+                     headers={'Content-Encoding': 'gzip'}),
+        FakeResponse(200, zlib.compress(body(2)),
+                     headers={'Content-Encoding': 'deflate'}),
+    ])
+
+    result = ra.get_certificates([1, 2])
+
+    assert result[1]['serial_number'] == u'1'
+    assert result[2]['serial_number'] == u'2'
+
+
+@pytest.mark.parametrize('status, error', [
+    (404, errors.NotFound),
+    (500, errors.CertificateOperationError),
+])
+def test_error_status(ra, server, status, error):
+    ca = server([cert(1), FakeResponse(status, b'')])
+
+    with pytest.raises(error):
+        ra.get_certificates([1, 2])
+    assert ca.connections[0].closed
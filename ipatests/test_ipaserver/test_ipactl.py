@@ -0,0 +1,114 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the parallel mode of `ipaserver/install/ipactl.py`.
+"""
+
+import threading
+
+import pytest
+
+from ipaserver.install import ipactl
+from ipaserver.masters import SERVICES, SERVICE_DEPENDENCIES
+
+pytestmark = pytest.mark.tier0
+
+
+class FakeOptions:
+    debug = False
+
+
+class FakeService:
+    def __init__(self, name, log, failing):
+        self.name = name
+        self.log = log
+        self.failing = failing
+
+    def _run(self, action):
+        self.log.append((action, self.name, 'begin'))
+        if self.name in self.failing:
+            raise RuntimeError(self.name)
+        self.log.append((action, self.name, 'end'))
+
+    def start(self, capture_output):
+        self._run('start')
+
+    def stop(self, capture_output):
+        self._run('stop')
+
+
+@pytest.fixture
+def fake_services(monkeypatch):
+    log = []
+    failing = set()
+    lock = threading.Lock()
+
+    def service(name, api):
+        with lock:
+            return FakeService(name, log, failing)
+
+    monkeypatch.setattr(ipactl.services, 'service', service)
+    return log, failing
+
+
+def test_dependencies_follow_start_order():
+    startorder = {}
+    for s in SERVICES:
+        startorder.setdefault(s.systemd_name, s.startorder)
+    assert set(SERVICE_DEPENDENCIES) == set(startorder)
+    for svc, deps in SERVICE_DEPENDENCIES.items():
+        for dep in deps:
+            assert startorder[dep] < startorder[svc]
+
+
+def test_get_service_dependencies():
+    deps = ipactl.get_service_dependencies(
+        ['krb5kdc', 'kadmin', 'unknown', 'pki-tomcatd'])
+    assert deps == {
+        'krb5kdc': set(),
+        'kadmin': {'krb5kdc'},
+        'unknown': {'krb5kdc', 'kadmin'},
+        'pki-tomcatd': set(),
+    }
+
+
+def test_start_honors_dependencies(fake_services):
+    log, _failing = fake_services
+    svc_list = ['krb5kdc', 'kadmin', 'named', 'httpd', 'pki-tomcatd']
+    failed = ipactl.run_services_parallel(
+        dict.fromkeys(svc_list, 'start'), FakeOptions())
+    assert failed == []
+    for svc, dep in (('kadmin', 'krb5kdc'), ('httpd', 'krb5kdc')):
+        assert (log.index(('start', dep, 'end')) <
+                log.index(('start', svc, 'begin')))
+    assert {name for _action, name, _state in log} == set(svc_list)
+
+
+def test_stop_honors_dependencies(fake_services):
+    log, _failing = fake_services
+    svc_list = ['krb5kdc', 'kadmin', 'httpd']
+    ipactl.run_services_parallel(
+        dict.fromkeys(svc_list, 'stop'), FakeOptions(), reverse=True,
+        stop_on_failure=False)
+    assert log[-1] == ('stop', 'krb5kdc', 'end')
+
+
+def test_failure_stops_dependent_services(fake_services):
+    log, failing = fake_services
+    failing.add('krb5kdc')
+    failed = ipactl.run_services_parallel(
+        dict.fromkeys(['krb5kdc', 'kadmin'], 'start'), FakeOptions())
+    assert failed == ['krb5kdc']
+    assert ('start', 'kadmin', 'begin') not in log
+
+
+def test_ignored_failure(fake_services):
+    log, failing = fake_services
+    failing.add('krb5kdc')
+    failed = ipactl.run_services_parallel(
+        dict.fromkeys(['krb5kdc', 'kadmin'], 'start'), FakeOptions(),
+        stop_on_failure=False)
+    assert failed == ['krb5kdc']
+    assert ('start', 'kadmin', 'end') in log
@@ -141,6 +141,61 @@ class test_ldap:
         cert = entry_attrs.get('usercertificate')[0]
         assert cert.serial_number is not None
 
+    def test_iter_entries(self):
+        """
+        Test that iter_entries yields the same entries as get_entries
+        """
+        self.conn = ldap2(api)
+        self.conn.connect(autobind=AUTOBIND_DISABLED)
+        base_dn = DN(api.env.container_masters, api.env.basedn)
+        entries = self.conn.get_entries(
+            base_dn, self.conn.SCOPE_SUBTREE, attrs_list=['cn'])
+        iterated = list(self.conn.iter_entries(
+            base_dn, self.conn.SCOPE_SUBTREE, attrs_list=['cn'],
+            paged_search=True))
+        assert sorted(e.dn for e in iterated) == sorted(e.dn for e in entries)
+
+        # closing the generator early abandons the search
+        gen = self.conn.iter_entries(
+            base_dn, self.conn.SCOPE_SUBTREE, paged_search=True)
+        next(gen)
+        gen.close()
+        assert self.conn.get_entry(base_dn, ['cn'])
+
+        # an empty result set does not raise
+        assert list(self.conn.iter_entries(
+            base_dn, filter='(cn=nonexistent)')) == []
+
+    def test_watch_entry(self):
+        """
+        Test that watch_entry yields the current entry until timeout
+        """
+        self.conn = ldap2(api)
+        self.conn.connect(autobind=AUTOBIND_DISABLED)
+        base_dn = api.env.basedn
+        entries = list(self.conn.watch_entry(
+            base_dn, ['associateddomain'], timeout=2, poll_interval=0.5))
+        assert len(entries) >= 2
+        for entry in entries:
+            assert entry.dn == base_dn
+            assert entry.single_value['associateddomain'] == api.env.domain
+
+        # a missing entry is yielded as None
+        gen = self.conn.watch_entry(DN(('cn', 'nonexistent'), base_dn))
+        assert next(gen) is None
+        gen.close()
+        assert self.conn.get_entry(base_dn, ['associateddomain'])
+
+    def test_watch_task(self):
+        """
+        Test that watch_task fails for a missing task entry
+        """
+        self.conn = ldap2(api)
+        self.conn.connect(autobind=AUTOBIND_DISABLED)
+        task_dn = DN(('cn', 'nonexistent'), ('cn', 'tasks'), ('cn', 'config'))
+        with pytest.raises(errors.NotFound):
+            next(self.conn.watch_task(task_dn))
+
     def test_generalized_time(self):
         """
         Test that LDAP generalized time is converted to/from datetime
@@ -361,3 +416,19 @@ class test_LDAPEntry:
         assert entry.generate_modlist() == [
             (1, 'distinguishedName', [dn_389ds_encoded]),
             (0, 'distinguishedName', [dn_ipa_encoded])]
+
+    def test_modlist_in_place_changes(self):
+        """
+        Test modlist is correct when values are changed in place
+        """
+        entry = self.entry
+        entry.raw['description'] = [b'a', b'b']
+        entry['l'] = [u'x']
+        entry.reset_modlist()
+
+        entry.raw['description'].append(b'c')
+        entry['l'].append(u'y')
+        assert sorted(entry.generate_modlist()) == [
+            (0, 'description', [b'c']),
+            (0, 'l', [b'y']),
+        ]
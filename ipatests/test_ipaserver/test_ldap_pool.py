@@ -0,0 +1,95 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the per-process LDAP connection pool of the ldap2 backend.
+"""
+
+import ldap
+import pytest
+
+from ipaserver.plugins.ldap2 import LDAPConnectionPool
+
+pytestmark = pytest.mark.tier0
+
+
+class FakeConnection:
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.unbound = False
+
+    def whoami_s(self):
+        if not self.healthy:
+            raise ldap.SERVER_DOWN()
+        return 'dn: uid=admin'
+
+    def unbind_s(self):
+        self.unbound = True
+
+
+@pytest.fixture
+def pool():
+    return LDAPConnectionPool(
+        size=2, idle_timeout=300, health_check_interval=10)
+
+
+def test_reuse_same_principal(pool):
+    conn = FakeConnection()
+    pool.register(conn, 'admin@EXAMPLE.TEST', 3600)
+    assert pool.checkout('admin@EXAMPLE.TEST') is None
+    assert pool.release(conn)
+    assert not conn.unbound
+
+    assert pool.checkout('admin@EXAMPLE.TEST') is conn
+    assert pool.release(conn)
+
+
+def test_no_reuse_for_other_principal(pool):
+    conn = FakeConnection()
+    pool.register(conn, 'admin@EXAMPLE.TEST', 3600)
+    pool.release(conn)
+    assert pool.checkout('user@EXAMPLE.TEST') is None
+
+
+def test_release_unknown_connection(pool):
+    assert not pool.release(FakeConnection())
+
+
+def test_expired_ticket(pool):
+    conn = FakeConnection()
+    pool.register(conn, 'admin@EXAMPLE.TEST', 0)
+    assert pool.release(conn)
+    assert conn.unbound
+    assert pool.checkout('admin@EXAMPLE.TEST') is None
+
+
+def test_size_limit(pool):
+    conns = [FakeConnection() for _i in range(3)]
+    for conn in conns:
+        pool.register(conn, 'admin@EXAMPLE.TEST', 3600)
+    for conn in conns:
+        pool.release(conn)
+    assert len(pool) == 2
+    assert conns[0].unbound
+    assert not conns[1].unbound
+    assert not conns[2].unbound
+
+
+def test_health_check(pool):
+    pool.health_check_interval = -1
+    conn = FakeConnection(healthy=False)
+    pool.register(conn, 'admin@EXAMPLE.TEST', 3600)
+    pool.release(conn)
+    assert pool.checkout('admin@EXAMPLE.TEST') is None
+    assert conn.unbound
+    assert len(pool) == 0
+
+
+def test_clear(pool):
+    conn = FakeConnection()
+    pool.register(conn, 'admin@EXAMPLE.TEST', 3600)
+    pool.release(conn)
+    pool.clear()
+    assert conn.unbound
+    assert len(pool) == 0
@@ -0,0 +1,71 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the shared LDAP read cache of the ldap2 backend.
+"""
+
+import pytest
+
+from ipapython.dn import DN
+from ipaserver.plugins.ldap2 import SharedLDAPCache
+
+pytestmark = pytest.mark.tier0
+
+basedn = DN(('dc', 'example'), ('dc', 'test'))
+config_dn = DN(('cn', 'ipaconfig'), ('cn', 'etc'), basedn)
+masters_dn = DN(('cn', 'masters'), ('cn', 'ipa'), ('cn', 'etc'), basedn)
+
+
+@pytest.fixture
+def cache():
+    return SharedLDAPCache(subtrees=(config_dn, masters_dn), size=2)
+
+
+def test_covers(cache):
+    assert cache.covers(config_dn)
+    assert cache.covers(DN(('cn', 'ipa.example.test'), masters_dn))
+    assert not cache.covers(DN(('cn', 'etc'), basedn))
+    assert not cache.covers(DN(('uid', 'admin'), ('cn', 'users'), basedn))
+
+
+def test_hits_and_misses(cache):
+    cache.validate(b'1')
+    assert cache.get('a') is None
+    cache.set('a', 'value')
+    assert cache.get('a') == 'value'
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_validate(cache):
+    cache.validate(b'1')
+    cache.set('a', 'value')
+    cache.validate(b'1')
+    assert cache.get('a') == 'value'
+    cache.validate(b'2')
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_size_limit(cache):
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_clear(cache):
+    cache.validate(b'1')
+    cache.set('a', 1)
+    cache.clear()
+    assert len(cache) == 0
+    # the next validation drops results cached in the meantime
+    cache.set('b', 2)
+    cache.validate(b'1')
+    assert cache.get('b') is None
@@ -0,0 +1,99 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the bulk mode of migrate-ds.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from ipalib import errors
+from ipapython.dn import DN
+from ipaserver.plugins import migration
+from ipaserver.plugins.migration import _AsyncWriter
+from ipatests.util import FakeLDAP, FakeLDAPEntry
+
+pytestmark = pytest.mark.tier0
+
+
+def test_window():
+    ldap = FakeLDAP()
+    writer = _AsyncWriter(ldap, 2)
+    results = []
+    for dn in ('a', 'b', 'c', 'd'):
+        writer.add(FakeLDAPEntry(dn), results.append)
+        assert len(ldap.sent) - len(ldap.collected) <= 2
+    assert ldap.collected == [1, 2]
+    writer.flush()
+    assert ldap.collected == [1, 2, 3, 4]
+    assert results == [None] * 4
+
+
+def test_errors_passed_to_callback():
+    ldap = FakeLDAP(failing=['b'])
+    writer = _AsyncWriter(ldap, 10)
+    results = {}
+    for dn in ('a', 'b'):
+        writer.add(FakeLDAPEntry(dn),
+                   lambda exc, dn=dn: results.__setitem__(dn, exc))
+    writer.flush()
+    assert results['a'] is None
+    assert isinstance(results['b'], errors.DuplicateEntry)
+
+
+def test_write_from_callback():
+    ldap = FakeLDAP()
+    writer = _AsyncWriter(ldap, 1)
+    modified = []
+
+    def added(exc):
+        writer.modify('m', [], modified.append)
+
+    writer.add(FakeLDAPEntry('a'), added)
+    writer.add(FakeLDAPEntry('b'), added)
+    writer.flush()
+    assert ldap.sent == ['a', 'b', 'm', 'm']
+    assert ldap.collected == [1, 2, 3, 4]
+    assert modified == [None, None]
+
+
+@pytest.fixture
+def remote(monkeypatch):
+    monkeypatch.setattr(migration, 'api', SimpleNamespace(
+        Object=SimpleNamespace(
+            user=SimpleNamespace(primary_key=SimpleNamespace(name='uid')),
+            group=SimpleNamespace(primary_key=SimpleNamespace(name='cn')))))
+    base = DN('dc=example,dc=com')
+    return FakeLDAP([
+        FakeLDAPEntry(DN('uid=u1,ou=people', base), uid=['u1'],
+                      objectclass=['posixAccount']),
+        FakeLDAPEntry(DN('cn=g1,ou=groups', base), cn=['g1'],
+                      gidnumber=['1000'], objectclass=['posixGroup']),
+    ])
+
+
+def test_prefetch_remote_entries(remote):
+    search_bases = dict(user=DN('ou=people,dc=example,dc=com'),
+                        group=DN('ou=groups,dc=example,dc=com'))
+    entries, gids = migration._prefetch_remote_entries(remote, search_bases)
+    assert entries == {
+        DN('uid=u1,ou=people,dc=example,dc=com'): dict(uid=['u1']),
+        DN('cn=g1,ou=groups,dc=example,dc=com'): dict(cn=['g1']),
+    }
+    assert gids == {'1000'}
+
+
+def test_prefetch_remote_entries_incomplete(remote):
+    def iter_entries(*args, **kwargs):
+        yield remote.entries[0]
+        raise errors.LimitsExceeded()
+
+    remote.iter_entries = iter_entries
+    search_bases = dict(user=DN('ou=people,dc=example,dc=com'))
+    # entries missing from a partial index would look like dangling
+    # references, so it is not used at all
+    assert migration._prefetch_remote_entries(remote, search_bases) == (
+        None, None)
@@ -262,3 +262,19 @@ class test_jsonserver(PluginTester):
         options = dict(givenname=u'John', sn='Doe')
         d = dict(method=u'user_add', params=(args, options), id=18)
         assert o.unmarshal(json.dumps(d)) == (u'user_add', args, options, 18)
+
+    def test_marshal_iter(self):
+        """
+        Test the `ipaserver.rpcserver.jsonserver.marshal_iter` method.
+        """
+        o, _api, _home = self.instance('Backend', in_server=True)
+
+        result = dict(result=[dict(uid=u'user%d' % i) for i in range(5000)])
+        response = json.loads(b''.join(o.marshal_iter(result, None, 18)))
+        assert response['result'] == result
+        assert response['error'] is None
+        assert response['id'] == 18
+
+        # a response which cannot be encoded fails before the status is sent
+        with pytest.raises(TypeError):
+            o.marshal_iter(dict(result=object()), None, 18)
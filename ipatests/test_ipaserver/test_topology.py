@@ -0,0 +1,94 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the `ipaserver/topology.py` module.
+"""
+
+from ipaserver.topology import (
+    analyze_topology, create_topology_graph, get_topology_connection_errors)
+
+import pytest
+
+pytestmark = pytest.mark.tier0
+
+
+def mkmaster(cn):
+    return {'cn': [cn]}
+
+
+def mksegment(left, right, direction=u'both'):
+    return {
+        'cn': [u'{}-to-{}'.format(left, right)],
+        'iparepltoposegmentleftnode': [left],
+        'iparepltoposegmentrightnode': [right],
+        'iparepltoposegmentdirection': [direction],
+    }
+
+
+def mktopology(masters, segments):
+    masters = [mkmaster(m) for m in masters]
+    segments = [mksegment(*s) for s in segments]
+    return create_topology_graph(masters, segments), segments
+
+
+def test_connection_errors():
+    graph, _segments = mktopology(
+        ['a', 'b', 'c'], [('a', 'b'), ('b', 'c', u'left-right')])
+    assert get_topology_connection_errors(graph) == [
+        ('c', ['c'], ['a', 'b']),
+    ]
+    assert get_topology_connection_errors(
+        graph, removed_masters=['c']) == []
+
+
+def test_analyze_line():
+    graph, segments = mktopology(
+        ['a', 'b', 'c', 'd'], [('a', 'b'), ('b', 'c'), ('c', 'd')])
+    analysis = analyze_topology(graph, segments)
+
+    assert analysis['connect_errors'] == []
+    assert analysis['max_hops'] == (3, 'a', 'd')
+
+    master_errors = dict(analysis['master_removal_errors'])
+    assert master_errors['a'] == []
+    assert master_errors['d'] == []
+    assert master_errors['b'] == [
+        ('a', ['a'], ['c', 'd']),
+        ('c', ['c', 'd'], ['a']),
+        ('d', ['c', 'd'], ['a']),
+    ]
+
+    segment_errors = dict(analysis['segment_removal_errors'])
+    assert all(segment_errors.values())
+    assert segment_errors['c-to-d'] == [
+        ('a', ['a', 'b', 'c'], ['d']),
+        ('b', ['a', 'b', 'c'], ['d']),
+        ('c', ['a', 'b', 'c'], ['d']),
+        ('d', ['d'], ['a', 'b', 'c']),
+    ]
+
+
+def test_analyze_ring():
+    masters = ['m{:02d}'.format(i) for i in range(60)]
+    graph, segments = mktopology(
+        masters, [(masters[i], masters[(i + 1) % 60]) for i in range(60)])
+    analysis = analyze_topology(graph, segments)
+
+    assert analysis['connect_errors'] == []
+    assert analysis['max_hops'][0] == 30
+    assert not any(e for _m, e in analysis['master_removal_errors'])
+    assert not any(e for _s, e in analysis['segment_removal_errors'])
+
+
+def test_analyze_one_way_segment():
+    graph, segments = mktopology(
+        ['a', 'b', 'c'],
+        [('a', 'b'), ('b', 'c'), ('c', 'a', u'left-right')])
+    analysis = analyze_topology(graph, segments)
+
+    assert analysis['connect_errors'] == []
+    segment_errors = dict(analysis['segment_removal_errors'])
+    assert segment_errors['a-to-b'] == [('a', ['a'], ['b', 'c'])]
+    assert segment_errors['c-to-a'] == []
@@ -494,6 +494,23 @@ class TestAutomemberRebuildHostMembership(XMLRPC_test):
         hostgroup1.attrs.update(member_host=[host1.fqdn])
         hostgroup1.retrieve()
 
+    def test_rebuild_status(self, host1, automember_hostgroup):
+        """ Follow an asynchronous rebuild with automember_rebuild_status """
+        command = automember_hostgroup.make_rebuild_command(hosts=host1.fqdn,
+                                                            no_wait=True)
+        task_dn = command()['result']['dn']
+
+        result = api.Command['automember_rebuild_status'](task_dn, wait=60)
+        assert result['result']['dn'] == task_dn
+        assert str(result['result']['nstaskexitcode']) == '0'
+
+        with pytest.raises(errors.ValidationError):
+            api.Command['automember_rebuild_status'](
+                DN(('cn', 'nonexistent'), ('cn', 'tasks'), ('cn', 'config')))
+        with pytest.raises(errors.NotFound):
+            api.Command['automember_rebuild_status'](
+                DN(('cn', 'nonexistent'), REBUILD_TASK_CONTAINER))
+
     def test_delete_deps_for_rebuilding_hostgroups(self, host1, hostgroup1,
                                                    automember_hostgroup):
         """ Delete dependences for this class of tests in desired order """
@@ -28,7 +28,7 @@ from ipapython import ipaldap
 from ipalib import errors
 from ipalib.frontend import Command
 from ipaserver.plugins import baseldap
-from ipatests.util import assert_deepequal
+from ipatests.util import assert_deepequal, FakeLDAP, FakeLDAPEntry
 import pytest
 
 
@@ -223,3 +223,50 @@ def test_entry_to_dict():
     assert_deepequal(
         baseldap.entry_to_dict(entry, all=True, raw=True),
         the_dict)
+
+
+@pytest.mark.tier0
+def test_membership_graph():
+    """Test the baseldap.MembershipGraph index"""
+    # the graph must ignore entries it did not ask for
+    ldap = FakeLDAP([
+        FakeLDAPEntry(
+            DN('cn=outer,dc=example,dc=com'),
+            member=[b'cn=inner,dc=example,dc=com',
+                    b'uid=u1,dc=example,dc=com']),
+        FakeLDAPEntry(
+            DN('cn=inner,dc=example,dc=com'),
+            member=[b'uid=u2,dc=example,dc=com'],
+            memberof=[b'CN=Outer, dc=example,dc=com']),
+        FakeLDAPEntry(
+            DN('cn=rule,dc=example,dc=com'),
+            memberuser=[b'cn=outer,dc=example,dc=com']),
+    ])
+    graph = baseldap.MembershipGraph(
+        ldap, DN('dc=example,dc=com'),
+        [DN('cn=outer,dc=example,dc=com'), DN('uid=u2,dc=example,dc=com')])
+
+    searches = [kw for name, kw in ldap.calls if name == 'find_entries']
+    assert len(searches) == 2
+    assert all(kw['base_dn'] == DN('dc=example,dc=com') for kw in searches)
+    assert all(kw['paged_search'] for kw in searches)
+    assert 'memberof=cn=outer,dc=example,dc=com' in searches[0]['filter']
+    assert 'memberuser=uid=u2,dc=example,dc=com' in searches[1]['filter']
+
+    assert graph.get_nested_members(DN('cn=outer,dc=example,dc=com')) == {
+        b'uid=u2,dc=example,dc=com'}
+    assert graph.get_nested_members(DN('cn=inner,dc=example,dc=com')) == set()
+    assert graph.get_containers(DN('UID=u2,dc=example,dc=com')) == {
+        DN('cn=inner,dc=example,dc=com')}
+    assert graph.get_containers(DN('cn=outer,dc=example,dc=com')) == {
+        DN('cn=rule,dc=example,dc=com')}
+    # entries outside of the indexed set are not indexed
+    assert graph.get_containers(DN('uid=u1,dc=example,dc=com')) == set()
+
+    ldap = FakeLDAP()
+    baseldap.MembershipGraph(
+        ldap, DN('dc=example,dc=com'),
+        [DN('uid=u%d,dc=example,dc=com' % i) for i in range(150)],
+        nested=False)
+    # one search per batch of DNs
+    assert ldap.count('find_entries') == 2
@@ -184,6 +184,62 @@ class test_batch(Declarative):
             ),
         ),
 
+        dict(
+            desc='Retrieve group twice in parallel mode',
+            command=('batch', [
+                dict(method=u'group_show', params=([group1], dict())),
+                dict(method=u'group_find', params=([group1], dict())),
+                dict(method=u'group_show', params=([group1], dict())),
+            ], {'parallel': True}),
+            expected=dict(
+                count=3,
+                results=deepequal_list(
+                    dict(
+                        value=group1,
+                        summary=None,
+                        result=dict(
+                            cn=[group1],
+                            description=[u'Test desc 1'],
+                            gidnumber=[fuzzy_digits],
+                            dn=DN(('cn', 'testgroup1'),
+                                  ('cn', 'groups'),
+                                  ('cn', 'accounts'),
+                                  api.env.basedn),
+                        ),
+                        error=None),
+                    dict(
+                        count=1,
+                        truncated=False,
+                        summary=u'1 group matched',
+                        result=[
+                            dict(
+                                cn=[group1],
+                                description=[u'Test desc 1'],
+                                gidnumber=[fuzzy_digits],
+                                dn=DN(('cn', 'testgroup1'),
+                                      ('cn', 'groups'),
+                                      ('cn', 'accounts'),
+                                      api.env.basedn),
+                            ),
+                        ],
+                        error=None),
+                    dict(
+                        value=group1,
+                        summary=None,
+                        result=dict(
+                            cn=[group1],
+                            description=[u'Test desc 1'],
+                            gidnumber=[fuzzy_digits],
+                            dn=DN(('cn', 'testgroup1'),
+                                  ('cn', 'groups'),
+                                  ('cn', 'accounts'),
+                                  api.env.basedn),
+                        ),
+                        error=None),
+                ),
+            ),
+        ),
+
         dict(
             desc='Try bad command invocations',
             command=('batch', [
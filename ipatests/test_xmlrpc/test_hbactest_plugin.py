@@ -217,6 +217,61 @@ class test_hbactest(XMLRPC_test):
 
         assert ret['messages'] is not None
 
+    def test_g2_hbactest_rule_change(self):
+        """
+        Test that 'ipa hbactest' notices a change of the cached rules
+        """
+        ret = api.Command['hbactest'](
+            user=self.test_user,
+            targethost=self.test_host,
+            service=self.test_service,
+        )
+        assert self.rule_names[0] in ret['matched']
+
+        api.Command['hbacrule_disable'](self.rule_names[0])
+        try:
+            ret = api.Command['hbactest'](
+                user=self.test_user,
+                targethost=self.test_host,
+                service=self.test_service,
+            )
+            assert self.rule_names[0] not in (ret['matched'] or [])
+        finally:
+            api.Command['hbacrule_enable'](self.rule_names[0])
+
+    def test_g3_hbactest_many(self):
+        """
+        Test 'ipa hbactest-many' with several users and services
+        """
+        ret = api.Command['hbactest_many'](
+            user=[self.test_user, u'hbacrule_test_nonexistent'],
+            targethost=[self.test_host],
+            service=[self.test_service, u'hbacrule_test_nosvc'],
+            rules=self.rule_names,
+        )
+        assert ret['count'] == 4
+        results = {
+            (r['user'], r['service']): r for r in ret['result']
+        }
+        granted = results[(self.test_user, self.test_service)]
+        assert granted['value']
+        assert granted['targethost'] == self.test_host
+        for i in [0,1,2,3]:
+            assert self.rule_names[i] in granted['matched']
+        assert not results[(self.test_user, u'hbacrule_test_nosvc')]['value']
+
+    def test_g4_hbactest_many_non_existing_rule(self):
+        """
+        Test running 'ipa hbactest-many' with non-existing rule in --rules
+        """
+        with pytest.raises(errors.NotFound):
+            api.Command['hbactest_many'](
+                user=[self.test_user],
+                targethost=[self.test_host],
+                service=[self.test_service],
+                rules=[u'%s_1x1' % self.rule_names[0]],
+            )
+
     def test_h_hbactest_clear_testing_data(self):
         """
         Clear data for HBAC test plugin testing.
@@ -233,3 +288,37 @@ class test_hbactest(XMLRPC_test):
         api.Command['host_del'](self.test_sourcehost)
         api.Command['hostgroup_del'](self.test_sourcehostgroup)
         api.Command['hbacsvc_del'](self.test_service)
+
+
+@pytest.mark.tier0
+def test_rules_state_above_size_limit():
+    """
+    Test that the HBAC rule state covers more rules than the search
+    size limit
+    """
+    from types import SimpleNamespace
+    from ipapython.dn import DN
+    from ipaserver.plugins import hbactest as hbactest_module
+    from ipatests.util import FakeLDAP, FakeLDAPEntry
+
+    container = DN('cn=rules,cn=hbac,dc=example,dc=com')
+    rules = [
+        FakeLDAPEntry(DN(('ipauniqueid', str(i)), container),
+                      entryusn=[str(i)],
+                      modifytimestamp=['20260101000000Z'])
+        for i in range(150)
+    ]
+    ldap = FakeLDAP(rules, size_limit=100)
+    cmd = hbactest_module.hbactest(SimpleNamespace(
+        Backend=SimpleNamespace(ldap2=ldap),
+        env=SimpleNamespace(container_hbac=DN('cn=rules,cn=hbac'),
+                            basedn=DN('dc=example,dc=com'))))
+
+    state = cmd._get_rules_state()
+
+    assert state is not None
+    assert len(state) == 150
+
+    # a changed rule changes the state
+    rules[120]['entryusn'] = ['1000']
+    assert cmd._get_rules_state() != state
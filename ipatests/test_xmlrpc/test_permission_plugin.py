@@ -4559,3 +4559,65 @@ class test_self_bindrule(Declarative):
             + 'allow (read) userdn = "ldap:///self";)',
         ),
     ]
+
+
+@pytest.mark.tier0
+def test_aci_index(monkeypatch):
+    """Test the per-request ACI index of the permission plugin"""
+    from types import SimpleNamespace
+    from ipalib.request import destroy_context
+    from ipaserver.plugins import permission as permission_module
+    from ipatests.util import FakeLDAP, FakeLDAPEntry
+
+    parsed = []
+    aci_class = permission_module.ACI
+
+    def counting_aci(acistring):
+        parsed.append(acistring)
+        return aci_class(acistring)
+
+    monkeypatch.setattr(permission_module, 'ACI', counting_aci)
+
+    def make_aci(name, attr='cn'):
+        return (
+            '(targetattr = "%s")(version 3.0;acl "permission:%s";'
+            'allow (read) groupdn = "ldap:///cn=%s,cn=permissions,cn=pbac,'
+            'dc=example,dc=com";)' % (attr, name, name))
+
+    location = DN('cn=users,cn=accounts,dc=example,dc=com')
+    acis = [make_aci(name) for name in ('a', 'b', 'c')]
+    location_entry = FakeLDAPEntry(location, aci=list(acis))
+    ldap = FakeLDAP([location_entry])
+    obj = permission_module.permission(SimpleNamespace(
+        Backend=SimpleNamespace(ldap2=ldap),
+        env=SimpleNamespace(basedn=DN('dc=example,dc=com'))))
+
+    def get_aci(name):
+        entry = FakeLDAPEntry(
+            DN(('cn', name), 'cn=permissions,cn=pbac'),
+            cn=[name], ipapermlocation=[location])
+        return obj._get_aci_entry_and_string(entry, notfound_ok=True)[1]
+
+    try:
+        # every ACI of the location is parsed once for many lookups
+        assert get_aci('a') == acis[0]
+        assert get_aci('b') == acis[1]
+        assert get_aci('c') == acis[2]
+        assert get_aci('d') is None
+        assert sorted(parsed) == sorted(acis)
+        assert ldap.count('get_entry') == 4
+
+        # a changed ACI is picked up in the same request, and only the new
+        # ACI string is parsed
+        del parsed[:]
+        changed = make_aci('b', attr='sn')
+        location_entry['aci'][1] = changed
+        assert get_aci('b') == changed
+        assert get_aci('a') == acis[0]
+        assert parsed == [changed]
+
+        # a removed ACI is not served from the index any more
+        del location_entry['aci'][2]
+        assert get_aci('c') is None
+    finally:
+        destroy_context()
@@ -24,11 +24,13 @@ Test the `ipaserver/plugins/vault.py` module.
 import pytest
 import six
 
-from ipalib import api
-from ipatests.test_xmlrpc.xmlrpc_test import Declarative, fuzzy_bytes
+from ipalib import api, errors
+from ipatests.test_xmlrpc.xmlrpc_test import (
+    Declarative, XMLRPC_test, fuzzy_bytes)
 
 
 vault_name = u'test_vault'
+chunked_vault_name = u'chunked_test_vault'
 service_name = u'HTTP/server.example.com'
 user_name = u'testuser'
 
@@ -42,6 +44,9 @@ if six.PY2:
 else:
     secret = bytes(range(0, 256))
 
+# data larger than the vault data size limit are archived in chunks
+large_secret = secret * (2**12 + 1)
+
 password = u'password'
 other_password = u'other_password'
 
@@ -630,6 +635,40 @@ class test_vault_plugin(Declarative):
             },
         },
 
+        {
+            'desc': 'Archive large secret into standard vault',
+            'command': (
+                'vault_archive',
+                [standard_vault_name],
+                {
+                    'data': large_secret,
+                },
+            ),
+            'expected': {
+                'value': standard_vault_name,
+                'summary': 'Archived data into vault "%s"'
+                           % standard_vault_name,
+                'result': {},
+            },
+        },
+
+        {
+            'desc': 'Retrieve large secret from standard vault',
+            'command': (
+                'vault_retrieve',
+                [standard_vault_name],
+                {},
+            ),
+            'expected': {
+                'value': standard_vault_name,
+                'summary': 'Retrieved data from vault "%s"'
+                           % standard_vault_name,
+                'result': {
+                    'data': large_secret,
+                },
+            },
+        },
+
         {
             'desc': 'Archive secret into standard vault',
             'command': (
@@ -664,6 +703,43 @@ class test_vault_plugin(Declarative):
             },
         },
 
+        {
+            'desc': 'Retrieve data from non-existent vaults',
+            'command': (
+                'vault_retrieve_many_internal',
+                [[
+                    {'cn': u'nonexistent'},
+                    {'cn': standard_vault_name, 'nonexistent': u'value'},
+                ]],
+                {
+                    'session_key': b'session key',
+                },
+            ),
+            'expected': {
+                'count': 2,
+                'results': [
+                    {
+                        'value': u'nonexistent',
+                        'error': u'nonexistent: vault not found',
+                        'error_code': 4001,
+                        'error_name': u'NotFound',
+                        'error_kw': {
+                            'reason': u'nonexistent: vault not found',
+                        },
+                    },
+                    {
+                        'value': standard_vault_name,
+                        'error': u'Unknown option: nonexistent',
+                        'error_code': 3005,
+                        'error_name': u'OptionError',
+                        'error_kw': {
+                            'option': u'nonexistent',
+                        },
+                    },
+                ],
+            },
+        },
+
         {
             'desc': 'Change standard vault to symmetric vault',
             'command': (
@@ -1001,3 +1077,57 @@ class test_vault_plugin(Declarative):
         },
 
     ]
+
+
+@pytest.mark.tier1
+class test_vault_chunks(XMLRPC_test):
+    """
+    Test that the KRA records of vault data chunks are released.
+    """
+    @pytest.fixture(autouse=True)
+    def chunked_vault(self):
+        if not api.Command.kra_is_enabled()['result']:
+            pytest.skip('KRA service is not enabled')
+
+        api.Command.vault_add(chunked_vault_name, ipavaulttype=u'standard')
+        yield
+        api.Command.vault_del(chunked_vault_name, **{'continue': True})
+
+    def get_chunk_sets(self):
+        result = api.Command.vault_show(chunked_vault_name, all=True)
+        return result['result'].get('ipavaultchunkset', [])
+
+    def assert_released(self, chunk_set):
+        # retrieving released chunks fails before the session key is used
+        with pytest.raises(errors.NotFound):
+            api.Command.vault_retrieve_internal(
+                chunked_vault_name,
+                session_key=b'invalid',
+                chunk_set=chunk_set,
+                chunk=0)
+
+    def test_archive(self):
+        api.Command.vault_archive(chunked_vault_name, data=large_secret)
+        chunk_sets = self.get_chunk_sets()
+        assert len(chunk_sets) == 1
+
+        api.Command.vault_archive(chunked_vault_name, data=large_secret)
+        new_chunk_sets = self.get_chunk_sets()
+        assert len(new_chunk_sets) == 1
+        assert new_chunk_sets != chunk_sets
+        self.assert_released(chunk_sets[0])
+
+        api.Command.vault_archive(chunked_vault_name, data=secret)
+        assert self.get_chunk_sets() == []
+        self.assert_released(new_chunk_sets[0])
+
+    def test_delete(self):
+        api.Command.vault_archive(chunked_vault_name, data=large_secret)
+        chunk_sets = self.get_chunk_sets()
+        assert len(chunk_sets) == 1
+
+        # the KRA records of a new vault with the same name have the same
+        # IDs
+        api.Command.vault_del(chunked_vault_name)
+        api.Command.vault_add(chunked_vault_name, ipavaulttype=u'standard')
+        self.assert_released(chunk_sets[0])
@@ -37,7 +37,7 @@ from pprint import pformat
 import six
 
 import ipalib
-from ipalib import api
+from ipalib import api, errors
 from ipalib.kinit import kinit_keytab, kinit_password
 from ipalib.plugable import Plugin
 from ipalib.request import context
@@ -750,6 +750,148 @@ class MockLDAP:
         self.unbind()
 
 
+class FakeLDAPEntry(dict):
+    """
+    Stand-in for `ipapython.ipaldap.LDAPEntry` in unit tests.
+
+    Attribute values are lists; ``raw`` returns them as bytes.
+    """
+    def __init__(self, dn, **attrs):
+        super(FakeLDAPEntry, self).__init__(
+            (name.lower(), list(values)) for name, values in attrs.items())
+        self.dn = dn
+
+    @property
+    def raw(self):
+        return {
+            name: [v if isinstance(v, bytes) else str(v).encode('utf-8')
+                   for v in values]
+            for name, values in self.items()
+        }
+
+    @property
+    def single_value(self):
+        return {name: values[0] for name, values in self.items() if values}
+
+    def copy(self):
+        return FakeLDAPEntry(self.dn, **self)
+
+
+class FakeLDAP:
+    """
+    In-memory stand-in for the ldap2 backend in unit tests.
+
+    Searches ignore the filter and return the entries of ``entries`` in
+    scope. Unless a search asks for ``size_limit=-1`` or a paged search,
+    results longer than ``size_limit`` are truncated like the server does.
+
+    Writes with ``add_entry_async`` and ``modify_ext`` are recorded in
+    ``sent`` and their results in ``collected``; the result of a write to
+    a DN in ``failing`` is DuplicateEntry.
+
+    Every call is recorded in ``calls`` as (method name, arguments).
+    """
+    SCOPE_BASE = 0
+    SCOPE_ONELEVEL = 1
+    SCOPE_SUBTREE = 2
+    MATCH_NONE = '!'
+    MATCH_ALL = '&'
+    MATCH_ANY = '|'
+
+    def __init__(self, entries=(), size_limit=100, failing=()):
+        self.entries = list(entries)
+        self.size_limit = size_limit
+        self.failing = set(failing)
+        self.calls = []
+        self.sent = []
+        self.collected = []
+        self.conn = self
+
+    def count(self, name):
+        return len([call for call in self.calls if call[0] == name])
+
+    @classmethod
+    def combine_filters(cls, filters, rules='|'):
+        return '(%s%s)' % (rules, ''.join(filters))
+
+    @classmethod
+    def make_filter(cls, entry_attrs, rules='|'):
+        filters = []
+        for name, values in sorted(entry_attrs.items()):
+            if not isinstance(values, (list, tuple)):
+                values = [values]
+            filters.extend('(%s=%s)' % (name, value) for value in values)
+        return cls.combine_filters(filters, rules)
+
+    def make_entry(self, dn, entry_attrs=None, **kwargs):
+        return FakeLDAPEntry(dn, **dict(entry_attrs or {}, **kwargs))
+
+    def get_entry(self, dn, attrs_list=None):
+        self.calls.append(('get_entry', dict(dn=dn, attrs_list=attrs_list)))
+        for entry in self.entries:
+            if entry.dn == dn:
+                return entry.copy()
+        raise errors.NotFound(reason='%s: entry not found' % dn)
+
+    def find_entries(self, filter=None, attrs_list=None, base_dn=None,
+                     scope=SCOPE_SUBTREE, time_limit=None, size_limit=None,
+                     paged_search=False, **kwargs):
+        self.calls.append(('find_entries', dict(
+            filter=filter, attrs_list=attrs_list, base_dn=base_dn,
+            scope=scope, size_limit=size_limit, paged_search=paged_search)))
+        if scope == self.SCOPE_BASE:
+            found = [e for e in self.entries if e.dn == base_dn]
+        elif scope == self.SCOPE_ONELEVEL:
+            found = [e for e in self.entries if e.dn[1:] == base_dn]
+        else:
+            found = [e for e in self.entries if e.dn.endswith(base_dn)]
+        if not found:
+            raise errors.NotFound(reason='no such entry')
+
+        if size_limit is None:
+            size_limit = self.size_limit
+        truncated = (not paged_search and size_limit > 0
+                     and len(found) > size_limit)
+        if truncated:
+            found = found[:size_limit]
+        return [entry.copy() for entry in found], truncated
+
+    def get_entries(self, base_dn, scope=SCOPE_SUBTREE, filter=None,
+                    attrs_list=None, **kwargs):
+        entries, truncated = self.find_entries(
+            filter, attrs_list, base_dn, scope, **kwargs)
+        if truncated:
+            raise errors.LimitsExceeded()
+        return entries
+
+    def iter_entries(self, base_dn, scope=SCOPE_SUBTREE, filter=None,
+                     attrs_list=None, **kwargs):
+        entries, _truncated = self.find_entries(
+            filter, attrs_list, base_dn, scope, **kwargs)
+        for entry in entries:
+            yield entry
+
+    @contextmanager
+    def error_handler(self):
+        yield
+
+    def encode(self, value):
+        return value
+
+    def add_entry_async(self, entry):
+        self.sent.append(entry.dn)
+        return len(self.sent)
+
+    def modify_ext(self, dn, modlist):
+        self.sent.append(dn)
+        return len(self.sent)
+
+    def wait_for_result(self, msgid):
+        self.collected.append(msgid)
+        if self.sent[msgid - 1] in self.failing:
+            raise errors.DuplicateEntry()
+
+
 def prepare_config(template, values):
     with open(template) as f:
         template = f.read()